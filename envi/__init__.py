@@ -4,6 +4,8 @@ ArchitectureModule, Opcode, Operand, and Emulator objects.
 '''
 
 import types
+import array
+import bisect
 import struct
 import platform
 
@@ -123,6 +125,43 @@ class ArchitectureModule:
         '''
         raise ArchNotImplemented('archParseOpcode')
 
+    def archParseOpcodes(self, bytez, offset=0, va=0, size=None, stopflags=0):
+        '''
+        Linear sweep disassemble the given bytes ( from offset up to
+        offset+size, or the end ) and return an OpcodeArrays of the
+        instructions.  Decoding stops after an instruction with any of
+        the stopflags ( IF_FOO ) set, or at an invalid instruction ( see
+        OpcodeArrays.endoff ).
+
+        NOTE: Architectures may override this to fill in the arrays
+              without building an Opcode for each instruction.
+
+        Example:
+            ops = a.archParseOpcodes(bytez, va=0x41414141, stopflags=envi.IF_NOFALL)
+            for i in xrange(len(ops)):
+                print hex(ops.getVa(i)), ops.getMnem(i)
+        '''
+        ops = OpcodeArrays(self, bytez, offset, va)
+        endoff = len(bytez)
+        if size != None:
+            endoff = min(endoff, offset + size)
+
+        while offset < endoff:
+            try:
+                op = self.archParseOpcode(bytez, offset, va)
+            except Exception, e:
+                ops.invalid = True
+                break
+
+            ops.addOpcode(offset, op)
+            offset += op.size
+            va += op.size
+            if op.iflags & stopflags:
+                break
+
+        ops.endoff = offset
+        return ops
+
     def archGetRegisterGroups(self):
         '''
         Returns a tuple of tuples of registers for different register groups.
@@ -276,13 +315,65 @@ class MapOverlapException(EnviException):
         margs = (map1[0], map1[1], map2[0], map2[1])
         EnviException.__init__(self, "Map At 0x%.8x (%d) overlaps map at 0x%.8x (%d)" % margs)
 
-class Operand:
+# Operand and Opcode objects are cached by the million ( see the
+# emulator and workspace opcode caches ) so they use __slots__ rather
+# than a per-instance __dict__.
+slot_names = {}
+
+def getSlotNames(cls):
+    '''
+    Return the ( cached ) tuple of __slots__ names for the class and all
+    of its bases.
+    '''
+    names = slot_names.get(cls)
+    if names is None:
+        names = []
+        for c in cls.__mro__:
+            for name in c.__dict__.get('__slots__', ()):
+                if name in ('__dict__', '__weakref__') or name in names:
+                    continue
+                names.append(name)
+        names = tuple(names)
+        slot_names[cls] = names
+    return names
+
+def getSlotState(obj):
+    '''
+    Return a dict of the ( set ) slot values and any instance __dict__
+    for the object ( for pickling and comparing ).
+    '''
+    ret = dict(getattr(obj, '__dict__', ()))
+    for name in getSlotNames(obj.__class__):
+        try:
+            ret[name] = getattr(obj, name)
+        except AttributeError:
+            pass
+    return ret
+
+def setSlotState(obj, state):
+    '''
+    Restore the state returned by getSlotState().
+    '''
+    for name, valu in state.items():
+        setattr(obj, name, valu)
+
+class Operand(object):
 
     """
     Thses are the expected methods needed by any implemented operand object
     attached to an envi Opcode.  This does *not* have a constructor of it's
     pwn on purpose to cut down on memory use and constructor CPU cost.
+
+    NOTE: Subclasses should declare the __slots__ their constructor sets
+          ( or they get a __dict__ per instance ).
     """
+    __slots__ = ()
+
+    def __getstate__(self):
+        return getSlotState(self)
+
+    def __setstate__(self, state):
+        setSlotState(self, state)
 
     def getOperValue(self, op, emu=None):
         """
@@ -362,11 +453,15 @@ class Operand:
 
 class DerefOper(Operand):
 
+    __slots__ = ()
+
     def isDeref(self):
         return True
 
 class ImmedOper(Operand):
 
+    __slots__ = ()
+
     def isImmed(self):
         return True
 
@@ -375,13 +470,17 @@ class ImmedOper(Operand):
 
 class RegisterOper(Operand):
 
+    __slots__ = ()
+
     def isReg(self):
         return True
 
-class Opcode:
+class Opcode(object):
     """
     A universal representation for an opcode
     """
+    __slots__ = ('opcode', 'mnem', 'prefixes', 'size', 'opers', 'repr', 'iflags', 'va')
+
     prefix_names = [] # flag->humon tuples
 
     def __init__(self, va, opcode, mnem, prefixes, size, operands, iflags=0):
@@ -445,6 +544,11 @@ class Opcode:
     def __len__(self):
         return int(self.size)
 
+    def __getstate__(self):
+        return getSlotState(self)
+
+    def __setstate__(self, state):
+        setSlotState(self, state)
 
     # NOTE: From here down is mostly things that architecture specific opcode
     #       extensions should override.
@@ -516,6 +620,102 @@ class Opcode:
     def getOperands(self):
         return list(self.opers)
 
+# Mnemonic ids ( shared by every arch, see OpcodeArrays )
+mnem_ids = {}
+mnem_names = []
+
+def getMnemId(mnem):
+    '''
+    Return the ( process local ) integer id for the mnemonic.
+    '''
+    mnemid = mnem_ids.get(mnem)
+    if mnemid is None:
+        mnemid = len(mnem_names)
+        mnem_names.append(mnem)
+        mnem_ids[mnem] = mnemid
+    return mnemid
+
+def getOpcodeTarget(op):
+    '''
+    Return the direct ( not dereferenced ) branch/call target of the
+    opcode, or None.
+    '''
+    for bva, bflags in op.getBranches():
+        if bflags & (BR_FALL | BR_DEREF) or bva == None:
+            continue
+        return bva
+    return None
+
+def _iflagsArray():
+    # Some archs use all 64 bits of the iflags ( see envi.archs.arm.const )
+    if array.array('L').itemsize >= 8:
+        return array.array('L')
+    return []
+
+class OpcodeArrays:
+    '''
+    The ( columnar ) results of ArchitectureModule.archParseOpcodes().
+    For the i'th instruction:
+
+        offsets[i]  - The offset of the instruction in bytez
+        sizes[i]    - The size of the instruction in bytes
+        mnems[i]    - The mnemonic id ( see getMnemId() )
+        iflags[i]   - The envi instruction flags ( see IF_FOO )
+        targets[i]  - The direct branch/call target va ( or None )
+
+    endoff is where decoding stopped ( and invalid is set if it was an
+    invalid instruction ).  Opcode objects are only built by getOpcode().
+    '''
+    def __init__(self, archmod, bytez, offset=0, va=0):
+        self.archmod = archmod
+        self.bytez = bytez
+        self.baseva = va - offset   # The va of bytez[0]
+
+        self.offsets = array.array('I')
+        self.sizes = array.array('B')
+        self.mnems = array.array('H')
+        self.iflags = _iflagsArray()
+        self.targets = []
+
+        self.endoff = offset
+        self.invalid = False
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def addOpcode(self, offset, op):
+        '''
+        Append the columns for an already parsed Opcode.
+        '''
+        self.offsets.append(offset)
+        self.sizes.append(op.size)
+        self.mnems.append(getMnemId(op.mnem))
+        self.iflags.append(op.iflags)
+        self.targets.append(getOpcodeTarget(op))
+
+    def getVa(self, idx):
+        return self.baseva + self.offsets[idx]
+
+    def getMnem(self, idx):
+        return mnem_names[self.mnems[idx]]
+
+    def getIndex(self, va):
+        '''
+        Return the index of the instruction which contains the va ( or -1 ).
+        '''
+        offset = va - self.baseva
+        idx = bisect.bisect_right(self.offsets, offset) - 1
+        if idx < 0 or offset >= self.offsets[idx] + self.sizes[idx]:
+            return -1
+        return idx
+
+    def getOpcode(self, idx):
+        '''
+        Parse ( and return ) the full Opcode for the i'th instruction.
+        '''
+        offset = self.offsets[idx]
+        return self.archmod.archParseOpcode(self.bytez, offset, self.baseva + offset)
+
 class Emulator(e_reg.RegisterContext, e_mem.MemoryObject):
     """
     The Emulator class is mostly "Abstract" in the java
@@ -92,6 +92,10 @@ class Amd64Emulator(Amd64RegisterContext, e_i386.IntelEmulator):
     flagidx = REG_EFLAGS
     accumreg = { 1:REG_AL, 2:REG_AX, 4:REG_EAX, 8:REG_RAX }
 
+    # Our setRegister() only differs for the ( 32 bit ) meta registers
+    plainregs = (e_reg.RegisterContext.getRegister.im_func,
+                 Amd64RegisterContext.setRegister.im_func)
+
     def __init__(self):
 
         archmod = Amd64Module()
@@ -105,6 +109,32 @@ class Amd64Emulator(Amd64RegisterContext, e_i386.IntelEmulator):
         self.addCallingConvention("sysvamd64systemcall", sysvamd64systemcall)
         self.addCallingConvention("msx64call", msx64call)
 
+    def getOperValue(self, op, idx):
+        oper = op.opers[idx]
+        if oper.__class__ is e_i386.i386RegOper and self._emu_directregs:
+            reg = oper.reg
+            if reg <= RMETA_NMASK:
+                return self._rctx_vals[reg]
+            # The 32 bit registers are the low half of the 64 bit ones
+            if reg & 0xffff0000 == RMETA_LOW32:
+                return self._rctx_vals[reg & RMETA_NMASK] & 0xffffffff
+        return oper.getOperValue(op, self)
+
+    def setOperValue(self, op, idx, value):
+        oper = op.opers[idx]
+        if oper.__class__ is e_i386.i386RegOper and self._emu_directregs:
+            reg = oper.reg
+            if reg <= RMETA_NMASK:
+                self._rctx_dirty = True
+                self._rctx_vals[reg] = value & self._rctx_masks[reg]
+                return
+            # Writes to the 32 bit registers zero extend
+            if reg & 0xffff0000 == RMETA_LOW32:
+                self._rctx_dirty = True
+                self._rctx_vals[reg & RMETA_NMASK] = value & 0xffffffff
+                return
+        return oper.setOperValue(op, self, value)
+
     def doPush(self, val):
         rsp = self.getRegister(REG_RSP)
         rsp -= 8
@@ -68,6 +68,11 @@ MODE_32 = 1
 MODE_64 = 2
 
 class Amd64Opcode (i386Opcode):
+
+    __slots__ = ()
+
+    _dis_regctx = Amd64RegisterContext()
+
     def __repr__(self):
         """
         Over-ride this if you want to make arch specific repr.
@@ -108,6 +113,9 @@ class Amd64Opcode (i386Opcode):
                 mcanv.addText(",")
 
 class Amd64RipRelOper(envi.DerefOper):
+
+    __slots__ = ('imm', 'tsize', '_is_deref')
+
     def __init__(self, imm, tsize):
         self.imm = imm
         self.tsize = tsize
@@ -164,11 +172,15 @@ vex3_mmmm_table = ( (None,), (None,), (0x38,), (0x3A,), None, None, None, None )
 
 class Amd64Disasm(e_i386.i386Disasm):
 
+    _dis_tables = all_tables
+    _dis_tsize_prefixes = (0, e_i386.PREFIX_OP_SIZE, PREFIX_REX_W)
+    _dis_hop_660f = False
+
     def __init__(self):
         e_i386.i386Disasm.__init__(self)
         self._dis_oparch = envi.ARCH_AMD64
         self._dis_prefixes = amd64_prefixes
-        self._dis_regctx = Amd64RegisterContext()
+        self._dis_regctx = Amd64Opcode._dis_regctx
         self.ptrsize = 8
 
         # 64-bit only
@@ -188,6 +200,27 @@ class Amd64Disasm(e_i386.i386Disasm):
     # NOTE: Technically, the REX must be the *last* prefix specified
     # NOTE: Technically, the VEX must be the *last* prefix specified (REX be damned)
 
+    def _dis_flat_lookup(self, tabid, obyte):
+        tabdesc = all_tables[tabid]
+        if obyte > tabdesc[5]:
+            tabdesc = all_tables[tabdesc[6]]
+
+        tabidx = ((obyte - tabdesc[4]) >> tabdesc[2]) & tabdesc[3]
+        return tabdesc, tabdesc[0][tabidx]
+
+    def _dis_flat_desc(self, tabdesc, opdesc):
+        opers = []
+        tbl_opercnt = tabdesc[1]
+        for i in range(operands_index, operands_index + tbl_opercnt):
+            if opdesc[i] == 0:
+                break
+            opers.append((opdesc[i], self._dis_flat_operval(opdesc, i, 2+tbl_opercnt+i)))
+
+        consume = 0
+        if tabdesc[3] == 0xff:
+            consume = 1 # For our final opcode byte
+        return opdesc[1], opdesc[3 + tbl_opercnt], consume, opers
+
     def _dis_calc_tsize(self, opertype, prefixes, operflags):
         """
         Use the oper type and prefixes to decide on the tsize for
@@ -218,15 +251,14 @@ class Amd64Disasm(e_i386.i386Disasm):
     def disasm(self, bytez, offset, va):
         # FIXME: for newer instructions, the VEX.W bit needs to be able to change the opcode. ugh.
 
+        flat = self._dis_flat
+        if flat is None:
+            flat = self._dis_flatten()
+
         # Stuff for opcode parsing
-        tabdesc = all_tables[ opcode86.TBL_Main ] # A tuple (optable, shiftbits, mask byte, sub, max)
+        tabid = opcode86.TBL_Main
         startoff = offset # Use startoff as a size knob if needed
 
-        # Stuff we'll be putting in the opcode object
-        optype = None # This gets set if we successfully decode below
-        mnem = None 
-        operands = []
-
         prefixes = 0
         pho_prefixes = 0    # faux prefixes... don't immediately apply them, they may not be the prefixes we're looking for
 
@@ -243,12 +275,12 @@ class Amd64Disasm(e_i386.i386Disasm):
             if obyte in mandatory_prefixes:
                 pho_prefixes |= p
                 # ratchet through the tables
-
+                tabdesc = all_tables[tabid]
                 tabidx = ((obyte - tabdesc[4]) >> tabdesc[2]) & tabdesc[3]
                 #print "TABIDX: %d" % tabidx
                 opdesc = tabdesc[0][tabidx]
                 #print 'OPDESC: %s -> %s' % (repr(opdesc), opcode86.tables_lookup.get(opdesc[0]))
-                tabdesc = all_tables[opdesc[0]]
+                tabid = opdesc[0]
             else:
                 prefixes |= p
 
@@ -296,9 +328,9 @@ class Amd64Disasm(e_i386.i386Disasm):
                     if tabidx == None:
                         continue
                     #print "TABIDX: %d" % tabidx
-                    opdesc = tabdesc[0][tabidx]
+                    opdesc = all_tables[tabid][0][tabidx]
                     #print 'OPDESC: %s -> %s' % (repr(opdesc), opcode86.tables_lookup.get(opdesc[0]))
-                    tabdesc = all_tables[opdesc[0]]
+                    tabid = opdesc[0]
 
 
             offset += 1
@@ -307,87 +339,58 @@ class Amd64Disasm(e_i386.i386Disasm):
         if obyte != 0x0f:
             prefixes |= pho_prefixes
 
+        # Hop through the ( flattened ) tables for multi-byte opcodes
         while True:
 
             obyte = ord(bytez[offset])
+            ent = flat[tabid][obyte]
+            if ent.__class__ is not int:
+                break
 
-            #print "OBYTE",hex(obyte)
-            if (obyte > tabdesc[5]):
-                #print "Jumping To Overflow Table:", tabdesc[5]
-                tabdesc = all_tables[tabdesc[6]]
-
-            tabidx = ((obyte - tabdesc[4]) >> tabdesc[2]) & tabdesc[3]
-            #print "TABIDX: %s" % tabidx
-            opdesc = tabdesc[0][tabidx]
-            #print 'OPDESC: %s -> %s' % (repr(opdesc), opcode86.tables_lookup.get(opdesc[0]))
-
-            # Hunt down multi-byte opcodes
-            nexttable = opdesc[0]
-            #print "NEXT",nexttable,hex(obyte), opcode86.tables_lookup.get(nexttable)
-            if nexttable != 0: # If we have a sub-table specified, use it.
-                #print "Multi-Byte Next Hop For",hex(obyte),opdesc[0]
-                tabdesc = all_tables[nexttable]
-
-                # Account for the table jump we made
-                offset += 1
-
-                continue
-
-            # We are now on the final table...
-            #print repr(opdesc)
-            tbl_opercnt = tabdesc[1]
-            mnem = opdesc[3 + tbl_opercnt]
-            optype = opdesc[1]
-            if tabdesc[3] == 0xff:
-                offset += 1 # For our final opcode byte
-            break
+            # Account for the table jump we made
+            offset += 1
+            tabid = ent
+
+        if ent is None:
+            raise envi.InvalidInstruction(bytez=bytez[startoff:startoff+16], va=va)
+
+        optype, mnem, consume, opers, lite = ent
+        offset += consume
 
         if optype == 0:
-            #print tabidx
-            #print opdesc
-            #print "OPTTYPE 0"
             raise envi.InvalidInstruction(bytez=bytez[startoff:startoff+16], va=va)
 
+        # Which of the precomputed operand sizes ( see _dis_tsize_prefixes )
+        # NOTE: REX takes precedence over 66
+        tsizeidx = 0
+        if prefixes & PREFIX_REX_W:
+            tsizeidx = 2
+        elif prefixes & e_i386.PREFIX_OP_SIZE:
+            tsizeidx = 1
+
+        operands = []
         operoffset = 0
         # Begin parsing operands based off address method
-        for i in range(operands_index, operands_index + tbl_opercnt):
+        for operflags, addrmeth, ameth, tsizes, operval, isimm in opers:
 
             oper = None # Set this if we end up with an operand
             osize = 0
 
-            # Pull out the operand description from the table
-            operflags = opdesc[i]
-            opertype = operflags & opcode86.OPTYPE_MASK
-            addrmeth = operflags & opcode86.ADDRMETH_MASK
-
-            # If there are no more operands, break out of the loop!
-            if operflags == 0:
-                break
-
-            #print "ADDRTYPE: %.8x OPERTYPE: %.8x" % (addrmeth, opertype)
-
             # handles tsize calculations including new REX prefixes
-            tsize = self._dis_calc_tsize(opertype, prefixes, operflags)
-
-            #print hex(opertype),hex(addrmeth),hex(tsize)
-
+            tsize = tsizes[tsizeidx]
 
             # If addrmeth is zero, we have operands embedded in the opcode
             if addrmeth == 0:
-                osize = 0
-                oper = self.ameth_0(operflags, opdesc[2+tbl_opercnt+i], tsize, prefixes)
+                oper = self.ameth_0(operflags, operval, tsize, prefixes)
 
             else:
-                #print "ADDRTYPE",hex(addrmeth)
-                ameth = self._dis_amethods[addrmeth >> 16]
-                #print "AMETH",ameth
-                if ameth == None:
+                if ameth is None:
                     raise Exception("Implement Addressing Method 0x%.8x" % addrmeth)
 
                 # NOTE: Depending on your addrmethod you may get beginning of operands, or offset
                 try:
-                    if addrmeth == opcode86.ADDRMETH_I or addrmeth == opcode86.ADDRMETH_J:
-                        osize, oper = ameth(bytez, offset+operoffset, tsize, prefixes, operflags)
+                    if isimm:
+                        osize, oper = ameth(self, bytez, offset+operoffset, tsize, prefixes, operflags)
 
                         # If we are a sign extended immediate and not the same as the other operand,
                         # do the sign extension during disassembly so nothing else has to worry about it..
@@ -399,15 +402,13 @@ class Amd64Disasm(e_i386.i386Disasm):
                                 oper.tsize = otsize
 
                     else:
-                        osize, oper = ameth(bytez, offset, tsize, prefixes, operflags)
+                        osize, oper = ameth(self, bytez, offset, tsize, prefixes, operflags)
 
                 except struct.error, e:
                     # Catch struct unpack errors due to insufficient data length
                     raise envi.InvalidInstruction(bytez=bytez[startoff:startoff+16])
 
-            if oper != None:
-                # This is a filty hack for now...
-                oper._dis_regctx = self._dis_regctx
+            if oper is not None:
                 operands.append(oper)
 
             operoffset += osize
@@ -422,13 +423,44 @@ class Amd64Disasm(e_i386.i386Disasm):
             iflags |= envi.IF_PRIV
 
         # Lea will have a reg-mem/sib operand with _is_deref True, but should be false
-        if optype == opcode86.INS_LEA:
+        # ( the register form is invalid, but still decodes )
+        if optype == opcode86.INS_LEA and operands[1].isDeref():
             operands[1]._is_deref = False
 
         ret = Amd64Opcode(va, optype, mnem, prefixes, (offset-startoff)+operoffset, operands, iflags)
 
         return ret
 
+    def _dis_bulk_prefixes(self, bytez, offset):
+        tabid = opcode86.TBL_Main
+        prefixes = 0
+        pho_prefixes = 0
+        while True:
+            obyte = ord(bytez[offset])
+            p = self._dis_prefixes[obyte]
+            if p == None:
+                break
+
+            # VEX is left to disasm()
+            if p & PREFIX_VEX:
+                return None
+
+            if obyte in mandatory_prefixes:
+                pho_prefixes |= p
+                # ratchet through the tables
+                tabdesc = all_tables[tabid]
+                tabidx = ((obyte - tabdesc[4]) >> tabdesc[2]) & tabdesc[3]
+                tabid = tabdesc[0][tabidx][0]
+            else:
+                prefixes |= p
+
+            offset += 1
+
+        if obyte != 0x0f:
+            prefixes |= pho_prefixes
+
+        return prefixes, tabid, offset
+
     def parse_modrm(self, byte, prefixes=0):
         # Pass in a string with an offset for speed rather than a new string
         mod = (byte >> 6) & 0x3
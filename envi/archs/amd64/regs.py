@@ -150,5 +150,6 @@ class Amd64RegisterContext(e_reg.RegisterContext):
         # zero extends into RAX...
         if (index & 0xffff0000) == RMETA_LOW32:
             index = index & 0xffff
+            value = value & 0xffffffff
         e_reg.RegisterContext.setRegister(self, index, value)
 
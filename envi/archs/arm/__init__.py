@@ -8,6 +8,9 @@ import envi
 from envi.archs.arm.regs import *
 from envi.archs.arm.disasm import *
 
+# The opcodes which may have a branch target ( see ArmOpcode.getBranches )
+branch_opcodes = (INS_B, INS_BX, INS_BL, INS_BLX)
+
 class ArmModule(envi.ArchitectureModule):
 
     def __init__(self, name='armv6'):
@@ -37,6 +40,52 @@ class ArmModule(envi.ArchitectureModule):
         """
         return self._arch_dis.disasm(bytes, offset, va)
 
+    def archParseOpcodes(self, bytez, offset=0, va=0, size=None, stopflags=0):
+        # NOTE: The ARM/Thumb decoders build the operands to classify an
+        #       instruction, so this just skips the per instruction
+        #       overhead ( and only asks the branches for a target )
+        ops = envi.OpcodeArrays(self, bytez, offset, va)
+        endoff = len(bytez)
+        if size != None:
+            endoff = min(endoff, offset + size)
+
+        disasm = self._arch_dis.disasm
+        mnem_ids = envi.mnem_ids
+        offsets = ops.offsets
+        sizes = ops.sizes
+        mnems = ops.mnems
+        iflagss = ops.iflags
+        targets = ops.targets
+
+        while offset < endoff:
+            try:
+                op = disasm(bytez, offset, va)
+            except Exception, e:
+                ops.invalid = True
+                break
+
+            mnemid = mnem_ids.get(op.mnem)
+            if mnemid is None:
+                mnemid = envi.getMnemId(op.mnem)
+
+            tva = None
+            if op.opcode in branch_opcodes:
+                tva = envi.getOpcodeTarget(op)
+
+            offsets.append(offset)
+            sizes.append(op.size)
+            mnems.append(mnemid)
+            iflagss.append(op.iflags)
+            targets.append(tva)
+
+            offset += op.size
+            va += op.size
+            if op.iflags & stopflags:
+                break
+
+        ops.endoff = offset
+        return ops
+
     def getEmulator(self):
         return ArmEmulator()
 
@@ -1272,6 +1272,23 @@ inittable = [
     (IENC_UNCOND, None),
 ]
 
+# The tables above only look at bits 27:20 and 7:4, so the encoding for
+# each of those values is precomputed ( see ArmDisasm.disasm() ):
+#   enc = ienc_table[((opval >> 16) & 0xff0) | ((opval >> 4) & 0xf)]
+def scanEncoding(opval):
+    '''
+    Return the IENC_ encoding of a ( non COND_EXTENDED ) opval by
+    scanning inittable and the secondary tables.
+    '''
+    enc, nexttab = inittable[(opval >> 25) & 0x7]
+    if nexttab != None:
+        for mask, val, penc in nexttab:
+            if (opval & mask) == val:
+                return penc
+    return enc
+
+ienc_table = tuple([ scanEncoding(((i & 0xff0) << 16) | ((i & 0xf) << 4)) for i in xrange(4096) ])
+
 # FIXME for emulation...
 #def s_lsl(val, shval):
     #pass
@@ -1292,6 +1309,8 @@ endian_names = ("le","be")
 #FIXME IF_NOFALL (and other envi flags)
 
 class ArmOpcode(envi.Opcode):
+    __slots__ = ('encoder',)
+
     _def_arch = envi.ARCH_ARMV7
 
     def __hash__(self):
@@ -1433,12 +1452,15 @@ class ArmOpcode(envi.Opcode):
         return mnem + " " + ", ".join(x)
 
 class ArmOperand(envi.Operand):
+    __slots__ = ()
+
     tsize = 4
     def involvesPC(self):
         return False
 
 class ArmRegOper(ArmOperand):
     ''' register operand.  see "addressing mode 1 - data processing operands - register" '''
+    __slots__ = ('va', 'reg', 'oflags')
 
     def __init__(self, reg, va=0, oflags=0):
         self.va = va
@@ -1488,6 +1510,7 @@ class ArmRegOper(ArmOperand):
 
 class ArmRegShiftRegOper(ArmOperand):
     ''' register shift operand.  see "addressing mode 1 - data processing operands - * shift * by register" '''
+    __slots__ = ('reg', 'shtype', 'shreg')
 
     def __init__(self, reg, shtype, shreg):
         self.reg = reg
@@ -1530,6 +1553,7 @@ class ArmRegShiftRegOper(ArmOperand):
 
 class ArmRegShiftImmOper(ArmOperand):
     ''' register shift immediate operand.  see "addressing mode 1 - data processing operands - * shift * by immediate" '''
+    __slots__ = ('reg', 'shtype', 'shimm', 'va')
 
     def __init__(self, reg, shtype, shimm, va):
         if shimm == 0:
@@ -1591,6 +1615,7 @@ class ArmRegShiftImmOper(ArmOperand):
 
 class ArmImmOper(ArmOperand):
     ''' register operand.  see "addressing mode 1 - data processing operands - immediate" '''
+    __slots__ = ('val', 'shval', 'shtype')
 
 
     def __init__(self, val, shval=0, shtype=S_ROR, va=0):
@@ -1630,6 +1655,8 @@ class ArmImmOper(ArmOperand):
 
 class ArmScaledOffsetOper(ArmOperand):
     ''' scaled offset operand.  see "addressing mode 2 - load and store word or unsigned byte - scaled register *" '''
+    __slots__ = ('base_reg', 'offset_reg', 'shtype', 'shval', 'pubwl', 'va')
+
     def __init__(self, base_reg, offset_reg, shtype, shval, va, pubwl=0):
         if shval == 0:
             if shtype == S_ROR:
@@ -1755,6 +1782,8 @@ class ArmScaledOffsetOper(ArmOperand):
 class ArmRegOffsetOper(ArmOperand):
     ''' register offset operand.  see "addressing mode 2 - load and store word or unsigned byte - register *" 
     dereference address mode using the combination of two register values '''
+    __slots__ = ('base_reg', 'offset_reg', 'pubwl')
+
     def __init__(self, base_reg, offset_reg, va, pubwl=0):
         self.base_reg = base_reg
         self.offset_reg = offset_reg
@@ -1852,6 +1881,8 @@ class ArmImmOffsetOper(ArmOperand):
     possibly with indexing, pre/post for faster rolling through arrays and such
     if the base_reg is PC, we'll dig in and hopefully grab the data being referenced.
     '''
+    __slots__ = ('base_reg', 'offset', 'pubwl', 'va')
+
     def __init__(self, base_reg, offset, va, pubwl=8):
         self.base_reg = base_reg
         self.offset = offset
@@ -1990,6 +2021,8 @@ class ArmPcOffsetOper(ArmOperand):
 
     ArmImmOper but for Branches, not a dereference.  perhaps we can have ArmImmOper do all the things... but for now we have this.
     '''
+    __slots__ = ('val', 'va')
+
     def __init__(self, val, va):
         self.val = val # depending on mode, this is reg/imm
         self.va = va
@@ -2030,6 +2063,8 @@ class ArmPcOffsetOper(ArmOperand):
 
 psrs = ("CPSR", "SPSR", 'inval', 'inval', 'inval', 'inval', 'inval', 'inval',)
 class ArmPgmStatRegOper(ArmOperand):
+    __slots__ = ('val',)
+
     def __init__(self, val):
         self.val = val
 
@@ -2056,6 +2091,8 @@ class ArmPgmStatRegOper(ArmOperand):
         return psrs[self.val]
     
 class ArmPgmStatFlagsOper(ArmOperand):
+    __slots__ = ('val',)
+
     def __init__(self, val):
         self.val = val
 
@@ -2083,6 +2120,8 @@ class ArmPgmStatFlagsOper(ArmOperand):
         return "".join(s)
     
 class ArmEndianOper(ArmImmOper):
+    __slots__ = ()
+
     def repr(self, op):
         return endian_names[self.val]
 
@@ -2096,6 +2135,8 @@ class ArmEndianOper(ArmImmOper):
         return self.val
 
 class ArmRegListOper(ArmOperand):
+    __slots__ = ('val', 'oflags')
+
     def __init__(self, val, oflags=0):
         self.val = val
         self.oflags = oflags
@@ -2148,6 +2189,8 @@ class ArmRegListOper(ArmOperand):
     
 aif_flags = (None, 'f','i','if','a','af','ai','aif')
 class ArmPSRFlagsOper(ArmOperand):
+    __slots__ = ('flags',)
+
     def __init__(self, flags):
         self.flags = flags
 
@@ -2174,6 +2217,8 @@ class ArmPSRFlagsOper(ArmOperand):
         return aif_flags[self.flags]
 
 class ArmCoprocOpcodeOper(ArmOperand):
+    __slots__ = ('val',)
+
     def __init__(self, val):
         self.val = val
         
@@ -2197,6 +2242,8 @@ class ArmCoprocOpcodeOper(ArmOperand):
         return "%d"%self.val
 
 class ArmCoprocOper(ArmOperand):
+    __slots__ = ('val',)
+
     def __init__(self, val):
         self.val = val
         
@@ -2220,6 +2267,8 @@ class ArmCoprocOper(ArmOperand):
         return "p%d"%self.val
 
 class ArmCoprocRegOper(ArmOperand):
+    __slots__ = ('val', 'shval', 'shtype')
+
     def __init__(self, val, shtype=None, shval=None):
         self.val = val # depending on mode, this is reg/imm
         self.shval = shval
@@ -2252,6 +2301,8 @@ class ArmCoprocRegOper(ArmOperand):
         return "c%d"%self.val
 
 class ArmModeOper(ArmOperand):
+    __slots__ = ('mode', 'writeback')
+
     def __init__(self, mode, writeback=False):
         self.mode = mode
         self.writeback = writeback
@@ -2299,19 +2350,12 @@ class ArmDisasm:
         
         cond = opval >> 28
 
-        # Begin the table lookup sequence with the first 3 non-cond bits
-        encfam = (opval >> 25) & 0x7
+        # One lookup by the discriminating bits ( see ienc_table )
         if cond == COND_EXTENDED:
             enc = IENC_UNCOND
 
         else:
-
-            enc,nexttab = inittable[encfam]
-            if nexttab != None: # we have to sub-parse...
-                for mask,val,penc in nexttab:
-                    if (opval & mask) == val:
-                        enc = penc
-                        break
+            enc = ienc_table[((opval >> 16) & 0xff0) | ((opval >> 4) & 0xf)]
 
         # If we don't know the encoding by here, we never will ;)
         if enc == None:
@@ -46,6 +46,14 @@ class i386Module(envi.ArchitectureModule):
     def archParseOpcode(self, bytes, offset=0, va=0):
         return self._arch_dis.disasm(bytes, offset, va)
 
+    def archParseOpcodes(self, bytez, offset=0, va=0, size=None, stopflags=0):
+        ops = envi.OpcodeArrays(self, bytez, offset, va)
+        endoff = len(bytez)
+        if size != None:
+            endoff = min(endoff, offset + size)
+        self._arch_dis.disasmBulk(ops, bytez, offset, va, endoff, stopflags)
+        return ops
+
     def getEmulator(self):
         return IntelEmulator()
 
@@ -130,12 +130,14 @@ def addrToName(mcanv, va):
 
 class i386RegOper(envi.RegisterOper):
 
+    __slots__ = ('reg', 'tsize')
+
     def __init__(self, reg, tsize):
         self.reg = reg
         self.tsize = tsize
 
     def repr(self, op):
-        return self._dis_regctx.getRegisterName(self.reg)
+        return op._dis_regctx.getRegisterName(self.reg)
 
     def getOperValue(self, op, emu=None):
         if emu == None: return None # This operand type requires an emulator
@@ -150,8 +152,8 @@ class i386RegOper(envi.RegisterOper):
             #  FIXME: bug?  what should this be?
             mcanv.addNameText(name, typename="registers")
         else:
-            name = self._dis_regctx.getRegisterName(self.reg)
-            rname = self._dis_regctx.getRegisterName(self.reg&RMETA_NMASK)
+            name = op._dis_regctx.getRegisterName(self.reg)
+            rname = op._dis_regctx.getRegisterName(self.reg&RMETA_NMASK)
             mcanv.addNameText(name, name=rname, typename="registers")
 
     def __eq__(self, other):
@@ -164,6 +166,8 @@ class i386RegOper(envi.RegisterOper):
         return True
 
 class i386ImmOper(envi.ImmedOper):
+    __slots__ = ('imm', 'tsize')
+
     """
     An operand representing an immediate.
     """
@@ -212,6 +216,8 @@ class i386ImmOper(envi.ImmedOper):
         return True
 
 class i386PcRelOper(envi.Operand):
+    __slots__ = ('imm', 'tsize')
+
     """
     This is the operand used for EIP relative offsets
     for operands on instructions like jmp/call
@@ -251,6 +257,8 @@ class i386PcRelOper(envi.Operand):
         return True
 
 class i386RegMemOper(envi.DerefOper):
+    __slots__ = ('reg', 'tsize', 'disp', '_is_deref')
+
     """
     An operand which represents the result of reading/writting memory from the
     dereference (with possible displacement) from a given register.
@@ -262,7 +270,7 @@ class i386RegMemOper(envi.DerefOper):
         self._is_deref = True
 
     def repr(self, op):
-        r = self._dis_regctx.getRegisterName(self.reg)
+        r = op._dis_regctx.getRegisterName(self.reg)
         if self.disp > 0:
             return "%s [%s + %d]" % (sizenames[self.tsize],r,self.disp)
         elif self.disp < 0:
@@ -289,8 +297,8 @@ class i386RegMemOper(envi.DerefOper):
     def render(self, mcanv, op, idx):
         mcanv.addNameText(sizenames[self.tsize])
         mcanv.addText(" [")
-        name = self._dis_regctx.getRegisterName(self.reg)
-        rname = self._dis_regctx.getRegisterName(self.reg&RMETA_NMASK)
+        name = op._dis_regctx.getRegisterName(self.reg)
+        rname = op._dis_regctx.getRegisterName(self.reg&RMETA_NMASK)
         mcanv.addNameText(name, name=rname, typename="registers")
         hint = mcanv.syms.getSymHint(op.va, idx)
         if hint != None:
@@ -322,6 +330,8 @@ class i386RegMemOper(envi.DerefOper):
         return True
 
 class i386ImmMemOper(envi.DerefOper):
+    __slots__ = ('imm', 'tsize', '_is_deref')
+
     """
     An operand which represents the dereference (memory read/write) of
     a memory location associated with an immediate.
@@ -379,6 +389,8 @@ class i386ImmMemOper(envi.DerefOper):
         return True
 
 class i386SibOper(envi.DerefOper):
+    __slots__ = ('reg', 'imm', 'index', 'scale', 'tsize', 'disp', '_is_deref')
+
     """
     An operand which represents the result of reading/writting memory from the
     dereference (with possible displacement) from a given register.
@@ -417,13 +429,13 @@ class i386SibOper(envi.DerefOper):
         r = "%s [" % sizenames[self.tsize]
 
         if self.reg != None:
-            r += self._dis_regctx.getRegisterName(self.reg)
+            r += op._dis_regctx.getRegisterName(self.reg)
 
         if self.imm != None:
             r += "0x%.8x" % self.imm
 
         if self.index != None:
-            r += " + %s" % self._dis_regctx.getRegisterName(self.index)
+            r += " + %s" % op._dis_regctx.getRegisterName(self.index)
             if self.scale != 1:
                 r += " * %d" % self.scale
 
@@ -480,15 +492,15 @@ class i386SibOper(envi.DerefOper):
             mcanv.addVaText(name, self.imm)
 
         if self.reg != None:
-            name = self._dis_regctx.getRegisterName(self.reg)
-            rname = self._dis_regctx.getRegisterName(self.reg&RMETA_NMASK)
+            name = op._dis_regctx.getRegisterName(self.reg)
+            rname = op._dis_regctx.getRegisterName(self.reg&RMETA_NMASK)
             mcanv.addNameText(name, name=rname, typename="registers")
 
         # Does our SIB have a scale
         if self.index != None:
             mcanv.addText(" + ")
-            name = self._dis_regctx.getRegisterName(self.index)
-            rname = self._dis_regctx.getRegisterName(self.index&RMETA_NMASK)
+            name = op._dis_regctx.getRegisterName(self.index)
+            rname = op._dis_regctx.getRegisterName(self.index&RMETA_NMASK)
             mcanv.addNameText(name, name=rname, typename="registers")
             if self.scale != 1:
                 mcanv.addText(" * ")
@@ -507,8 +519,43 @@ class i386SibOper(envi.DerefOper):
 
         mcanv.addText("]")
 
+# Each mnemonic gets a small integer id ( i386Opcode.mnemid ) so the
+# emulators may dispatch by list index ( see IntelEmulator.executeOpcode )
+# NOTE: The ids are shared with envi.OpcodeArrays
+from envi import mnem_ids, mnem_names, getMnemId
+
 class i386Opcode(envi.Opcode):
 
+    __slots__ = ('mnemid',)
+
+    # Every opcode ( and so operand ) shares the one register context
+    _dis_regctx = i386RegisterContext()
+
+    def __init__(self, va, opcode, mnem, prefixes, size, operands, iflags=0):
+        self.opcode = opcode
+        self.mnem = mnem
+        self.prefixes = prefixes
+        self.size = size
+        self.opers = operands
+        self.repr = None
+        self.iflags = iflags
+        self.va = va
+
+        mnemid = mnem_ids.get(mnem)
+        if mnemid is None:
+            mnemid = getMnemId(mnem)
+        self.mnemid = mnemid
+
+    def __getstate__(self):
+        # The mnemonic ids are only valid in this process
+        state = envi.Opcode.__getstate__(self)
+        state.pop('mnemid', None)
+        return state
+
+    def __setstate__(self, state):
+        envi.Opcode.__setstate__(self, state)
+        self.mnemid = getMnemId(self.mnem)
+
     # Printable prefix names
     prefix_names = [
         (PREFIX_LOCK, "lock"),
@@ -615,12 +662,76 @@ MODE_16 = 0
 MODE_32 = 1
 MODE_64 = 2
 
+# The flattened opcode tables ( see i386Disasm._dis_flatten ) by class
+flat_tables = {}
+
+# The operand lengths ( see i386Disasm.disasmBulk ) which are not a
+# fixed number of bytes
+LITE_MODRM = -1     # The modrm ( plus sib and displacement ) bytes
+LITE_TSIZE = -2     # The operand tsize
+
+def _modrmLen(mrm):
+    mod = mrm >> 6
+    rm = mrm & 7
+    if mod == 3:
+        return 1
+
+    size = 1
+    if rm == 4:
+        size += 1   # The sib ( which may add an imm32 for mod 0 )
+    elif mod == 0 and rm == 5:
+        size += 4
+    if mod == 1:
+        size += 1
+    elif mod == 2:
+        size += 4
+    return size
+
+# The modrm length by modrm byte ( for all but the mod 0 sib with base 5 )
+modrm_lens = [ _modrmLen(mrm) for mrm in xrange(256) ]
+
+# The operand length for each addressing method ( see _dis_flat_lite )
+lite_lens = {
+    opcode86.ADDRMETH_A:LITE_TSIZE,
+    opcode86.ADDRMETH_B:0,
+    opcode86.ADDRMETH_C:0,
+    opcode86.ADDRMETH_D:0,
+    opcode86.ADDRMETH_E:LITE_MODRM,
+    opcode86.ADDRMETH_G:0,
+    opcode86.ADDRMETH_H:0,
+    opcode86.ADDRMETH_I:LITE_TSIZE,
+    opcode86.ADDRMETH_J:LITE_TSIZE,
+    opcode86.ADDRMETH_L:1,
+    opcode86.ADDRMETH_M:LITE_MODRM,
+    opcode86.ADDRMETH_N:1,
+    opcode86.ADDRMETH_P:0,
+    opcode86.ADDRMETH_Q:LITE_MODRM,
+    opcode86.ADDRMETH_R:LITE_MODRM,
+    opcode86.ADDRMETH_S:0,
+    opcode86.ADDRMETH_U:0,
+    opcode86.ADDRMETH_V:0,
+    opcode86.ADDRMETH_W:LITE_MODRM,
+    opcode86.ADDRMETH_X:0,
+    opcode86.ADDRMETH_Y:0,
+}
+
+# The optypes whose first operand may be a branch target ( see getBranches )
+branch_optypes = (opcode86.INS_CALL, opcode86.INS_CALLCC, opcode86.INS_BRANCH, opcode86.INS_BRANCHCC)
+
 class i386Disasm:
 
+    # The opcode tables and the prefixes which pick each of the
+    # precomputed operand tsizes ( see _dis_flat_tsize )
+    _dis_tables = all_tables
+    _dis_tsize_prefixes = (0, PREFIX_OP_SIZE)
+
+    # Is a 66 0f table hop two bytes ( see disasm )
+    _dis_hop_660f = True
+
     def __init__(self, mode=MODE_32):
         self._dis_mode = MODE_32
         self._dis_prefixes = i386_prefixes
-        self._dis_regctx = i386RegisterContext()
+        self._dis_regctx = i386Opcode._dis_regctx
         self._dis_oparch = envi.ARCH_I386
         self.ptrsize = 4
 
@@ -655,6 +766,152 @@ class i386Disasm:
         self.ROFFSETSEG   = getRegOffset(i386regs, "es")
         self.ROFFSETFPU   = getRegOffset(i386regs, "st0")
 
+        # Built on our first disasm() ( see _dis_flatten )
+        self._dis_flat = None
+
+    def _dis_flat_lookup(self, tabid, obyte):
+        '''
+        Walk one opcode byte through the given table ( the slow way ) and
+        return the ( tabdesc, opdesc ) tuple.
+        '''
+        tabdesc = all_tables[tabid]
+        if obyte > tabdesc[4]:
+            tabdesc = all_tables[tabdesc[5]]
+
+        tabidx = ((obyte - tabdesc[3]) >> tabdesc[1]) & tabdesc[2]
+        return tabdesc, tabdesc[0][tabidx]
+
+    def _dis_flat_operval(self, opdesc, operidx, validx):
+        # Only the embedded ( addrmeth 0 ) operands have a value
+        if opdesc[operidx] & opcode86.ADDRMETH_MASK == 0:
+            return opdesc[validx]
+        if validx < len(opdesc):
+            return opdesc[validx]
+        return None
+
+    def _dis_flat_desc(self, tabdesc, opdesc):
+        '''
+        Return the ( optype, mnem, consume, [(operflags, operval), ...] )
+        for a final opcode table entry.
+        '''
+        opers = []
+        for i in operand_range:
+            if opdesc[i] == 0:
+                break
+            opers.append((opdesc[i], self._dis_flat_operval(opdesc, i, 5+i)))
+
+        consume = 0
+        if tabdesc[2] == 0xff:
+            consume = 1 # For our final opcode byte
+        return opdesc[1], opdesc[6], consume, opers
+
+    def _dis_flat_oper(self, operflags, operval):
+        # The operand decoder and its tsize for each of _dis_tsize_prefixes
+        opertype = operflags & opcode86.OPTYPE_MASK
+        addrmeth = operflags & opcode86.ADDRMETH_MASK
+        tsizes = tuple([ self._dis_calc_tsize(opertype, p, operflags) for p in self._dis_tsize_prefixes ])
+
+        ameth = None
+        if addrmeth != 0:
+            ameth = self._dis_amethods[addrmeth >> 16]
+            if ameth != None:
+                ameth = ameth.im_func
+
+        isimm = addrmeth == opcode86.ADDRMETH_I or addrmeth == opcode86.ADDRMETH_J
+        return (operflags, addrmeth, ameth, tsizes, operval, isimm)
+
+    def _dis_flat_lite(self, optype, mnem, opers):
+        '''
+        Return the ( mnemid, iflags, ((olen, tsizes), ...), target ) which
+        disasmBulk() uses to size the instruction without parsing its
+        operands, or None if only disasm() may decode it.  The olen is
+        the operand length in bytes ( or one of the LITE_FOO lengths ) and
+        target is the addressing method of a first operand which is the
+        branch target ( or 0 ).
+        '''
+        if optype == 0:
+            return None
+
+        lens = []
+        for operflags, addrmeth, ameth, tsizes, operval, isimm in opers:
+            if addrmeth == 0:
+                if not operflags & (opcode86.OP_REG | opcode86.OP_IMM):
+                    return None
+                olen = 0
+
+            elif ameth == None:
+                return None
+
+            elif addrmeth == opcode86.ADDRMETH_O:
+                olen = self.ptrsize
+
+            else:
+                olen = lite_lens.get(addrmeth)
+                if olen == None:
+                    return None
+
+            lens.append((olen, tsizes))
+
+        iflags = iflag_lookup.get(optype, 0) | self._dis_oparch
+        if priv_lookup.get(mnem, False):
+            iflags |= envi.IF_PRIV
+
+        target = 0
+        if len(opers) and optype in branch_optypes:
+            addrmeth = opers[0][1]
+            if addrmeth == opcode86.ADDRMETH_J or addrmeth == opcode86.ADDRMETH_A:
+                target = addrmeth
+
+        return (getMnemId(mnem), iflags, tuple(lens), target)
+
+    def _dis_flatten(self):
+        '''
+        Flatten the opcode tables into a list ( by table id ) of 256 entry
+        lists indexed by the next opcode byte.  Each entry is the next
+        table id, or the ( optype, mnem, consume, opers, lite ) tuple with
+        the operand decoders and sizes resolved ( and lite for disasmBulk,
+        see _dis_flat_lite ), or None if it is invalid.
+
+        The tables are built once per disassembler class.
+        '''
+        flat = flat_tables.get(self.__class__)
+        if flat == None:
+            flat = []
+            entries = {}
+            for tabid, tabdesc in enumerate(self._dis_tables):
+                if tabdesc == None:
+                    flat.append(None)
+                    continue
+
+                row = []
+                for obyte in xrange(256):
+                    try:
+                        tdesc, opdesc = self._dis_flat_lookup(tabid, obyte)
+                        if opdesc[0] != 0:
+                            row.append(opdesc[0])
+                            continue
+
+                        # The group tables repeat each entry many times
+                        key = (id(opdesc), tdesc[2] == 0xff)
+                        ent = entries.get(key)
+                        if ent == None:
+                            optype, mnem, consume, opers = self._dis_flat_desc(tdesc, opdesc)
+                            opers = tuple([ self._dis_flat_oper(operflags, operval) for operflags, operval in opers ])
+                            lite = self._dis_flat_lite(optype, mnem, opers)
+                            ent = entries[key] = (optype, mnem, consume, opers, lite)
+
+                    except Exception, e:
+                        # The slow way would fail for this one too
+                        ent = None
+
+                    row.append(ent)
+                flat.append(row)
+
+            flat_tables[self.__class__] = flat
+
+        self._dis_flat = flat
+        return flat
+
     def parse_modrm(self, byte, prefixes=0):
         # Pass in a string with an offset for speed rather than a new string
         mod = (byte >> 6) & 0x3
@@ -799,15 +1056,11 @@ class i386Disasm:
 
     def disasm(self, bytez, offset, va):
 
-        # Stuff for opcode parsing
-        tabdesc = all_tables[0] # A tuple (optable, shiftbits, mask byte, sub, max)
-        startoff = offset # Use startoff as a size knob if needed
-
-        # Stuff we'll be putting in the opcode object
-        optype = None # This gets set if we successfully decode below
-        mnem = None 
-        operands = []
+        flat = self._dis_flat
+        if flat is None:
+            flat = self._dis_flatten()
 
+        startoff = offset # Use startoff as a size knob if needed
         prefixes = 0
 
         while True:
@@ -824,91 +1077,59 @@ class i386Disasm:
             offset += 1
             continue
 
-        #pdone = False
+        # Hop through the ( flattened ) tables for multi-byte opcodes
+        tabid = 0
         while True:
 
             obyte = ord(bytez[offset])
+            ent = flat[tabid][obyte]
+            if ent.__class__ is not int:
+                break
 
-            #print "OBYTE",hex(obyte)
-            if (obyte > tabdesc[4]):
-                #print "Jumping To Overflow Table:", tabdesc[5]
-                tabdesc = all_tables[tabdesc[5]]
-
-            tabidx = ((obyte - tabdesc[3]) >> tabdesc[1]) & tabdesc[2]
-            #print "TABIDX: %d" % tabidx
-            opdesc = tabdesc[0][tabidx]
-            #print 'OPDESC: %s' % repr(opdesc)
-
-            # Hunt down multi-byte opcodes
-            nexttable = opdesc[0]
-            #print "NEXT",nexttable,hex(obyte)
-            if nexttable != 0: # If we have a sub-table specified, use it.
-                #print "Multi-Byte Next Hop For",hex(obyte),opdesc[0]
-                tabdesc = all_tables[nexttable]
-
-                # In the case of 66 0f, the next table is *already* assuming we ate
-                # the 66 *and* the 0f...  oblidge them.
-                if obyte == 0x66 and ord(bytez[offset+1]) == 0x0f:
-                    offset += 1
-
-                # Account for the table jump we made
+            # In the case of 66 0f, the next table is *already* assuming we ate
+            # the 66 *and* the 0f...  oblidge them.
+            if obyte == 0x66 and ord(bytez[offset+1]) == 0x0f:
                 offset += 1
 
-                continue
+            # Account for the table jump we made
+            offset += 1
+            tabid = ent
+
+        if ent is None:
+            raise envi.InvalidInstruction(bytez=bytez[startoff:startoff+16], va=va)
 
-            # We are now on the final table...
-            #print repr(opdesc)
-            mnem = opdesc[6]
-            optype = opdesc[1]
-            if tabdesc[2] == 0xff:
-                offset += 1 # For our final opcode byte
-            break
+        optype, mnem, consume, opers, lite = ent
+        offset += consume
 
         if optype == 0:
-            #print tabidx
-            #print opdesc
-            #print "OPTTYPE 0"
             raise envi.InvalidInstruction(bytez=bytez[startoff:startoff+16], va=va)
 
+        # Which of the precomputed operand sizes ( see _dis_tsize_prefixes )
+        tsizeidx = 0
+        if prefixes & PREFIX_OP_SIZE:
+            tsizeidx = 1
+
+        operands = []
         operoffset = 0
         # Begin parsing operands based off address method
-        for i in operand_range:
+        for operflags, addrmeth, ameth, tsizes, operval, isimm in opers:
 
             oper = None # Set this if we end up with an operand
             osize = 0
-
-            # Pull out the operand description from the table
-            operflags = opdesc[i]
-            opertype = operflags & opcode86.OPTYPE_MASK
-            addrmeth = operflags & opcode86.ADDRMETH_MASK
-
-            # If there are no more operands, break out of the loop!
-            if operflags == 0:
-                break
-
-            #print "ADDRTYPE: %.8x OPERTYPE: %.8x" % (addrmeth, opertype)
-
-            tsize = self._dis_calc_tsize(opertype, prefixes, operflags)
-
-            #print hex(opertype),hex(addrmeth), hex(tsize)
-
+            tsize = tsizes[tsizeidx]
 
             # If addrmeth is zero, we have operands embedded in the opcode
             if addrmeth == 0:
-                osize = 0
-                oper = self.ameth_0(operflags, opdesc[5+i], tsize, prefixes)
+                oper = self.ameth_0(operflags, operval, tsize, prefixes)
 
             else:
-                #print "ADDRTYPE",hex(addrmeth)
-                ameth = self._dis_amethods[addrmeth >> 16]
-                #print "AMETH",ameth
-                if ameth == None:
+                if ameth is None:
                     raise Exception("Implement Addressing Method 0x%.8x" % addrmeth)
 
                 # NOTE: Depending on your addrmethod you may get beginning of operands, or offset
                 try:
-                    if addrmeth == opcode86.ADDRMETH_I or addrmeth == opcode86.ADDRMETH_J:
-                        osize, oper = ameth(bytez, offset+operoffset, tsize, prefixes, operflags)
+                    if isimm:
+                        osize, oper = ameth(self, bytez, offset+operoffset, tsize, prefixes, operflags)
 
                         # If we are a sign extended immediate and not the same as the other operand,
                         # do the sign extension during disassembly so nothing else has to worry about it..
@@ -918,15 +1139,13 @@ class i386Disasm:
                             oper.tsize = otsize
 
                     else:
-                        osize, oper = ameth(bytez, offset, tsize, prefixes, operflags)
+                        osize, oper = ameth(self, bytez, offset, tsize, prefixes, operflags)
 
                 except struct.error, e:
                     # Catch struct unpack errors due to insufficient data length
                     raise envi.InvalidInstruction(bytez=bytez[startoff:startoff+16])
 
-            if oper != None:
-                # This is a filty hack for now...
-                oper._dis_regctx = self._dis_regctx
+            if oper is not None:
                 operands.append(oper)
 
             operoffset += osize
@@ -941,13 +1160,147 @@ class i386Disasm:
             iflags |= envi.IF_PRIV
 
         # Lea will have a reg-mem/sib operand with _is_deref True, but should be false
-        if optype == opcode86.INS_LEA:
+        # ( the register form is invalid, but still decodes )
+        if optype == opcode86.INS_LEA and operands[1].isDeref():
             operands[1]._is_deref = False
 
         ret = i386Opcode(va, optype, mnem, prefixes, (offset-startoff)+operoffset, operands, iflags)
 
         return ret
 
+    def _dis_bulk_prefixes(self, bytez, offset):
+        '''
+        Return the ( prefixes, tabid, offset ) for the instruction at the
+        offset ( or None to leave it to disasm() ).
+        '''
+        prefixes = 0
+        while True:
+            obyte = ord(bytez[offset])
+            p = self._dis_prefixes[obyte]
+            if p == None:
+                break
+            if obyte == 0x66 and ord(bytez[offset+1]) == 0x0f:
+                break
+            prefixes |= p
+            offset += 1
+        return prefixes, 0, offset
+
+    def disasmBulk(self, ops, bytez, offset, va, endoff, stopflags=0):
+        '''
+        Linear sweep decode the instructions from offset up to endoff into
+        the envi.OpcodeArrays ( see ArchitectureModule.archParseOpcodes ).
+
+        Only the lengths of the operands are worked out ( see
+        _dis_flat_lite ), the rare opcodes which need more are decoded
+        with disasm().
+        '''
+        flat = self._dis_flat
+        if flat is None:
+            flat = self._dis_flatten()
+
+        # Check for the tsize picking prefixes in order of precedence
+        tsizechecks = [ (p, i) for i, p in enumerate(self._dis_tsize_prefixes) if p ]
+        tsizechecks.reverse()
+
+        hop660f = self._dis_hop_660f
+        buflen = len(bytez)
+        baseva = va - offset
+
+        offsets = ops.offsets
+        sizes = ops.sizes
+        mnems = ops.mnems
+        iflagss = ops.iflags
+        targets = ops.targets
+
+        while offset < endoff:
+            startoff = offset
+            try:
+                lite = None
+                pre = self._dis_bulk_prefixes(bytez, offset)
+                if pre is not None:
+                    prefixes, tabid, offset = pre
+
+                    while True:
+                        obyte = ord(bytez[offset])
+                        ent = flat[tabid][obyte]
+                        if ent.__class__ is not int:
+                            break
+                        if hop660f and obyte == 0x66 and ord(bytez[offset+1]) == 0x0f:
+                            offset += 1
+                        offset += 1
+                        tabid = ent
+
+                    if ent is None:
+                        offset = startoff
+                        ops.invalid = True
+                        break
+
+                    lite = ent[4]
+
+                if lite is None:
+                    op = self.disasm(bytez, startoff, baseva + startoff)
+                    ops.addOpcode(startoff, op)
+                    offset = startoff + op.size
+                    if op.iflags & stopflags:
+                        break
+                    continue
+
+                offset += ent[2]
+                mnemid, iflags, lens, target = lite
+
+                tsizeidx = 0
+                for p, i in tsizechecks:
+                    if prefixes & p:
+                        tsizeidx = i
+                        break
+
+                size = offset - startoff
+                for olen, tsizes in lens:
+                    if olen >= 0:
+                        size += olen
+                    elif olen == LITE_MODRM:
+                        mrm = ord(bytez[offset])
+                        if mrm & 0xc7 == 0x04 and ord(bytez[offset+1]) & 7 == 5:
+                            size += 6
+                        else:
+                            size += modrm_lens[mrm]
+                    else:
+                        size += tsizes[tsizeidx]
+
+                # disasm() would run out of bytes
+                if startoff + size > buflen:
+                    offset = startoff
+                    ops.invalid = True
+                    break
+
+                if prefixes & PREFIX_REP_MASK:
+                    iflags |= envi.IF_REPEAT
+
+                tva = None
+                if target:
+                    tsize = lens[0][1][tsizeidx]
+                    if target == opcode86.ADDRMETH_J:
+                        tva = baseva + startoff + size + e_bits.parsebytes(bytez, offset, tsize, sign=True)
+                    else:
+                        tva = e_bits.parsebytes(bytez, offset, tsize)
+
+            except Exception, e:
+                offset = startoff
+                ops.invalid = True
+                break
+
+            offsets.append(startoff)
+            sizes.append(size)
+            mnems.append(mnemid)
+            iflagss.append(iflags)
+            targets.append(tva)
+
+            offset = startoff + size
+            if iflags & stopflags:
+                break
+
+        ops.endoff = offset
+
     # Declare all the address method parsers here!
 
     def ameth_0(self, operflags, operval, tsize, prefixes):
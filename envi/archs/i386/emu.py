@@ -7,6 +7,7 @@ import envi
 from envi.const import *
 import envi.bits as e_bits
 import envi.memory as e_mem
+import envi.registers as e_reg
 
 from envi.archs.i386.regs import *
 from envi.archs.i386.disasm import *
@@ -81,6 +82,11 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
     flagidx = REG_EFLAGS
     accumreg = { 1:REG_AL, 2:REG_AX, 4:REG_EAX }
 
+    # The getRegister() / setRegister() which are safe to skip for full
+    # width registers ( by going straight to the register array )
+    plainregs = (e_reg.RegisterContext.getRegister.im_func,
+                 e_reg.RegisterContext.setRegister.im_func)
+
     def __init__(self, archmod=None):
         # Set ourself up as an arch module *and* register context
         #i386Module.__init__(self)
@@ -102,6 +108,15 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
         self.addCallingConvention('msfastcall', msfastcall)
         self.addCallingConvention('bfastcall', bfastcall)
 
+        # The opcode handlers by i386Opcode.mnemid ( grown on demand )
+        self.op_handlers = []
+
+        # Unless a subclass hooks getRegister() / setRegister() ( to
+        # track register use etc ) the operand and flag helpers use the
+        # register array directly.
+        cls = self.__class__
+        self._emu_directregs = (cls.getRegister.im_func, cls.setRegister.im_func) == self.plainregs
+
     def getSegmentIndex(self, op):
         # FIXME this needs to account for push/pop/etc
         if op.prefixes == 0:
@@ -121,17 +136,43 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
         return SEG_DS
 
     def setFlag(self, which, state):
-        flags = self.getRegister(self.flagidx)
+        if not self._emu_directregs:
+            flags = self.getRegister(self.flagidx)
+            if state:
+                flags |= which
+            else:
+                flags &= ~which
+            self.setRegister(self.flagidx, flags)
+            return
+
+        self._rctx_dirty = True
         if state:
-            flags |= which
+            self._rctx_vals[self.flagidx] |= which
         else:
-            flags &= ~which
-        self.setRegister(self.flagidx, flags)
+            self._rctx_vals[self.flagidx] &= ~which
 
     def getFlag(self, which):
+        if self._emu_directregs:
+            return bool(self._rctx_vals[self.flagidx] & which)
         flags = self.getRegister(self.flagidx)
         return bool(flags & which)
 
+    def getOperValue(self, op, idx):
+        oper = op.opers[idx]
+        # Full width registers come straight from the register array
+        if oper.__class__ is i386RegOper and oper.reg <= RMETA_NMASK and self._emu_directregs:
+            return self._rctx_vals[oper.reg]
+        return oper.getOperValue(op, self)
+
+    def setOperValue(self, op, idx, value):
+        oper = op.opers[idx]
+        if oper.__class__ is i386RegOper and oper.reg <= RMETA_NMASK and self._emu_directregs:
+            reg = oper.reg
+            self._rctx_dirty = True
+            self._rctx_vals[reg] = value & self._rctx_masks[reg]
+            return
+        return oper.setOperValue(op, self, value)
+
     def readMemValue(self, addr, size):
         bytes = self.readMemory(addr, size)
         if bytes == None:
@@ -185,14 +226,29 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
         elif size == 4:
             return struct.unpack("<l", bytes)[0]
 
+    def _getOpHandler(self, op):
+        # Add the handlers for any mnemonics seen since we last looked
+        for mnem in mnem_names[len(self.op_handlers):]:
+            self.op_handlers.append(self.op_methods.get(mnem))
+        return self.op_handlers[op.mnemid]
+
     def executeOpcode(self, op):
         # NOTE: If an opcode method returns
         #       other than None, that is the new eip
+        direct = self._emu_directregs
         if op.va != None:
-            self.setProgramCounter(op.va)
+            if direct:
+                self._rctx_dirty = True
+                self._rctx_vals[self._rctx_pcindex] = op.va
+            else:
+                self.setProgramCounter(op.va)
 
-        meth = self.op_methods.get(op.mnem, None)
-        if meth == None:
+        try:
+            meth = self.op_handlers[op.mnemid]
+        except IndexError:
+            meth = self._getOpHandler(op)
+
+        if meth is None:
             raise envi.UnsupportedInstruction(self, op)
 
         newpc = meth(op)
@@ -213,6 +269,11 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
                 self.setProgramCounter(op.va)
                 return
 
+        if direct:
+            pcidx = self._rctx_pcindex
+            self._rctx_vals[pcidx] = (self._rctx_vals[pcidx] + op.size) & self._rctx_masks[pcidx]
+            return
+
         pc = self.getProgramCounter()
         newpc = pc+op.size
         self.setProgramCounter(newpc)
@@ -244,7 +244,8 @@ def decode8(workData, opData, va):
             DOUBLE_OPCODE_TYPE,
             dcode[dcode_val],
             [ Msp430Operands[ds_addr_mode](dsreg, opData, dsopsize, va), Msp430Operands[dest_addr_mode](destreg, opData, destopsize, va) ],
-            op_bw
+            op_bw,
+            opData.lenData()
             )
 
 def decode9(workData, opData, va):
@@ -331,6 +332,11 @@ decode_function = (
 
 class Msp430Opcode(envi.Opcode):
 
+    __slots__ = ()
+
+    # Every opcode ( and so operand ) shares the one register context
+    _dis_regctx = Msp430RegisterContext()
+
     def __init__(self, va, opcode, mnem, opers, iflags=0, size=0):
         self.va = va
         self.opcode = opcode
@@ -446,6 +452,8 @@ def renderPossibleLocation(mcanv, op, idx, value):
 
 class Msp430Operand(envi.Operand):
 
+    __slots__ = ('val', 'tsize', 'va')
+
     def __init__(self, val, inData, tsize=2, va=0):
         self.val = val
         self.tsize = tsize
@@ -459,11 +467,13 @@ class Msp430Operand(envi.Operand):
         if hint != None:
             mcanv.addNameText(hint, typename="registers")
         else:
-            name = self._dis_regctx.getRegisterName(reg)
-            rname = self._dis_regctx.getRegisterName(reg&RMETA_NMASK)
+            name = op._dis_regctx.getRegisterName(reg)
+            rname = op._dis_regctx.getRegisterName(reg&RMETA_NMASK)
             mcanv.addNameText(name, name=rname, typename="registers")
 
 class Msp430RegDirectOper(Msp430Operand):
+    __slots__ = ()
+
     def __repr__(self):
         # Register direct
         if self.val == 0x3:
@@ -498,6 +508,8 @@ class Msp430RegDirectOper(Msp430Operand):
         return emu.setRegister(self.val, val)
 
 class Msp430RegIndexOper(Msp430Operand):
+    __slots__ = ('new_val',)
+
     def __init__(self, val, inData, tsize=0, va=0):
         Msp430Operand.__init__(self, val, inData, tsize, va)
         if val != 3:
@@ -580,6 +592,8 @@ class Msp430RegIndexOper(Msp430Operand):
         return True
 
 class Msp430RegIndirOper(Msp430Operand):
+    __slots__ = ()
+
     def __repr__(self):
         # Register indirect
         if self.val == 0x2:
@@ -637,6 +651,8 @@ class Msp430RegIndirOper(Msp430Operand):
         return True
 
 class Msp430RegIndirAutoincOper(Msp430Operand):
+    __slots__ = ('new_val',)
+
     def __init__(self, val, inData, tsize, va=0):
         Msp430Operand.__init__(self, val, inData, tsize, va)
         if val == 0:
@@ -713,6 +729,8 @@ class Msp430RegIndirAutoincOper(Msp430Operand):
         return True
 
 class Msp430JmpOper(Msp430Operand):
+    __slots__ = ()
+
     def __init__(self, val, inData, tsize, va=0):
         if (val > 0xff):
             jmp_val = va + (2 * ((val & 511) - 512)) + 2
@@ -745,7 +763,7 @@ class Msp430JmpOper(Msp430Operand):
 
 class Msp430Disasm:
     def __init__(self):
-        self._dis_regctx = Msp430RegisterContext()
+        self._dis_regctx = Msp430Opcode._dis_regctx
         self._dis_oparch = envi.ARCH_MSP430
 
     # FIXME: Msp430Data is kinda kludgy and should be wrapped into the disasm logic
@@ -785,9 +803,6 @@ class Msp430Disasm:
                     # This doesn't see to allow returning the function
                     # Have to set a variable
                     result =  decode_function[(((workData & DOUBLE_OPCODE) >> 12) - 4)](workData, opData, va)
-                    # FILTHY HACK
-                    for oper in result.opers:
-                        oper._dis_regctx = self._dis_regctx
                     return result
                 else:
                     # It is a Jump Opcode
@@ -800,9 +815,6 @@ class Msp430Disasm:
                             flags,
                             opData.lenData()
                             )
-                    # FILTHY HACK
-                    for oper in op.opers:
-                        oper._dis_regctx = self._dis_regctx
                     return op
             else:
                 # Test to see of primary input is not opcode
@@ -841,9 +853,6 @@ class Msp430Disasm:
                             flags,
                             opData.lenData()
                             )
-                    # FILTHY HACK
-                    for oper in op.opers:
-                        oper._dis_regctx = self._dis_regctx
                     return op
         # Primary Functional registers index values
         #REG_PC = 0  # reg0 is the Program Counter
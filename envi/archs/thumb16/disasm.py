@@ -943,6 +943,10 @@ ttree2 = e_btree.BinaryTree()
 for binstr, opinfo in thumb2_table:
     ttree2.addBinstr(binstr, opinfo)
 
+# The trees flattened into ( two level ) tables indexed by the halfword
+ttable = ttree.getIndexTable(16)
+ttable2 = ttree2.getIndexTable(16)
+
 thumb32mask = binary('11111')
 thumb32min  = binary('11100')
 
@@ -957,22 +961,25 @@ def is_thumb32(val):
 
 
 class ThumbOpcode(ArmOpcode):
+    __slots__ = ()
     _def_arch = envi.ARCH_THUMB16
     pass
 
 class Thumb2Opcode(ArmOpcode):
+    __slots__ = ()
     _def_arch = envi.ARCH_THUMB2
     pass
 
 class Thumb16Disasm:
     _tree = ttree
+    _table = ttable
     _optype = envi.ARCH_THUMB16
     _opclass = ThumbOpcode
 
     def disasm(self, bytez, offset, va, trackMode=True):
         val, = struct.unpack("<H", bytez[offset:offset+2])
         try:
-            opcode, mnem, opermkr, flags = self._tree.getInt(val, 16)
+            opcode, mnem, opermkr, flags = self._table[val >> 8][val & 0xff]
         except TypeError:
             raise envi.InvalidInstruction(
                     mesg="disasm parser cannot find instruction",
@@ -1008,6 +1015,7 @@ class Thumb16Disasm:
 
 class Thumb2Disasm ( Thumb16Disasm ):
     _tree = ttree2
+    _table = ttable2
     _optype = envi.ARCH_THUMB2
     _opclass = Thumb2Opcode
 
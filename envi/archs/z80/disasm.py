@@ -20,10 +20,14 @@ for row in z80_opcode.z80table:
 
 
 class z80RegOper(envi.RegisterOper):
+    __slots__ = ('reg',)
+
     def __init__(self, reg):
         self.reg = reg
 
 class z80ImmOper(envi.ImmedOper):
+    __slots__ = ('imm',)
+
     def __init__(self, imm):
         self.imm = imm
 
@@ -31,9 +35,11 @@ class z80ImmOper(envi.ImmedOper):
         return '%.4xH' % self.imm
 
 class z80ConstOper(z80ImmOper):
-    pass
+    __slots__ = ()
 
 class z80RegMem(envi.DerefOper):
+    __slots__ = ('reg', 'disp')
+
     def __init__(self, reg, disp = 0):
         self.reg = reg
         self.disp = disp
@@ -47,7 +53,7 @@ class z80RegMem(envi.DerefOper):
         return '(%s)' % rname
 
 class z80Opcode(envi.Opcode):
-    pass
+    __slots__ = ()
 
 class z80Disasm:
 
@@ -0,0 +1,83 @@
+'''
+Shared helpers for the envi (and vivisect) benchmark modules.
+
+Each benchmark is a plain module with a main() so it may be run
+directly from a checkout:
+
+    python -m envi.benchmarks.memory
+'''
+import gc
+import os
+import json
+import time
+import resource
+
+def getRss():
+    '''
+    Return the current resident set size (in bytes) for this process.
+    ( falls back to the peak RSS on platforms without /proc )
+    '''
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize()
+    except (IOError, OSError):
+        return getPeakRss()
+
+def getPeakRss():
+    '''
+    Return the peak resident set size (in bytes) for this process.
+    '''
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if os.uname()[0] == 'Darwin':
+        return maxrss
+    return maxrss * 1024
+
+def timeit(func, *args, **kwargs):
+    '''
+    Call func(*args, **kwargs) and return an (elapsed, retval) tuple.
+
+    Example:
+        elapsed, vw = timeit(loadit, filename)
+    '''
+    start = time.time()
+    ret = func(*args, **kwargs)
+    return time.time() - start, ret
+
+def rssdelta(func, *args, **kwargs):
+    '''
+    Call func(*args, **kwargs) and return an (rssdelta, retval) tuple
+    where rssdelta is the growth (in bytes) of the resident set.
+    '''
+    gc.collect()
+    before = getRss()
+    ret = func(*args, **kwargs)
+    gc.collect()
+    return getRss() - before, ret
+
+def rate(count, elapsed):
+    '''
+    Return count/elapsed without blowing up on very fast runs.
+    '''
+    if elapsed <= 0:
+        return float(count)
+    return count / elapsed
+
+def printResults(title, rows):
+    '''
+    Print a list of (name, value) result tuples.
+    '''
+    print(title)
+    width = max([ len(name) for name, value in rows ] + [0])
+    for name, value in rows:
+        if isinstance(value, float):
+            value = '%.2f' % value
+        print('    %s  %s' % (name.ljust(width), value))
+
+def saveResults(filename, results):
+    '''
+    Save a results dictionary as JSON so runs may be compared
+    between commits.
+    '''
+    with open(filename, 'wb') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
@@ -0,0 +1,365 @@
+'''
+The disassembler throughput and differential harness.
+
+Sweep the code sections of PE files ( by default the bundled i386 and
+amd64 test binaries ), any raw code corpus files ( -c arch:file ) and,
+for each architecture, a block of random bytes and a stream of the
+instructions which decode out of another block of random bytes.  Each
+stream is swept one archParseOpcode() at a time and in bulk ( with
+archParseOpcodes() ), and the results are:
+
+    * the instructions/sec for each sweep
+    * the bytes per instruction an opcode cache pays for each Opcode
+      ( and its operands ) and the objects left for the cyclic GC
+    * a digest of the decode ( the mnemonic, size, iflags and operand
+      reprs of each instruction ) for the stream and for each 4k block
+
+Save the digests ( -g ) from the reference decoder and diff ( -d ) an
+optimized one against them to list the blocks which decode differently.
+An arch which is not available reports the error.
+
+Each measurement is the best of -n runs ( the box is rarely quiet ).
+
+Usage: python -m envi.benchmarks.disasm [-a i386,amd64,arm,thumb,msp430,z80] [-r <bytes>] [-c <arch>:<file>] [-n 3] [-g|-d <digests.json>] [-o <results.json>] [<pe file> ...]
+'''
+import gc
+import os
+import sys
+import json
+import random
+import hashlib
+import optparse
+
+import PE
+import envi
+import envi.benchmarks as e_bench
+
+def getBundledBinaries():
+    '''
+    Return the test binaries which ship with ( a checkout of ) vivisect.
+    '''
+    dirname = os.path.join(os.path.dirname(os.path.dirname(envi.__file__)), 'vtrace', 'platforms', 'windll')
+    return [ os.path.join(dirname, arch, 'symsrv.dll') for arch in ('i386', 'amd64') ]
+
+def getPeCode(filename):
+    '''
+    Return the ( archname, [ (va, bytes), ... ] ) for the executable
+    sections of the PE file.
+    '''
+    pe = PE.peFromFileName(filename)
+    archname = PE.machine_names.get(pe.IMAGE_NT_HEADERS.FileHeader.Machine)
+    baseva = pe.IMAGE_NT_HEADERS.OptionalHeader.ImageBase
+
+    chunks = []
+    for sec in pe.getSections():
+        if not sec.Characteristics & PE.IMAGE_SCN_MEM_EXECUTE:
+            continue
+        bytez = pe.readAtRva(sec.VirtualAddress, sec.VirtualSize, shortok=True)
+        chunks.append((baseva + sec.VirtualAddress, bytez))
+    return archname, chunks
+
+def getRandomCode(size, seed=0x646973):
+    '''
+    Return a [ (va, bytes) ] of random bytes ( mostly invalid and rare
+    opcodes, the worst case for the decoder ).
+    '''
+    rnd = random.Random(seed)
+    return [ (0x400000, ''.join([ chr(rnd.randrange(256)) for i in xrange(size) ])) ]
+
+def getValidCode(archmod, size, seed=0x76616c):
+    '''
+    Return a [ (va, bytes) ] of the ( about size bytes of ) instructions
+    which decode out of a block of random bytes ( so mostly valid code
+    with a much wider mix of opcodes than any compiler output ).
+    '''
+    va, bytez = getRandomCode(size * 4, seed=seed)[0]
+    ret = []
+    total = 0
+    offset = 0
+    while offset < len(bytez) and total < size:
+        try:
+            op = archmod.archParseOpcode(bytez, offset, va + offset)
+            ret.append(bytez[offset:offset + op.size])
+            total += op.size
+            offset += op.size
+        except Exception, e:
+            offset += 1
+    return [ (va, ''.join(ret)) ]
+
+def getCorpusCode(filename, va=0x400000):
+    '''
+    Return the [ (va, bytes) ] for a raw code corpus file.
+    '''
+    with open(filename, 'rb') as f:
+        return [ (va, f.read()) ]
+
+def sweep(archmod, chunks):
+    '''
+    Disassemble each chunk front to back ( skipping a byte on each
+    decode error ) and return the ( instructions, errors ) tuple.
+    '''
+    count = 0
+    errors = 0
+    for va, bytez in chunks:
+        offset = 0
+        size = len(bytez)
+        while offset < size:
+            try:
+                op = archmod.archParseOpcode(bytez, offset, va + offset)
+                offset += op.size
+                count += 1
+            except Exception, e:
+                offset += 1
+                errors += 1
+    return count, errors
+
+def bulkSweep(archmod, chunks):
+    '''
+    Like sweep(), but using archParseOpcodes() ( which only fills in the
+    OpcodeArrays columns ).
+    '''
+    count = 0
+    errors = 0
+    for va, bytez in chunks:
+        offset = 0
+        size = len(bytez)
+        while offset < size:
+            ops = archmod.archParseOpcodes(bytez, offset, va + offset)
+            count += len(ops)
+            offset = ops.endoff
+            if ops.invalid:
+                offset += 1
+                errors += 1
+    return count, errors
+
+def getOpcodeBytes(op):
+    '''
+    Return the bytes used by the Opcode, its operand list and operands
+    ( including any instance __dict__s, but not the values they share ).
+    '''
+    size = sys.getsizeof(op.opers)
+    for obj in [op] + list(op.opers):
+        size += sys.getsizeof(obj)
+        d = getattr(obj, '__dict__', None)
+        if d != None:
+            size += sys.getsizeof(d)
+    return size
+
+def parseAll(archmod, chunks):
+    '''
+    Sweep the chunks and return the list of Opcodes ( as an opcode cache
+    would hold them ).
+    '''
+    ret = []
+    for va, bytez in chunks:
+        offset = 0
+        size = len(bytez)
+        while offset < size:
+            try:
+                op = archmod.archParseOpcode(bytez, offset, va + offset)
+                offset += op.size
+                ret.append(op)
+            except Exception, e:
+                offset += 1
+    return ret
+
+def getOpcodeCosts(archmod, chunks):
+    '''
+    Return the ( bytes, objects ) per Opcode held by an opcode cache
+    ( the objects are those left for the cyclic GC ).
+    '''
+    gc.collect()
+    objcount = len(gc.get_objects())
+    ops = parseAll(archmod, chunks)
+    # Not counting the list itself
+    objects = len(gc.get_objects()) - objcount - 1
+
+    count = max(len(ops), 1)
+    size = sum([ getOpcodeBytes(op) for op in ops ])
+    return float(size) / count, float(objects) / count
+
+def getDecodeLine(op):
+    '''
+    Return the line which stands for the decoded instruction in the digests.
+    '''
+    opers = ','.join([ oper.repr(op) for oper in op.opers ])
+    return '%.8x %d %s 0x%x %s\n' % (op.va, op.size, op.mnem, op.iflags, opers)
+
+def getDigests(archmod, chunks, blocksize=0x1000):
+    '''
+    Sweep the chunks and return a dict of the digest for all of them and
+    the [ (va, digest), ... ] for each blocksize bytes.
+    '''
+    total = hashlib.md5()
+    blocks = []
+    for va, bytez in chunks:
+        offset = 0
+        size = len(bytez)
+        while offset < size:
+            md5 = hashlib.md5()
+            blockva = va + offset
+            blockend = min(offset + blocksize, size)
+            while offset < blockend:
+                try:
+                    op = archmod.archParseOpcode(bytez, offset, va + offset)
+                    line = getDecodeLine(op)
+                    offset += op.size
+                except Exception, e:
+                    line = '%.8x error\n' % (va + offset)
+                    offset += 1
+                md5.update(line)
+                total.update(line)
+            blocks.append((blockva, md5.hexdigest()))
+    return {'digest':total.hexdigest(), 'blocks':blocks}
+
+def diffDigests(golden, digests):
+    '''
+    Return the list of block vas which decode differently than in the
+    golden digests ( or None if the stream is not in them ).
+    '''
+    if golden == None:
+        return None
+    if golden['digest'] == digests['digest']:
+        return []
+    ret = []
+    gblocks = dict([ (va, digest) for va, digest in golden['blocks'] ])
+    for va, digest in digests['blocks']:
+        if gblocks.pop(va, None) != digest:
+            ret.append(va)
+    ret.extend(gblocks.keys())
+    return sorted(ret)
+
+def best(repeat, func, *args):
+    '''
+    Return the ( best time, result ) of repeat calls to func.
+    '''
+    elapsed = None
+    for i in xrange(max(1, repeat)):
+        t, ret = e_bench.timeit(func, *args)
+        if elapsed == None or t < elapsed:
+            elapsed = t
+    return elapsed, ret
+
+def measure(archname, name, chunks, repeat=1):
+    '''
+    Sweep the chunks ( keeping the best of repeat runs ) and return the
+    dict of results ( or of the error, if the arch is not available ).
+    The chunks may be a function of the arch module which returns them.
+    '''
+    ret = {'arch':archname, 'name':name}
+    try:
+        archmod = envi.getArchModule(archname)
+        if callable(chunks):
+            chunks = chunks(archmod)
+    except Exception, e:
+        ret['error'] = str(e)
+        return ret
+
+    # Build anything the decoder builds on first use
+    sweep(archmod, [ (va, bytez[:256]) for va, bytez in chunks ])
+
+    elapsed, (count, errors) = best(repeat, sweep, archmod, chunks)
+    bulktime, (bulkcount, bulkerrors) = best(repeat, bulkSweep, archmod, chunks)
+    opbytes, opobjects = getOpcodeCosts(archmod, chunks)
+
+    ret.update({
+        'bytes':sum([ len(bytez) for va, bytez in chunks ]),
+        'instructions':count,
+        'errors':errors,
+        'time':elapsed,
+        'insns_sec':e_bench.rate(count, elapsed),
+        'bulk_instructions':bulkcount,
+        'bulk_time':bulktime,
+        'bulk_insns_sec':e_bench.rate(bulkcount, bulktime),
+        'bytes_per_insn':opbytes,
+        'objects_per_insn':opobjects,
+        'digests':getDigests(archmod, chunks),
+    })
+    return ret
+
+def getResultKey(res):
+    return '%s %s' % (res['arch'], res['name'])
+
+def getResultRows(results):
+    '''
+    Return the printResults() rows for the measure() results.
+    '''
+    rows = []
+    for res in results:
+        name = getResultKey(res)
+        if res.get('error'):
+            rows.append(('%s error' % name, res['error']))
+            continue
+
+        rows.append(('%s instructions' % name, res['instructions']))
+        rows.append(('%s (insns/sec)' % name, res['insns_sec']))
+        rows.append(('%s bulk (insns/sec)' % name, res['bulk_insns_sec']))
+        rows.append(('%s (bytes/insn)' % name, res['bytes_per_insn']))
+        rows.append(('%s (objects/insn)' % name, res['objects_per_insn']))
+        rows.append(('%s digest' % name, res['digests']['digest']))
+        if res['bulk_instructions'] != res['instructions']:
+            rows.append(('%s bulk instructions' % name, res['bulk_instructions']))
+        if 'diffs' in res:
+            diffs = 'not in the saved digests'
+            if res['diffs'] != None:
+                diffs = ' '.join([ '0x%.8x' % va for va in res['diffs'] ]) or 'none'
+            rows.append(('%s differing blocks' % name, diffs))
+    return rows
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] [<pe file> ...]')
+    parser.add_option('-a', dest='archs', default='i386,amd64,arm,thumb,msp430,z80', help='comma separated arch names ( for the random bytes )')
+    parser.add_option('-r', dest='randsize', default=0x10000, type='int', help='random bytes per arch ( 0 to skip )')
+    parser.add_option('-c', dest='corpus', default=[], action='append', help='<arch>:<file> raw code corpus ( may be repeated )')
+    parser.add_option('-n', dest='repeat', default=3, type='int', help='runs per measurement ( best is kept )')
+    parser.add_option('-g', dest='golden', default=None, help='save the decode digests as JSON')
+    parser.add_option('-d', dest='diff', default=None, help='diff the decode digests against saved ones')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    opts, args = parser.parse_args(argv)
+
+    if not args and not opts.corpus:
+        args = getBundledBinaries()
+
+    results = []
+    for filename in args:
+        archname, chunks = getPeCode(filename)
+        results.append(measure(archname, os.path.basename(filename), chunks, repeat=opts.repeat))
+
+    for corpus in opts.corpus:
+        archname, filename = corpus.split(':', 1)
+        results.append(measure(archname, os.path.basename(filename), getCorpusCode(filename), repeat=opts.repeat))
+
+    if opts.randsize:
+        for archname in opts.archs.split(','):
+            results.append(measure(archname, 'random', getRandomCode(opts.randsize), repeat=opts.repeat))
+            validcode = lambda archmod: getValidCode(archmod, opts.randsize)
+            results.append(measure(archname, 'valid', validcode, repeat=opts.repeat))
+
+    diffs = 0
+    if opts.diff:
+        with open(opts.diff, 'rb') as f:
+            golden = json.load(f)
+        for res in results:
+            if res.get('error'):
+                continue
+            res['diffs'] = diffDigests(golden.get(getResultKey(res)), res['digests'])
+            if res['diffs']:
+                diffs += 1
+
+    rows = getResultRows(results)
+    if opts.diff:
+        rows.append(('streams which decode differently', diffs))
+    e_bench.printResults('Disassembly ( linear sweep )', rows)
+
+    if opts.golden:
+        digests = dict([ (getResultKey(res), res['digests']) for res in results if not res.get('error') ])
+        e_bench.saveResults(opts.golden, digests)
+
+    if opts.output:
+        e_bench.saveResults(opts.output, {'disasm':results})
+
+    if diffs:
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
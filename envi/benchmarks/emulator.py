@@ -0,0 +1,198 @@
+'''
+Run synthetic instruction streams ( ALU, string, memory and flag heavy
+loops ) through each architecture's executeOpcode() and report the
+instructions/sec, the objects left for the cyclic GC per instruction and
+the peak memory.
+
+Opcodes are decoded once ( like the emulators' opcode caches ) so the
+numbers are for executeOpcode() itself.  A workload which an emulator
+can not ( yet ) run reports the error and how far it got.
+
+Usage: python -m envi.benchmarks.emulator [-a i386,amd64,arm] [-n 20000] [-o <results.json>]
+'''
+import gc
+import sys
+import struct
+import optparse
+import traceback
+
+import envi
+import envi.memory as e_mem
+import envi.benchmarks as e_bench
+
+code_base = 0x400000
+src_base = 0x500000
+dst_base = 0x600000
+stack_base = 0x700000
+map_size = 0x1000
+
+# The loop counter is never going to run out
+forever = 0x7fffffff
+
+def x86loop(hexcode, jcc='75'):
+    # The code and a ( short ) jcc back to the top
+    code = hexcode.decode('hex') + jcc.decode('hex')
+    return code + chr(-(len(code) + 1) & 0xff)
+
+def armcode(words):
+    return ''.join([ struct.pack('<I', word) for word in words ])
+
+x86_workloads = (
+    # add eax,ebx; xor edx,eax; sub ebx,1; inc esi; and edi,esi; dec ecx; jnz
+    ('alu', x86loop('01d8' '31c2' '83eb01' 'ffc6' '21f7' 'ffc9'), {'ecx':forever}),
+
+    # mov esi,src; mov edi,dst; mov ecx,64; rep movsb; mov ecx,16;
+    # mov eax,0x41414141; rep stosd; mov ecx,8; rep movsd; jmp
+    ('string', x86loop('be00005000' 'bf00006000' 'b940000000' 'f3a4' 'b910000000'
+                       'b841414141' 'f3ab' 'b908000000' 'f3a5', 'eb'), {}),
+
+    # mov eax,[esi]; mov [edi],eax; mov ebx,[esi+4]; mov [edi+4],ebx;
+    # push eax; pop ebx; add esi,8; add edi,8; and esi,0x500ff8;
+    # and edi,0x600ff8; dec ecx; jnz
+    ('memory', x86loop('8b06' '8907' '8b5e04' '895f04' '50' '5b' '83c608' '83c708'
+                       '81e6f80f5000' '81e7f80f6000' 'ffc9'),
+               {'ecx':forever, 'esi':src_base, 'edi':dst_base}),
+
+    # cmp eax,ebx; setz dl; adc ebx,ecx; sbb esi,eax; test eax,eax;
+    # cmovz edi,edx; shl eax,1; dec ebp; jnz
+    ('flags', x86loop('39d8' '0f94c2' '11cb' '19c6' '85c0' '0f44fa' 'd1e0' 'ffcd'),
+              {'ebp':forever, 'eax':3, 'ebx':5}),
+)
+
+arm_workloads = (
+    # add r0,r0,r1; eor r2,r2,r0; sub r1,r1,#1; orr r4,r4,r2;
+    # and r5,r4,r0; subs r3,r3,#1; bne
+    ('alu', armcode([0xe0800001, 0xe0222000, 0xe2411001, 0xe1844002, 0xe0045000,
+                     0xe2533001, 0x1afffff8]), {'r3':forever, 'r1':7}),
+
+    # ( block transfers ) ldmia r5!,{r0-r3}; stmia r6!,{r0-r3};
+    # bic r5,r5,#0x1000; bic r6,r6,#0x1000; subs r9,r9,#1; bne
+    ('string', armcode([0xe8b5000f, 0xe8a6000f, 0xe3c55a01, 0xe3c66a01, 0xe2599001,
+                        0x1afffff9]), {'r9':forever, 'r5':src_base, 'r6':dst_base}),
+
+    # ldr r4,[r5],#4; str r4,[r6],#4; ldr r7,[r5]; str r7,[r6];
+    # bic r5,r5,#0x1000; bic r6,r6,#0x1000; push {r4}; pop {r8};
+    # subs r3,r3,#1; bne
+    ('memory', armcode([0xe4954004, 0xe4864004, 0xe5957000, 0xe5867000, 0xe3c55a01,
+                        0xe3c66a01, 0xe52d4004, 0xe49d8004, 0xe2533001, 0x1afffff5]),
+               {'r3':forever, 'r5':src_base, 'r6':dst_base}),
+
+    # cmp r0,r1; addeq r2,r2,#1; adds r4,r4,r0; adcs r5,r5,r1;
+    # sbcs r6,r6,r0; movne r7,r4; tst r0,#1; subs r3,r3,#1; bne
+    ('flags', armcode([0xe1500001, 0x02822001, 0xe0944000, 0xe0b55001, 0xe0d66000,
+                       0x11a07004, 0xe3100001, 0xe2533001, 0x1afffff6]),
+              {'r3':forever, 'r0':3, 'r1':3}),
+)
+
+workloads = {
+    'i386':x86_workloads,
+    'amd64':x86_workloads,
+    'arm':arm_workloads,
+}
+
+def getEmulator(archname, code, regs):
+    '''
+    Return an emulator for the arch with the code, a source and a
+    destination buffer and a stack mapped in ( and the regs set ).
+    '''
+    emu = envi.getArchModule(archname).getEmulator()
+    # Not all the emulators set their memory object arch
+    emu.setMemArchitecture(envi.getArchByName(archname))
+
+    srcbytes = ''.join([ struct.pack('<I', i) for i in xrange(map_size / 4) ])
+    emu.addMemoryMap(code_base, e_mem.MM_READ | e_mem.MM_EXEC, 'code', code.ljust(map_size, '\x00'))
+    emu.addMemoryMap(src_base, e_mem.MM_READ | e_mem.MM_WRITE, 'src', srcbytes)
+    emu.addMemoryMap(dst_base, e_mem.MM_READ | e_mem.MM_WRITE, 'dst', '\x00' * map_size)
+    emu.addMemoryMap(stack_base, e_mem.MM_READ | e_mem.MM_WRITE, 'stack', '\x00' * map_size)
+    emu.setStackCounter(stack_base + map_size / 2)
+
+    for rname, rval in regs.items():
+        emu.setRegisterByName(rname, rval)
+
+    emu.setProgramCounter(code_base)
+    return emu
+
+def runStream(emu, count):
+    '''
+    Execute count instructions ( decoding each address once ) and return
+    the ( executed, error ) tuple.
+    '''
+    ops = {}
+    for i in xrange(count):
+        pc = emu.getProgramCounter()
+        try:
+            op = ops.get(pc)
+            if op is None:
+                op = emu.parseOpcode(pc)
+                ops[pc] = op
+            emu.executeOpcode(op)
+        except Exception, e:
+            return i, '0x%.8x: %s' % (pc, traceback.format_exception_only(e.__class__, e)[-1].strip())
+    return count, None
+
+def measure(archname, name, code, regs, count):
+    '''
+    Run one workload and return the dict of results.
+    '''
+    ret = {'arch':archname, 'workload':name}
+    try:
+        emu = getEmulator(archname, code, regs)
+    except Exception, e:
+        ret['error'] = str(e)
+        return ret
+
+    gc.collect()
+    objcount = len(gc.get_objects())
+    elapsed, (executed, error) = e_bench.timeit(runStream, emu, count)
+    objects = len(gc.get_objects()) - objcount
+
+    ret['instructions'] = executed
+    ret['time'] = elapsed
+    ret['insns_sec'] = e_bench.rate(executed, elapsed)
+    ret['objects_per_insn'] = float(objects) / max(executed, 1)
+    ret['peakrss'] = e_bench.getPeakRss()
+    if error != None:
+        ret['error'] = error
+    return ret
+
+def runSuite(archnames, count):
+    '''
+    Run every workload for each of the arch names and return the list of
+    results.
+    '''
+    ret = []
+    for archname in archnames:
+        for name, code, regs in workloads[archname]:
+            ret.append(measure(archname, name, code, regs, count))
+    return ret
+
+def getResultRows(results):
+    '''
+    Return the printResults() rows for the runSuite() results.
+    '''
+    rows = []
+    for res in results:
+        name = '%s %s' % (res['arch'], res['workload'])
+        if res.get('instructions'):
+            rows.append(('%s (insns/sec)' % name, res['insns_sec']))
+            rows.append(('%s (objects/insn)' % name, res['objects_per_insn']))
+        if res.get('error'):
+            rows.append(('%s error' % name, res['error']))
+    return rows
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-a', dest='archs', default='i386,amd64,arm', help='comma separated arch names')
+    parser.add_option('-n', dest='count', default=20000, type='int', help='instructions per workload')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    opts, args = parser.parse_args(argv)
+
+    results = runSuite(opts.archs.split(','), opts.count)
+    rows = getResultRows(results)
+    rows.append(('peak rss', e_bench.getPeakRss()))
+    e_bench.printResults('Emulator instruction streams', rows)
+    if opts.output:
+        e_bench.saveResults(opts.output, {'streams':results})
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,55 @@
+'''
+Micro benchmark for MemoryObject map lookups and reads against an
+object with many ( default 5000 ) memory maps.
+
+Usage: python -m envi.benchmarks.memory [-m <maps>] [-n <reads>]
+'''
+import sys
+import random
+import optparse
+
+import envi.memory as e_mem
+import envi.benchmarks as e_bench
+
+def buildMemory(mapcount, mapsize=0x1000):
+    mem = e_mem.MemoryObject()
+    for i in xrange(mapcount):
+        mem.addMemoryMap(0x10000000 + (i * mapsize * 2), e_mem.MM_RWX, 'map%d' % i, 'A' * mapsize)
+    return mem
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-m', dest='maps', default=5000, type='int', help='number of memory maps')
+    parser.add_option('-n', dest='count', default=200000, type='int', help='number of operations')
+    opts, args = parser.parse_args(argv)
+
+    mem = buildMemory(opts.maps)
+
+    rnd = random.Random(0x4d454d)
+    maps = mem.getMemoryMaps()
+    vas = [ mva + rnd.randrange(msize - 16) for mva, msize, mperm, mname in [ rnd.choice(maps) for i in xrange(opts.count) ] ]
+    # A "map local" access pattern ( like an emulator working a stack )
+    mva, msize, mperm, mname = maps[len(maps) / 2]
+    localvas = [ mva + rnd.randrange(msize - 16) for i in xrange(opts.count) ]
+
+    def rateof(func, vas):
+        elapsed, x = e_bench.timeit(lambda: [ func(va) for va in vas ])
+        return e_bench.rate(len(vas), elapsed)
+
+    linear = lambda va: e_mem.IMemory.getMemoryMap(mem, va)
+    rows = [
+        ('maps', opts.maps),
+        ('readMemory/sec (random)', rateof(lambda va: mem.readMemory(va, 4), vas)),
+        ('readMemory/sec (local)', rateof(lambda va: mem.readMemory(va, 4), localvas)),
+        ('getMemoryMap/sec', rateof(mem.getMemoryMap, vas)),
+        ('isValidPointer/sec', rateof(mem.isValidPointer, vas)),
+        ('probeMemory/sec', rateof(lambda va: mem.probeMemory(va, 4, e_mem.MM_READ), vas)),
+        ('writeMemory/sec (local)', rateof(lambda va: mem.writeMemory(va, 'VISI'), localvas)),
+        ('readMemory/sec (written)', rateof(lambda va: mem.readMemory(va, 4), localvas)),
+        ('getMemorySnap/sec', rateof(lambda va: mem.getMemorySnap(), localvas)),
+        ('linear getMemoryMap/sec', rateof(linear, vas[:max(1, opts.count / 100)])),
+    ]
+    e_bench.printResults('MemoryObject (%d maps)' % opts.maps, rows)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -43,6 +43,60 @@ class BinaryTree:
                 return ninfo
         return node[2]
 
+    def getIndexTable(self, width, bits=8):
+        '''
+        Return a two level table of the getInt() results for every width
+        bit value ( None where getInt() would fail ):
+
+            nodeinfo = table[intval >> (width - bits)][intval & lowmask]
+
+        The second level lists are shared wherever the top bits alone
+        decide the result.
+        '''
+        lowbits = width - bits
+        shared = {}
+
+        table = []
+        for hi in xrange(1 << bits):
+            node = self.basenode
+            for sh in xrange(bits-1, -1, -1):
+                node = node[(hi >> sh) & 1]
+                if node == None or node[2] != None:
+                    break
+
+            if node != None and node[2] == None:
+                table.append(self._getSubTable(node, lowbits))
+                continue
+
+            ninfo = None
+            if node != None:
+                ninfo = node[2]
+
+            subtab = shared.get(id(ninfo))
+            if subtab == None:
+                subtab = [ninfo] * (1 << lowbits)
+                shared[id(ninfo)] = subtab
+            table.append(subtab)
+
+        return table
+
+    def _getSubTable(self, node, width):
+        # The getInt() results for each value of the width bits below node
+        if width == 0:
+            return [node[2]]
+
+        ret = []
+        for choice in (0, 1):
+            kid = node[choice]
+            if kid == None or kid[2] != None:
+                ninfo = None
+                if kid != None:
+                    ninfo = kid[2]
+                ret.extend([ninfo] * (1 << (width-1)))
+            else:
+                ret.extend(self._getSubTable(kid, width-1))
+        return ret
+
     def getBinstr(self, binstr):
         bval = e_bits.binary(binstr)
         return self.getInt(bval, len(bstr))
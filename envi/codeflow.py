@@ -53,6 +53,14 @@ class CodeFlowContext(object):
         '''
         return branches
 
+    def _parseOpcode(self, va, arch):
+        '''
+        Extend CodeFlowContext and implement this method to change how
+        opcodes are parsed.  Code flow only reads the opcode ( and passes
+        it to _cb_opcode ) so it may come from a cache.
+        '''
+        return self._mem.parseOpcode(va, arch=arch)
+
     def _cb_function(self, fva, fmeta):
         '''
         Extend CodeFlowContext and implement this method to recieve
@@ -152,7 +160,7 @@ class CodeFlowContext(object):
             opdone[va] = True
 
             try:
-                op = self._mem.parseOpcode(va, arch=arch)
+                op = self._parseOpcode(va, arch)
             except envi.InvalidInstruction, e:
                 print 'parseOpcode error at 0x%.8x: %s' % (va,e)
                 continue 
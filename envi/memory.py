@@ -1,4 +1,5 @@
 import re
+import bisect
 import struct
 import collections
 
@@ -21,6 +22,10 @@ MM_READ_WRITE = MM_READ | MM_WRITE
 MM_READ_EXEC  =  MM_READ | MM_EXEC
 MM_RWX = MM_READ | MM_WRITE | MM_EXEC
 
+# Page size used by MemoryObject for copy-on-write of map bytes
+cow_pagesize = 4096
+cow_pagemask = ~(cow_pagesize - 1)
+
 pnames = ['No Access', 'Execute', 'Write', None, 'Read']
 def getPermName(perm):
     '''
@@ -299,6 +304,17 @@ class IMemory:
         b = self.readMemory(va, 16)
         return self.imem_archs[ arch >> 16 ].archParseOpcode(b, 0, va)
 
+    def parseOpcodes(self, va, size, arch=envi.ARCH_DEFAULT, stopflags=0):
+        '''
+        Linear sweep disassemble the size bytes at the specified virtual
+        address and return an envi.OpcodeArrays ( see
+        ArchitectureModule.archParseOpcodes ).
+
+        Example: ops = m.parseOpcodes(bva, bsize)
+        '''
+        b = self.readMemory(va, size)
+        return self.imem_archs[ arch >> 16 ].archParseOpcodes(b, 0, va, stopflags=stopflags)
+
 class MemoryCache(IMemory):
     '''
     An object which acts like "copy on write" cache for another memory
@@ -384,9 +400,133 @@ class MemoryObject(IMemory):
         Take a set of memory maps (va, perms, fname, bytes) and put them in
         a sparse space finder. You may specify your own page-size to optimize
         the search for an architecture.
+
+        NOTE: the bytes for each map are never modified.  Writes are stored
+              copy-on-write in per-page bytearrays so maps (and snapshots)
+              may be shared without copying.
         """
         IMemory.__init__(self, arch=arch)
         self._map_defs = []
+        self._map_gen = 0
+        self._initMapIndex()
+        self._initMapPages()
+
+    def _initMapIndex(self):
+        # The map defs sorted by start address (for bisect lookups) and
+        # the most recently used map def (most accesses are map local)
+        self._map_starts = []
+        self._map_sorted = []
+        self._map_last = None
+        # If any maps overlap, we fall back to the linear (first added
+        # wins) lookup to preserve the historical behavior.
+        self._map_overlap = False
+        # Set when a snapshot references the map lists (copy on change)
+        self._map_shared = False
+
+    def _initMapPages(self):
+        # Written pages by (mapva + page offset) and the maps which have them
+        self._map_pages = {}
+        self._map_dirty = {}
+        # Pages which only we reference ( and may therefor modify in place )
+        self._map_wpages = set()
+        # Set when a snapshot references the pages dicts (copy on change)
+        self._map_pshared = False
+
+    def _rebuildMapIndex(self):
+        self._initMapIndex()
+        for mdef in self._map_defs:
+            self._indexMapDef(mdef)
+
+    def _unshareMapIndex(self):
+        if self._map_shared:
+            self._map_defs = list(self._map_defs)
+            self._map_starts = list(self._map_starts)
+            self._map_sorted = list(self._map_sorted)
+            self._map_shared = False
+
+    def _unshareMapPages(self):
+        if self._map_pshared:
+            self._map_pages = dict(self._map_pages)
+            self._map_dirty = dict(self._map_dirty)
+            self._map_pshared = False
+
+    def _indexMapDef(self, mdef):
+        mva, mmaxva = mdef[0], mdef[1]
+        idx = bisect.bisect_right(self._map_starts, mva)
+        if not self._map_overlap:
+            # Until maps overlap the sorted maps are disjoint, so the ends
+            # are sorted too and the previous map has the max end of all
+            # the earlier ones ( no need to look any further back ).
+            if idx > 0 and self._map_sorted[idx - 1][1] > mva:
+                self._map_overlap = True
+            if idx < len(self._map_starts) and self._map_starts[idx] < mmaxva:
+                self._map_overlap = True
+        self._map_starts.insert(idx, mva)
+        self._map_sorted.insert(idx, mdef)
+
+    def _getMapDef(self, va):
+        '''
+        Return the [va, vamax, mmap, bytes] map def which contains va
+        (or None) using the last-hit cache and a bisect of the sorted
+        map index.
+        '''
+        if self._map_overlap:
+            # The first added map wins (a last-hit may be a later one)
+            for mdef in self._map_defs:
+                if va >= mdef[0] and va < mdef[1]:
+                    return mdef
+            return None
+
+        mdef = self._map_last
+        if mdef != None and va >= mdef[0] and va < mdef[1]:
+            return mdef
+
+        idx = bisect.bisect_right(self._map_starts, va) - 1
+        if idx >= 0:
+            mdef = self._map_sorted[idx]
+            if va < mdef[1]:
+                self._map_last = mdef
+                return mdef
+        return None
+
+    def _readMapPages(self, mva, mbytes, offset, size):
+        # Read from a map which has written pages
+        ret = []
+        pages = self._map_pages
+        end = min(offset + size, len(mbytes))
+        while offset < end:
+            poff = offset & cow_pagemask
+            pend = min(poff + cow_pagesize, end)
+            page = pages.get(mva + poff)
+            if page == None:
+                ret.append(mbytes[offset:pend])
+            else:
+                ret.append(str(page[offset-poff:pend-poff]))
+            offset = pend
+        return ''.join(ret)
+
+    def _flattenMapDef(self, mdef):
+        '''
+        Fold any written pages for the given map def back into a new map
+        def ( with new bytes ) and return it.
+        '''
+        mva, mmaxva, mmap, mbytes = mdef
+        if not self._map_dirty.get(mva):
+            return mdef
+
+        newdef = [mva, mmaxva, mmap, self._readMapPages(mva, mbytes, 0, len(mbytes))]
+
+        self._unshareMapIndex()
+        self._map_defs[self._map_defs.index(mdef)] = newdef
+        self._map_sorted[self._map_sorted.index(mdef)] = newdef
+        self._map_last = newdef
+
+        self._unshareMapPages()
+        for poff in xrange(0, len(mbytes), cow_pagesize):
+            self._map_pages.pop(mva + poff, None)
+            self._map_wpages.discard(mva + poff)
+        self._map_dirty.pop(mva, None)
+        return newdef
 
     #FIXME MemoryObject: def allocateMemory(self, size, perms=MM_RWX, suggestaddr=0):
 
@@ -397,16 +537,48 @@ class MemoryObject(IMemory):
         msize = len(bytez)
         mmap = (va, msize, perms, fname)
         hlpr = [va, va+msize, mmap, bytez]
+        self._map_gen += 1
+        self._unshareMapIndex()
         self._map_defs.append(hlpr)
+        self._indexMapDef(hlpr)
         return
 
+    def shareMemoryMaps(self, memobj):
+        '''
+        Add all the memory maps from another MemoryObject to this one
+        without copying their bytes.  ( writes to either object are
+        copy-on-write and will not be seen by the other )
+
+        Example:
+            emu.shareMemoryMaps(vw)
+        '''
+        # Any written pages must be folded back in before sharing
+        for mdef in list(memobj._map_defs):
+            memobj._flattenMapDef(mdef)
+
+        self._map_gen += 1
+        mine = self._map_defs
+        self._map_defs = mine + memobj._map_defs
+        self._map_starts = list(memobj._map_starts)
+        self._map_sorted = list(memobj._map_sorted)
+        self._map_overlap = memobj._map_overlap
+        self._map_last = None
+        self._map_shared = False
+        for mdef in mine:
+            self._indexMapDef(mdef)
+
     def getMemorySnap(self):
         '''
         Take a memory snapshot which may be restored later.
 
         Example: snap = mem.getMemorySnap()
         '''
-        return [ list(mdef) for mdef in self._map_defs ]
+        # The snap references our current lists and pages, so any
+        # subsequent change must copy them first.
+        self._map_shared = True
+        self._map_pshared = True
+        self._map_wpages = set()
+        return (self._map_defs, self._map_starts, self._map_sorted, self._map_overlap, self._map_pages, self._map_dirty)
 
     def setMemorySnap(self, snap):
         '''
@@ -414,43 +586,101 @@ class MemoryObject(IMemory):
 
         Example: mem.setMemorySnap(snap)
         '''
-        self._map_defs = [list(md) for md in snap]
+        defs, starts, msorted, overlap, pages, dirty = snap
+        self._map_gen += 1
+        self._map_defs = defs
+        self._map_starts = starts
+        self._map_sorted = msorted
+        self._map_overlap = overlap
+        self._map_last = None
+        self._map_shared = True
+
+        self._map_pages = pages
+        self._map_dirty = dirty
+        self._map_wpages = set()
+        self._map_pshared = True
+
+    def getMemoryGeneration(self):
+        '''
+        Return a counter which changes whenever the memory does ( maps are
+        added, written or restored from a snapshot ).  Use it to tell if
+        something built from the memory is stale.
+
+        Example:
+            gen = mem.getMemoryGeneration()
+            ...
+            if mem.getMemoryGeneration() != gen:
+                rebuild()
+        '''
+        return self._map_gen
 
     def getMemoryMap(self, va):
         """
         Get the va,size,perms,fname tuple for this memory map
         """
-        for mva, mmaxva, mmap, mbytes in self._map_defs:
-            if va >= mva and va < mmaxva:
-                return mmap
-        return None
+        mdef = self._getMapDef(va)
+        if mdef == None:
+            return None
+        return mdef[2]
 
     def getMemoryMaps(self):
-        return [ mmap for mva, mmaxva, mmap, mbytes in self._map_defs ]
+        return [ mdef[2] for mdef in self._map_defs ]
+
+    def isValidPointer(self, va):
+        return self._getMapDef(va) != None
 
     def readMemory(self, va, size):
 
-        for mva, mmaxva, mmap, mbytes in self._map_defs:
-            if va >= mva and va < mmaxva:
-                mva, msize, mperms, mfname = mmap
-                if not mperms & MM_READ:
-                    raise envi.SegmentationViolation(va)
-                offset = va - mva
-                return mbytes[offset:offset+size]
-        raise envi.SegmentationViolation(va)
+        mdef = self._getMapDef(va)
+        if mdef == None:
+            raise envi.SegmentationViolation(va)
+
+        mva, mmaxva, mmap, mbytes = mdef
+        if not mmap[2] & MM_READ:
+            raise envi.SegmentationViolation(va)
+        offset = va - mva
+        if self._map_dirty.get(mva):
+            return self._readMapPages(mva, mbytes, offset, size)
+        return mbytes[offset:offset+size]
 
     def writeMemory(self, va, bytes):
-        for mapdef in self._map_defs:
-            mva, mmaxva, mmap, mbytes = mapdef
-            if va >= mva and va < mmaxva:
-                mva, msize, mperms, mfname = mmap
-                if not mperms & MM_WRITE:
-                    raise envi.SegmentationViolation(va)
-                offset = va - mva
-                mapdef[3] = mbytes[:offset] + bytes + mbytes[offset+len(bytes):]
-                return
-
-        raise envi.SegmentationViolation(va)
+        mdef = self._getMapDef(va)
+        if mdef == None:
+            raise envi.SegmentationViolation(va)
+
+        mva, mmaxva, mmap, mbytes = mdef
+        if not mmap[2] & MM_WRITE:
+            raise envi.SegmentationViolation(va)
+
+        offset = va - mva
+        msize = len(mbytes)
+        end = min(offset + len(bytes), msize)
+        self._map_gen += 1
+
+        pages = self._map_pages
+        wpages = self._map_wpages
+        boff = 0
+        while offset < end:
+            poff = offset & cow_pagemask
+            pend = min(poff + cow_pagesize, msize)
+            pageva = mva + poff
+
+            if pageva not in wpages:
+                # Copy on write: make a page which is only ours
+                self._unshareMapPages()
+                pages = self._map_pages
+                page = pages.get(pageva)
+                if page == None:
+                    page = mbytes[poff:pend]
+                page = bytearray(page)
+                pages[pageva] = page
+                wpages.add(pageva)
+                self._map_dirty[mva] = True
+
+            chunk = min(pend, end) - offset
+            pages[pageva][offset-poff:offset-poff+chunk] = bytes[boff:boff+chunk]
+            boff += chunk
+            offset += chunk
 
     def getByteDef(self, va):
         """
@@ -459,13 +689,42 @@ class MemoryObject(IMemory):
         string object *AND* an offset of va into the 
         buffer.  Used internally for optimized memory
         handling.  Returns (offset, bytes)
+
+        NOTE: bytes is always the whole memory map ( any written pages are
+              folded back into the map first ).  Use getPageByteDef for a
+              read of a few bytes at va from a map which may be written.
+        """
+        mdef = self._getMapDef(va)
+        if mdef == None:
+            raise envi.SegmentationViolation(va)
+        if self._map_dirty.get(mdef[0]):
+            mdef = self._flattenMapDef(mdef)
+        return (va - mdef[0], mdef[3])
+
+    def getPageByteDef(self, va):
+        """
+        Like getByteDef, but once a map has been written, bytes is only a
+        window of the map ( the page before va through the page after ) so
+        a read after a write costs a few pages rather than the whole map.
+        Only use it to read less than a page on either side of va.
+        Returns (offset, bytes)
+
+        Example:
+            offset, bytez = mem.getPageByteDef(va)
+            val = e_bits.parsebytes(bytez, offset, 4)
         """
-        for mapdef in self._map_defs:
-            mva, mmaxva, mmap, mbytes = mapdef
-            if va >= mva and va < mmaxva:
-                offset = va - mva
-                return (offset, mbytes)
-        raise envi.SegmentationViolation(va)
+        mdef = self._getMapDef(va)
+        if mdef == None:
+            raise envi.SegmentationViolation(va)
+        mva, mmaxva, mmap, mbytes = mdef
+        offset = va - mva
+        if not self._map_dirty.get(mva):
+            return (offset, mbytes)
+
+        poff = offset & cow_pagemask
+        woff = max(poff - cow_pagesize, 0)
+        wend = poff + (cow_pagesize * 2)
+        return (offset - woff, self._readMapPages(mva, mbytes, woff, wend - woff))
 
 class MemoryFile:
     '''
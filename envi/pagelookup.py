@@ -3,6 +3,7 @@ A home for the page lookup construct.  Basically it is a
 python object which implements a similar lookup mechanism
 to the i386 page table lookups...
 '''
+import bisect
 import collections
 
 # FIXME move functions in here too so there is procedural "speed" way
@@ -70,3 +71,260 @@ class MapLookup:
     def __getslice__(self, start, end):
         print 'GET SLICE'
 
+class RangeLookup:
+
+    '''
+    A drop-in replacement for MapLookup which stores sorted, non-overlapping
+    [va, vamax) ranges rather than one list slot per byte.  Memory use scales
+    with the number of ranges set and lookups are a bisect (O(log n)).
+
+    Setting a range "paints" over whatever was there before (exactly like
+    the per-byte MapLookup), so any existing range which is only partially
+    covered is truncated or split.
+    '''
+
+    def __init__(self):
+        self._maps_list = []    # sorted (va, vamax) tuples
+        self._maps_starts = []
+
+        # parallel sorted arrays describing the ranges currently set
+        self._starts = []
+        self._ends = []
+        self._objs = []
+
+    def initMapLookup(self, va, size, obj=None):
+        idx = bisect.bisect_left(self._maps_starts, va)
+        self._maps_starts.insert(idx, va)
+        self._maps_list.insert(idx, (va, va+size))
+        if obj != None and size:
+            self.setMapLookup(va, size, obj)
+
+    def _getMapRange(self, va):
+        idx = bisect.bisect_right(self._maps_starts, va) - 1
+        if idx >= 0:
+            mva, mvamax = self._maps_list[idx]
+            if va < mvamax:
+                return mva, mvamax
+        raise Exception('Address (0x%.8x) not in maps!' % va)
+
+    def setMapLookup(self, va, size, obj):
+        mva, mvamax = self._getMapRange(va)
+        vamax = min(va + size, mvamax)
+
+        starts = self._starts
+        ends = self._ends
+        objs = self._objs
+
+        # Find the first range which could overlap va
+        i = bisect.bisect_right(starts, va) - 1
+        if i < 0 or ends[i] <= va:
+            i += 1
+
+        elif starts[i] < va:
+            # The range containing va begins before us, truncate it
+            # (and re-add the tail if we are entirely inside it)
+            oldend = ends[i]
+            ends[i] = va
+            i += 1
+            if oldend > vamax:
+                starts.insert(i, vamax)
+                ends.insert(i, oldend)
+                objs.insert(i, objs[i-1])
+
+        # Remove (or truncate) everything else we cover
+        j = bisect.bisect_left(starts, vamax, i)
+        if j > i and ends[j-1] > vamax:
+            starts[j-1] = vamax
+            j -= 1
+
+        del starts[i:j]
+        del ends[i:j]
+        del objs[i:j]
+
+        if obj != None and vamax > va:
+            starts.insert(i, va)
+            ends.insert(i, vamax)
+            objs.insert(i, obj)
+
+    def setMapLookups(self, ranges):
+        '''
+        Set a batch of (va, size, obj) ranges.  Ranges which overlap
+        nothing (in the batch or already set) give the same result in
+        any order, so they are merged into the index in one pass.  The
+        rest are painted one at a time (in their original order).
+        '''
+        items = []
+        mva = mvamax = None
+        for idx, (va, size, obj) in enumerate(ranges):
+            if mva == None or va < mva or va >= mvamax:
+                mva, mvamax = self._getMapRange(va)
+            items.append((va, min(va + size, mvamax), obj, idx))
+
+        items.sort(key=lambda item: item[0])
+
+        # Mark anything which overlaps another range in the batch
+        count = len(items)
+        paint = [ item[1] <= item[0] or item[2] == None for item in items ]
+        maxend = None
+        for i in xrange(count):
+            va, vamax, obj, idx = items[i]
+            if vamax <= va:
+                continue
+            if maxend != None and va < maxend:
+                paint[i] = True
+            maxend = max(maxend, vamax)
+
+        minstart = None
+        for i in xrange(count - 1, -1, -1):
+            va, vamax, obj, idx = items[i]
+            if vamax <= va:
+                continue
+            if minstart != None and vamax > minstart:
+                paint[i] = True
+            minstart = va
+
+        clean = [ items[i] for i in xrange(count) if not paint[i] ]
+        dirty = [ items[i] for i in xrange(count) if paint[i] ]
+        dirty.extend(self._mergeRanges(clean))
+
+        dirty.sort(key=lambda item: item[3])
+        for va, vamax, obj, idx in dirty:
+            self.setMapLookup(va, vamax - va, obj)
+
+    def _mergeRanges(self, items):
+        # Merge sorted, non-overlapping (va, vamax, obj, idx) items into
+        # the index and return any which overlap already set ranges.
+        oldstarts = self._starts
+        oldends = self._ends
+        oldobjs = self._objs
+
+        merge = []
+        overlap = []
+        for item in items:
+            va, vamax = item[0], item[1]
+            i = bisect.bisect_right(oldstarts, va)
+            if (i and oldends[i-1] > va) or (i < len(oldstarts) and oldstarts[i] < vamax):
+                overlap.append(item)
+                continue
+            merge.append((i, item))
+
+        if not merge:
+            return overlap
+
+        newstarts = []
+        newends = []
+        newobjs = []
+        last = 0
+        for i, (va, vamax, obj, idx) in merge:
+            if i != last:
+                newstarts.extend(oldstarts[last:i])
+                newends.extend(oldends[last:i])
+                newobjs.extend(oldobjs[last:i])
+                last = i
+            newstarts.append(va)
+            newends.append(vamax)
+            newobjs.append(obj)
+
+        newstarts.extend(oldstarts[last:])
+        newends.extend(oldends[last:])
+        newobjs.extend(oldobjs[last:])
+
+        self._starts = newstarts
+        self._ends = newends
+        self._objs = newobjs
+        return overlap
+
+    def getMapLookup(self, va):
+        i = bisect.bisect_right(self._starts, va) - 1
+        if i < 0 or self._ends[i] <= va:
+            return None
+        return self._objs[i]
+
+    def getPrevMapLookup(self, va):
+        '''
+        Return the object for the range which contains va or (if
+        va is not in a range) the nearest range below va.
+        '''
+        i = bisect.bisect_right(self._starts, va) - 1
+        if i < 0:
+            return None
+        return self._objs[i]
+
+    def getNextMapLookupRange(self, va):
+        '''
+        Return the (va, vamax, obj) tuple for the range which contains va
+        or (if va is not in a range) the nearest range above va.
+        '''
+        starts = self._starts
+        i = bisect.bisect_right(starts, va) - 1
+        if i < 0 or self._ends[i] <= va:
+            i += 1
+        if i >= len(starts):
+            return None
+        return starts[i], self._ends[i], self._objs[i]
+
+    def getMapLookupRanges(self, va, size):
+        '''
+        Return a list of (va, vamax, obj) tuples for the set ranges which
+        overlap va -> va+size in address order.
+        '''
+        vamax = va + size
+        starts = self._starts
+        i = bisect.bisect_right(starts, va) - 1
+        if i < 0 or self._ends[i] <= va:
+            i += 1
+
+        j = bisect.bisect_left(starts, vamax, i)
+        return zip(starts[i:j], self._ends[i:j], self._objs[i:j])
+
+    def getMapRanges(self):
+        '''
+        Return the list of (va, vamax) tuples initialized with initMapLookup.
+        '''
+        return list(self._maps_list)
+
+
+class RangeSet:
+
+    '''
+    A set of addresses stored as sorted [va, vamax) ranges.  Adding a range
+    which overlaps (or touches) any already in the set merges them, so the
+    size scales with the number of disjoint ranges (not the number of adds)
+    and overlap checks are a bisect (O(log n)).
+    '''
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def addRange(self, va, size):
+        if size <= 0:
+            return
+
+        vamax = va + size
+        starts = self._starts
+        ends = self._ends
+        # The ranges which end at (or after) va and begin at (or before) vamax
+        i = bisect.bisect_left(ends, va)
+        j = bisect.bisect_right(starts, vamax, i)
+        if i < j:
+            va = min(va, starts[i])
+            vamax = max(vamax, ends[j-1])
+        starts[i:j] = [va]
+        ends[i:j] = [vamax]
+
+    def isRangeSet(self, va, size):
+        '''
+        Return True if any of va -> va+size is in the set.
+        '''
+        i = bisect.bisect_right(self._ends, va)
+        return i < len(self._starts) and self._starts[i] < va + size
+
+    def getRanges(self):
+        '''
+        Return the list of (va, size) tuples in the set (in address order).
+        '''
+        return [ (va, vamax - va) for va, vamax in zip(self._starts, self._ends) ]
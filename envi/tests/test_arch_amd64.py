@@ -3,6 +3,7 @@ import envi.memory as e_mem
 import envi.memcanvas as e_memcanvas
 import envi.memcanvas.renderers as e_rend
 import envi.archs.amd64 as e_amd64
+import envi.archs.amd64.opcode64 as opcode64
 import vivisect
 import platform
 import unittest
@@ -108,19 +109,39 @@ class Amd64InstructionSet(unittest.TestCase):
             #print "render:  %s" % repr(scanv.strval)
             self.assertEqual( scanv.strval, renderOp )
 
+    def test_envi_amd64_disasm_flat(self):
+        '''
+        the amd64 decoder gets its own flattened tables ( and REX.W sizes )
+        '''
+        dis = self._arch._arch_dis
+        flat = dis._dis_flatten()
+        self.assertIsNot(flat, envi.getArchModule('i386')._arch_dis._dis_flatten())
+        self.assertEqual(len(flat), len(dis._dis_tables))
+
+        # add r/m, imm8 ( the 0x83 group, sub table indexed by modrm )
+        main = flat[opcode64.TBL_Main]
+        ent = flat[main[0x83]][0xc0]
+        operflags, addrmeth, ameth, tsizes, operval, isimm = ent[3][0]
+        self.assertEqual(ent[1], 'add')
+        self.assertEqual(tsizes, (4, 2, 8))
+
+        for hexbytez, oprepr in (('4883c001', 'add rax,1'), ('6683c001', 'add ax,1'), ('83c001', 'add eax,1')):
+            op = self._arch.archParseOpcode(hexbytez.decode('hex'), 0, 0x4000)
+            self.assertEqual(repr(op), oprepr)
+
     def checkOpcode(self, hexbytez, va, oprepr, opcheck, opercheck, renderOp):
 
         op = self._arch.archParseOpcode(hexbytez.decode('hex'), 0, va)
 
         self.assertEqual( repr(op), oprepr )
-        opvars = vars(op)
+        opvars = envi.getSlotState(op)
         for opk,opv in opcheck.items():
             #print "op: %s %s" % (opk,opv)
             self.assertEqual( (repr(op), opk, opvars.get(opk)), (oprepr, opk, opv) )
 
         for oidx in range(len(op.opers)):
             oper = op.opers[oidx]
-            opervars = vars(oper)
+            opervars = envi.getSlotState(oper)
             for opk,opv in opercheck[oidx].items():
                 #print "oper: %s %s" % (opk,opv)
                 self.assertEqual( (repr(op), opk, opervars.get(opk)), (oprepr, opk, opv) )
@@ -392,14 +413,13 @@ def generateTestInfo(ophexbytez='6e'):
     opbytez = ophexbytez
     op = a64.archParseOpcode(opbytez.decode('hex'), 0, 0x4000)
     print "opbytez = '%s'\noprepr = '%s'"%(opbytez,repr(op))
-    opvars=vars(op)
+    opvars=envi.getSlotState(op)
     opers = opvars.pop('opers')
     print "opcheck = ",repr(opvars)
 
     opersvars = []
     for x in range(len(opers)):
-        opervars = vars(opers[x])
-        opervars.pop('_dis_regctx')
+        opervars = envi.getSlotState(opers[x])
         opersvars.append(opervars)
 
     print "opercheck = %s" % (repr(opersvars))
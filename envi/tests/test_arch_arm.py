@@ -0,0 +1,52 @@
+import random
+import struct
+import unittest
+
+import envi
+import envi.bintree as e_btree
+import envi.archs.arm.disasm as e_arm_disasm
+import envi.archs.thumb16.disasm as e_thumb_disasm
+
+class ArmClassifierTest(unittest.TestCase):
+
+    def test_envi_arm_ienc_table(self):
+        # The direct index must agree with the table scan whatever the
+        # bits it does not look at are
+        rnd = random.Random(0x61726d)
+        for idx in xrange(4096):
+            for i in xrange(4):
+                opval = ((idx & 0xff0) << 16) | ((idx & 0xf) << 4)
+                opval |= rnd.randrange(15) << 28
+                opval |= rnd.randrange(1 << 12) << 8
+                opval |= rnd.randrange(16)
+                self.assertEqual(e_arm_disasm.ienc_table[idx], e_arm_disasm.scanEncoding(opval))
+
+    def test_envi_arm_disasm(self):
+        archmod = envi.getArchModule('arm')
+        for opval, oprepr, enc in ((0xe0800001, 'add r0, r0, r1', e_arm_disasm.IENC_DP_IMM_SHIFT),
+                                   (0xe4954004, 'ldr r4, [r5], #0x4', e_arm_disasm.IENC_LOAD_IMM_OFF),
+                                   (0xe8b5000f, 'ldmia r5!, { r0 r1 r2 r3 }', e_arm_disasm.IENC_LOAD_MULT),
+                                   (0xe0010392, 'mul r1, r2, r3', e_arm_disasm.IENC_MULT)):
+            op = archmod.archParseOpcode(struct.pack('<I', opval), 0, 0x1000)
+            self.assertEqual((repr(op), op.encoder), (oprepr, enc))
+
+    def test_envi_thumb_index_table(self):
+        for tree, table in ((e_thumb_disasm.ttree, e_thumb_disasm.ttable),
+                            (e_thumb_disasm.ttree2, e_thumb_disasm.ttable2)):
+            for val in xrange(0x10000):
+                try:
+                    ninfo = tree.getInt(val, 16)
+                except TypeError:
+                    ninfo = None
+                self.assertTrue(table[val >> 8][val & 0xff] is ninfo)
+
+    def test_envi_bintree_index_table(self):
+        tree = e_btree.BinaryTree()
+        tree.addBinstr('0', 'zero')
+        tree.addBinstr('1010', 'ten')
+        tree.addBinstr('110', 'six')
+        table = tree.getIndexTable(4, bits=2)
+        self.assertEqual([ table[val >> 2][val & 3] for val in xrange(16) ],
+                         ['zero'] * 8 + [None, None, 'ten', None, 'six', 'six', None, None])
+        # Both halves with the one answer share a list
+        self.assertTrue(table[0] is table[1])
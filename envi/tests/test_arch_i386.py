@@ -122,19 +122,48 @@ class i386InstructionSet(unittest.TestCase):
         pass
     '''
 
+    def test_envi_i386_disasm_flat(self):
+        '''
+        the flattened opcode tables must match a walk of the real ones
+        '''
+        dis = self._arch._arch_dis
+        flat = dis._dis_flatten()
+        self.assertIs(dis._dis_flatten(), flat)
+        self.assertEqual(len(flat), len(dis._dis_tables))
+
+        for tabid, row in enumerate(flat):
+            self.assertEqual(len(row), 256)
+            for obyte in xrange(256):
+                ent = row[obyte]
+                if ent == None:
+                    continue
+
+                tabdesc, opdesc = dis._dis_flat_lookup(tabid, obyte)
+                if opdesc[0] != 0:
+                    self.assertEqual(ent, opdesc[0])
+                    continue
+
+                optype, mnem, consume, opers, lite = ent
+                self.assertEqual((optype, mnem), (opdesc[1], opdesc[6]))
+                self.assertEqual([ oper[0] for oper in opers ], [ opdesc[i] for i in e_i386.operand_range ][:len(opers)])
+
+        # One lookup for a one byte opcode, a hop and a lookup for 0f xx
+        self.assertEqual(flat[0][0x01][1], 'add')
+        self.assertEqual(flat[flat[0][0x0f]][0xaf][1], 'imul')
+
     def checkOpcode(self, hexbytez, va, oprepr, opcheck, opercheck, renderOp):
 
         op = self._arch.archParseOpcode(hexbytez.decode('hex'), 0, va)
 
         self.assertEqual( repr(op), oprepr )
-        opvars = vars(op)
+        opvars = envi.getSlotState(op)
         for opk,opv in opcheck.items():
             #print "op: %s %s" % (opk,opv)
             self.assertEqual( (opk, opvars.get(opk)), (opk, opv) )
 
         for oidx in range(len(op.opers)):
             oper = op.opers[oidx]
-            opervars = vars(oper)
+            opervars = envi.getSlotState(oper)
             for opk,opv in opercheck[oidx].items():
                 #print "oper: %s %s" % (opk,opv)
                 self.assertEqual( (opk, opervars.get(opk)), (opk, opv) )
@@ -0,0 +1,41 @@
+import unittest
+
+import envi
+import envi.benchmarks.disasm as e_b_disasm
+
+class DisasmDigestsTest(unittest.TestCase):
+
+    def test_envi_disasm_digests_blocks(self):
+        archmod = envi.getArchModule('i386')
+        chunks = e_b_disasm.getRandomCode(0x2800)
+        digests = e_b_disasm.getDigests(archmod, chunks)
+        self.assertEqual(len(digests['blocks']), 3)
+        self.assertEqual(digests, e_b_disasm.getDigests(archmod, chunks))
+        self.assertEqual(e_b_disasm.diffDigests(digests, digests), [])
+        self.assertIsNone(e_b_disasm.diffDigests(None, digests))
+
+        # A change in the second block
+        va, bytez = chunks[0]
+        blockva = digests['blocks'][1][0]
+        offset = blockva - va + 0x10
+        bytez = bytez[:offset] + '\x90' * 16 + bytez[offset + 16:]
+        newdigests = e_b_disasm.getDigests(archmod, [ (va, bytez) ])
+        self.assertNotEqual(newdigests['digest'], digests['digest'])
+        self.assertEqual(e_b_disasm.diffDigests(digests, newdigests)[0], blockva)
+
+    def test_envi_disasm_digests_valid(self):
+        for archname in ('i386', 'arm', 'msp430'):
+            archmod = envi.getArchModule(archname)
+            chunks = e_b_disasm.getValidCode(archmod, 0x400)
+            ops = e_b_disasm.parseAll(archmod, chunks)
+            self.assertEqual(sum([ op.size for op in ops ]), len(chunks[0][1]))
+
+    def test_envi_disasm_digests_measure(self):
+        res = e_b_disasm.measure('msp430', 'random', e_b_disasm.getRandomCode(0x400))
+        self.assertIsNone(res.get('error'))
+        self.assertEqual(res['instructions'], res['bulk_instructions'])
+        self.assertGreater(res['objects_per_insn'], 1)
+
+        # z80 is not ( yet ) an envi arch module
+        res = e_b_disasm.measure('z80', 'random', e_b_disasm.getRandomCode(0x400))
+        self.assertTrue(res['error'])
@@ -0,0 +1,60 @@
+import unittest
+
+import envi.benchmarks.emulator as e_b_emulator
+
+class EmuStreamsTest(unittest.TestCase):
+
+    def test_envi_emu_streams_x86(self):
+        for archname in ('i386', 'amd64'):
+            for name, code, regs in e_b_emulator.workloads[archname]:
+                emu = e_b_emulator.getEmulator(archname, code, regs)
+                self.assertEqual(e_b_emulator.runStream(emu, 200), (200, None))
+                # Still looping in the workload
+                pc = emu.getProgramCounter()
+                self.assertTrue(e_b_emulator.code_base <= pc < e_b_emulator.code_base + len(code))
+
+    def test_envi_emu_streams_memory(self):
+        for name, code, regs in e_b_emulator.workloads['i386']:
+            if name != 'memory':
+                continue
+
+            emu = e_b_emulator.getEmulator('i386', code, regs)
+            e_b_emulator.runStream(emu, 12 * 2)
+            # Two trips around the loop copied the first 16 bytes
+            self.assertEqual(emu.readMemory(e_b_emulator.dst_base, 16), emu.readMemory(e_b_emulator.src_base, 16))
+
+    def test_envi_emu_streams_results(self):
+        results = e_b_emulator.runSuite(['i386'], 100)
+        self.assertEqual([ res['workload'] for res in results ], ['alu', 'string', 'memory', 'flags'])
+        for res in results:
+            self.assertEqual(res['instructions'], 100)
+            self.assertIsNone(res.get('error'))
+
+    def test_envi_emu_streams_directregs(self):
+        # The direct register array access must match get/setRegister()
+        for archname in ('i386', 'amd64'):
+            for name, code, regs in e_b_emulator.workloads[archname]:
+                emus = []
+                for direct in (True, False):
+                    emu = e_b_emulator.getEmulator(archname, code, regs)
+                    self.assertTrue(emu._emu_directregs)
+                    emu._emu_directregs = direct
+                    self.assertEqual(e_b_emulator.runStream(emu, 500), (500, None))
+                    emus.append(emu)
+
+                self.assertEqual(emus[0].getRegisterSnap(), emus[1].getRegisterSnap())
+                self.assertEqual(emus[0].readMemory(e_b_emulator.dst_base, e_b_emulator.map_size),
+                                 emus[1].readMemory(e_b_emulator.dst_base, e_b_emulator.map_size))
+
+    def test_envi_emu_streams_amd64_low32(self):
+        # mov eax,ebx; add ecx,edx
+        emu = e_b_emulator.getEmulator('amd64', '89d801d1'.decode('hex'), {})
+        emu.setRegisterByName('rax', 0xffffffffffffffff)
+        emu.setRegisterByName('rbx', 0x1111111122222222)
+        emu.setRegisterByName('rcx', 0x00000001ffffffff)
+        emu.setRegisterByName('rdx', 1)
+        e_b_emulator.runStream(emu, 2)
+        # The 32 bit writes zero extend
+        self.assertEqual(emu.getRegisterByName('rax'), 0x22222222)
+        self.assertEqual(emu.getRegisterByName('rcx'), 0)
+        self.assertEqual(emu.getRegisterByName('ebx'), 0x22222222)
@@ -1,5 +1,6 @@
 import unittest
 
+import envi
 import envi.memory as e_mem
 
 class EnviMemoryTest(unittest.TestCase):
@@ -18,3 +19,107 @@ class EnviMemoryTest(unittest.TestCase):
         self.assertEqual(mem.readMemory(0x41410040, 3), 'BBB')
         # Test a cross page read
         self.assertEqual(mem.readMemory(0x41410000 + (cache.pagesize - 2), 4), 'BBBB')
+
+    def test_envi_memory_mapindex(self):
+        mem = e_mem.MemoryObject()
+        # add them out of order to exercise the sorted index
+        for i in reversed(xrange(100)):
+            mem.addMemoryMap(0x10000 + (i * 0x2000), e_mem.MM_RWX, 'map%d' % i, chr(i) * 0x1000)
+
+        self.assertEqual(mem.getMemoryMap(0x10000 + (42 * 0x2000) + 10), (0x10000 + (42 * 0x2000), 0x1000, e_mem.MM_RWX, 'map42'))
+        self.assertEqual(mem.readMemory(0x10000 + (7 * 0x2000) + 0xff0, 4), '\x07' * 4)
+        self.assertEqual(mem.getByteDef(0x10000 + (3 * 0x2000) + 4), (4, '\x03' * 0x1000))
+        # gaps between the maps
+        self.assertIsNone(mem.getMemoryMap(0x10000 + 0x1000))
+        self.assertFalse(mem.isValidPointer(0xffff))
+        self.assertFalse(mem.isValidPointer(0x10000 + (100 * 0x2000)))
+        self.assertRaises(envi.SegmentationViolation, mem.readMemory, 0x11000, 4)
+
+        snap = mem.getMemorySnap()
+        mem.writeMemory(0x10000, 'VISI')
+        self.assertEqual(mem.readMemory(0x10000, 4), 'VISI')
+        mem.setMemorySnap(snap)
+        self.assertEqual(mem.readMemory(0x10000, 4), '\x00' * 4)
+        self.assertTrue(mem.isExecutable(0x10000 + (99 * 0x2000)))
+
+    def test_envi_memory_mapoverlap(self):
+        # overlapping maps keep the "first added wins" behavior
+        mem = e_mem.MemoryObject()
+        mem.addMemoryMap(0x1000, e_mem.MM_READ, 'big', 'A' * 0x1000)
+        mem.addMemoryMap(0x1100, e_mem.MM_READ, 'small', 'B' * 0x10)
+        self.assertEqual(mem.getMemoryMap(0x1108)[3], 'big')
+        self.assertEqual(mem.getMemoryMap(0x1800)[3], 'big')
+        self.assertEqual(mem.readMemory(0x1800, 1), 'A')
+
+        # a hit in the later map must not shadow the first added one
+        mem = e_mem.MemoryObject()
+        mem.addMemoryMap(0x1100, e_mem.MM_READ, 'small', 'B' * 0x10)
+        mem.addMemoryMap(0x1000, e_mem.MM_READ, 'big', 'A' * 0x1000)
+        self.assertEqual(mem.getMemoryMap(0x1000)[3], 'big')
+        self.assertEqual(mem.getMemoryMap(0x1108)[3], 'small')
+        self.assertEqual(mem.getMemoryMap(0x1800)[3], 'big')
+        mem.addMemoryMap(0x1800, e_mem.MM_READ, 'later', 'C' * 0x10)
+        self.assertEqual(mem.getMemoryMap(0x1808)[3], 'big')
+
+        # a map spanning several later ones ( added out of order )
+        mem = e_mem.MemoryObject()
+        for i in xrange(1, 4):
+            mem.addMemoryMap(i * 0x1000, e_mem.MM_READ, 'map%d' % i, 'D' * 0x100)
+        self.assertFalse(mem._map_overlap)
+        mem.addMemoryMap(0x800, e_mem.MM_READ, 'span', 'E' * 0x3000)
+        self.assertTrue(mem._map_overlap)
+        self.assertEqual(mem.getMemoryMap(0x2010)[3], 'map2')
+        self.assertEqual(mem.getMemoryMap(0x2800)[3], 'span')
+
+    def test_envi_memory_cow(self):
+        mbytes = 'A' * 0x3000
+        mem = e_mem.MemoryObject()
+        mem.addMemoryMap(0x41410000, e_mem.MM_RWX, 'data', mbytes)
+
+        # a write which crosses a page boundary
+        gen = mem.getMemoryGeneration()
+        mem.writeMemory(0x41410ffe, 'VISI')
+        self.assertNotEqual(mem.getMemoryGeneration(), gen)
+        self.assertEqual(mem.readMemory(0x41410ffc, 8), 'AAVISIAA')
+        # the original map bytes are never modified
+        self.assertEqual(mbytes, 'A' * 0x3000)
+
+        snap = mem.getMemorySnap()
+        mem.writeMemory(0x41411000, 'QQ')
+        mem.writeMemory(0x41412000, 'ZZ')
+        self.assertEqual(mem.readMemory(0x41410ffe, 4), 'VIQQ')
+
+        # snaps may be restored more than once
+        for i in xrange(2):
+            mem.setMemorySnap(snap)
+            self.assertEqual(mem.readMemory(0x41410ffe, 4), 'VISI')
+            self.assertEqual(mem.readMemory(0x41412000, 2), 'AA')
+            mem.writeMemory(0x41410ffe, 'XX')
+
+        # a written map gives a window of pages ( without folding them in )
+        offset, bytez = mem.getPageByteDef(0x41410ffe)
+        self.assertEqual(bytez[offset:offset+4], 'XXSI')
+        self.assertEqual(len(bytez), 0x2000)
+        offset, bytez = mem.getPageByteDef(0x41412002)
+        self.assertEqual(bytez[offset-2:offset+2], 'AAAA')
+        self.assertEqual(offset, 0x1002)
+        self.assertTrue(mem._map_dirty.get(0x41410000))
+
+        # ...but getByteDef is always the whole map ( folding the pages
+        # back in, which is not a change )
+        gen = mem.getMemoryGeneration()
+        offset, bytez = mem.getByteDef(0x41410ffe)
+        self.assertEqual(bytez[offset:offset+4], 'XXSI')
+        self.assertEqual(len(bytez), 0x3000)
+        self.assertEqual(mem.getMemoryGeneration(), gen)
+
+        # shared maps don't see each other's writes
+        emu = e_mem.MemoryObject()
+        emu.addMemoryMap(0x10000, e_mem.MM_RWX, 'stack', 'S' * 0x100)
+        emu.shareMemoryMaps(mem)
+        self.assertEqual(emu.readMemory(0x41410ffe, 4), 'XXSI')
+        emu.writeMemory(0x41410ffe, 'YY')
+        self.assertEqual(mem.readMemory(0x41410ffe, 4), 'XXSI')
+        self.assertEqual(emu.readMemory(0x41410ffe, 4), 'YYSI')
+        self.assertEqual(emu.readMemory(0x10000, 2), 'SS')
+        self.assertEqual(len(emu.getMemoryMaps()), 2)
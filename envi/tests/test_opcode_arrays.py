@@ -0,0 +1,98 @@
+import unittest
+
+import envi
+import envi.benchmarks.disasm as e_b_disasm
+import envi.benchmarks.emulator as e_b_emulator
+
+def getColumns(ops):
+    return (list(ops.offsets), list(ops.sizes), list(ops.mnems), list(ops.iflags),
+            ops.targets, ops.endoff, ops.invalid)
+
+# push ebp; mov ebp,esp; cmp dword [ebp+8],0; jz +5; call +0x10;
+# lea eax,[esi+ebx*4+0x10]; rep movsd; jmp [0x41414141]
+x86_code = '55' '89e5' '837d0800' '7405' 'e810000000' '8d449e10' 'f3a5' 'ff2541414141'
+
+class OpcodeArraysTest(unittest.TestCase):
+
+    def checkSweep(self, archname, bytez, va=0x41410000):
+        '''
+        The bulk columns must match a sweep of archParseOpcode() ( the
+        generic implementation ).
+        '''
+        archmod = envi.getArchModule(archname)
+        offset = 0
+        count = 0
+        while offset < len(bytez):
+            ops = archmod.archParseOpcodes(bytez, offset, va + offset)
+            slow = envi.ArchitectureModule.archParseOpcodes(archmod, bytez, offset, va + offset)
+            self.assertEqual(getColumns(ops), getColumns(slow))
+            count += len(ops)
+            offset = ops.endoff
+            if ops.invalid:
+                offset += 1
+        return count
+
+    def test_envi_opcode_arrays_x86(self):
+        for archname in ('i386', 'amd64'):
+            self.assertEqual(self.checkSweep(archname, x86_code.decode('hex')), 8)
+            self.checkSweep(archname, e_b_disasm.getRandomCode(0x800)[0][1])
+
+    def test_envi_opcode_arrays_arm(self):
+        code = ''.join([ code for name, code, regs in e_b_emulator.arm_workloads ])
+        self.assertEqual(self.checkSweep('arm', code), len(code) / 4)
+        self.checkSweep('arm', e_b_disasm.getRandomCode(0x800)[0][1])
+        self.checkSweep('thumb', e_b_disasm.getRandomCode(0x800)[0][1])
+
+    def test_envi_opcode_arrays_columns(self):
+        archmod = envi.getArchModule('i386')
+        bytez = x86_code.decode('hex')
+        ops = archmod.archParseOpcodes(bytez, va=0x1000)
+
+        self.assertEqual(len(ops), 8)
+        self.assertEqual(list(ops.sizes), [1, 2, 4, 2, 5, 4, 2, 6])
+        self.assertEqual([ ops.getMnem(i) for i in xrange(len(ops)) ],
+                         ['push', 'mov', 'cmp', 'jz', 'call', 'lea', 'movsd', 'jmp'])
+        self.assertEqual(ops.targets, [None, None, None, 0x100e, 0x101e, None, None, None])
+        self.assertTrue(ops.iflags[4] & envi.IF_CALL)
+        self.assertTrue(ops.iflags[6] & envi.IF_REPEAT)
+        self.assertTrue(ops.iflags[7] & envi.IF_NOFALL)
+        self.assertEqual((ops.endoff, ops.invalid), (len(bytez), False))
+
+        # Opcodes are only built on demand
+        for i in xrange(len(ops)):
+            op = ops.getOpcode(i)
+            self.assertEqual((op.va, op.size, op.mnem), (ops.getVa(i), ops.sizes[i], ops.getMnem(i)))
+            self.assertEqual(op.mnemid, ops.mnems[i])
+
+        self.assertEqual(ops.getIndex(0x1000), 0)
+        self.assertEqual(ops.getIndex(0x1005), 2)
+        self.assertEqual(ops.getIndex(0x1000 + len(bytez)), -1)
+        self.assertEqual(ops.getIndex(0xfff), -1)
+
+    def test_envi_opcode_arrays_blocks(self):
+        archmod = envi.getArchModule('i386')
+        bytez = x86_code.decode('hex')
+
+        # Stop at the end of the basic block ( the jz )
+        ops = archmod.archParseOpcodes(bytez, va=0x1000, stopflags=envi.IF_BRANCH | envi.IF_NOFALL)
+        self.assertEqual((len(ops), ops.endoff, ops.invalid), (4, 9, False))
+
+        # From the middle, up to a size
+        ops = archmod.archParseOpcodes(bytez, 3, 0x1003, size=8)
+        self.assertEqual((list(ops.offsets), ops.endoff), ([3, 7, 9], 14))
+        self.assertEqual(ops.targets[1], 0x100e)
+
+        # Stop at an invalid instruction ( and at a truncated one )
+        ops = archmod.archParseOpcodes(bytez[:9] + '\x0f\x04' + bytez[9:], va=0x1000)
+        self.assertEqual((len(ops), ops.endoff, ops.invalid), (4, 9, True))
+        ops = archmod.archParseOpcodes(bytez[:12], va=0x1000)
+        self.assertEqual((len(ops), ops.endoff, ops.invalid), (4, 9, True))
+
+    def test_envi_opcode_arrays_vex(self):
+        # vaddps ymm0,ymm1,ymm2 is left to disasm()
+        archmod = envi.getArchModule('amd64')
+        bytez = 'c5f458c2' '4883c001'.decode('hex')
+        ops = archmod.archParseOpcodes(bytez, va=0x1000)
+        self.assertEqual(list(ops.sizes), [4, 4])
+        self.assertEqual([ ops.getMnem(0), ops.getMnem(1) ], ['addps', 'add'])
+        self.assertEqual(repr(ops.getOpcode(0)), repr(archmod.archParseOpcode(bytez, 0, 0x1000)))
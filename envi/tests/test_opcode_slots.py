@@ -0,0 +1,62 @@
+import pickle
+import unittest
+
+import envi
+import envi.benchmarks.disasm as e_b_disasm
+
+def getOpcodes(archname, bytez, va=0x41410000):
+    archmod = envi.getArchModule(archname)
+    ops = []
+    offset = 0
+    while offset < len(bytez):
+        try:
+            op = archmod.archParseOpcode(bytez, offset, va + offset)
+        except Exception, e:
+            offset += 1
+            continue
+        ops.append(op)
+        offset += max(op.size, 1)
+    return ops
+
+class OpcodeSlotsTest(unittest.TestCase):
+
+    archnames = ('i386', 'amd64', 'arm', 'thumb', 'msp430')
+
+    def setUp(self):
+        self.bytez = e_b_disasm.getRandomCode(0x400)[0][1]
+
+    def test_envi_opcode_slots_nodict(self):
+        for archname in self.archnames:
+            for op in getOpcodes(archname, self.bytez):
+                self.assertFalse(hasattr(op, '__dict__'), '%s: %r' % (archname, op))
+                for oper in op.opers:
+                    self.assertFalse(hasattr(oper, '__dict__'), '%s: %r' % (archname, op))
+
+    def test_envi_opcode_slots_pickle(self):
+        for archname in self.archnames:
+            ops = getOpcodes(archname, self.bytez)
+            for proto in (0, pickle.HIGHEST_PROTOCOL):
+                newops = pickle.loads(pickle.dumps(ops, proto))
+                self.assertEqual(newops, ops)
+                self.assertEqual(map(repr, newops), map(repr, ops))
+                self.assertEqual([ envi.getSlotState(op) for op in newops ],
+                                 [ envi.getSlotState(op) for op in ops ])
+
+    def test_envi_opcode_slots_mnemid(self):
+        # The mnemonic ids are not pickled ( they are only valid in a process )
+        archmod = envi.getArchModule('amd64')
+        op = archmod.archParseOpcode('4883c001'.decode('hex'), 0, 0x1000)
+        state = op.__getstate__()
+        self.assertNotIn('mnemid', state)
+
+        newop = pickle.loads(pickle.dumps(op, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(newop.mnemid, envi.getMnemId('add'))
+
+    def test_envi_opcode_slots_regctx(self):
+        # The register context is shared by the opcode class ( not per operand )
+        for archname, hexbytez, oprepr in (('i386', '4001d8', 'inc eax'),
+                                           ('amd64', '4801d8', 'add rax,rbx')):
+            archmod = envi.getArchModule(archname)
+            op = archmod.archParseOpcode(hexbytez.decode('hex'), 0, 0x1000)
+            self.assertEqual(repr(op), oprepr)
+            self.assertTrue(op._dis_regctx is archmod._arch_dis._dis_regctx)
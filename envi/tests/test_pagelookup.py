@@ -0,0 +1,109 @@
+import random
+import unittest
+
+import envi.pagelookup as e_page
+
+class PageLookupTest(unittest.TestCase):
+
+    def test_envi_rangelookup_basic(self):
+        rl = e_page.RangeLookup()
+        rl.initMapLookup(0x41410000, 0x1000)
+
+        loc1 = (0x41410010, 4)
+        rl.setMapLookup(0x41410010, 4, loc1)
+        self.assertEqual(rl.getMapLookup(0x41410010), loc1)
+        self.assertEqual(rl.getMapLookup(0x41410013), loc1)
+        self.assertIsNone(rl.getMapLookup(0x41410014))
+        self.assertIsNone(rl.getMapLookup(0x4141000f))
+        self.assertIsNone(rl.getMapLookup(0x42420000))
+
+        # Paint over the middle and make sure we split
+        loc2 = (0x41410011, 1)
+        rl.setMapLookup(0x41410011, 1, loc2)
+        self.assertEqual(rl.getMapLookup(0x41410010), loc1)
+        self.assertEqual(rl.getMapLookup(0x41410011), loc2)
+        self.assertEqual(rl.getMapLookup(0x41410012), loc1)
+
+        rl.setMapLookup(0x41410010, 4, None)
+        self.assertIsNone(rl.getMapLookup(0x41410011))
+        self.assertEqual(rl.getMapLookupRanges(0x41410000, 0x1000), [])
+
+        # Sets are clamped to the end of the map
+        rl.setMapLookup(0x41410ffe, 20, loc1)
+        self.assertEqual(rl.getMapLookupRanges(0x41410000, 0x2000), [(0x41410ffe, 0x41411000, loc1)])
+
+        self.assertEqual(rl.getPrevMapLookup(0x41420000), loc1)
+        self.assertIsNone(rl.getPrevMapLookup(0x41410100))
+
+        self.assertRaises(Exception, rl.setMapLookup, 0x42420000, 4, loc1)
+
+    def test_envi_rangelookup_maplookup(self):
+        # Randomly paint both lookups and make sure they agree byte for byte
+        rnd = random.Random(0x56495649)
+        maps = [ (0x1000, 0x800), (0x2000, 0x400), (0x10000, 0x1000) ]
+
+        ml = e_page.MapLookup()
+        rl = e_page.RangeLookup()
+        for mva, msize in maps:
+            ml.initMapLookup(mva, msize)
+            rl.initMapLookup(mva, msize)
+
+        for i in xrange(2000):
+            mva, msize = rnd.choice(maps)
+            va = mva + rnd.randint(0, msize - 1)
+            size = rnd.randint(1, 32)
+            obj = rnd.choice((None, (va, size)))
+            ml.setMapLookup(va, size, obj)
+            rl.setMapLookup(va, size, obj)
+
+        for mva, msize in maps:
+            for va in xrange(mva - 4, mva + msize + 4):
+                self.assertEqual(ml.getMapLookup(va), rl.getMapLookup(va))
+
+    def test_envi_rangelookup_batch(self):
+        # A batch set must paint exactly like setting each range in order
+        rnd = random.Random(0x42554c4b)
+        maps = [ (0x1000, 0x800), (0x2000, 0x400) ]
+
+        rl1 = e_page.RangeLookup()
+        rl2 = e_page.RangeLookup()
+        for mva, msize in maps:
+            rl1.initMapLookup(mva, msize)
+            rl2.initMapLookup(mva, msize)
+
+        for i in xrange(20):
+            ranges = []
+            for j in xrange(rnd.randint(0, 100)):
+                mva, msize = rnd.choice(maps)
+                va = mva + rnd.randint(0, msize - 1)
+                size = rnd.randint(0, 16)
+                ranges.append((va, size, rnd.choice((None, (va, size), (va, size), (va, size)))))
+
+            rl2.setMapLookups(ranges)
+            for va, size, obj in ranges:
+                rl1.setMapLookup(va, size, obj)
+
+            for mva, msize in maps:
+                for va in xrange(mva, mva + msize):
+                    self.assertEqual(rl1.getMapLookup(va), rl2.getMapLookup(va))
+
+    def test_envi_rangeset(self):
+        rnd = random.Random(0x52534554)
+        rs = e_page.RangeSet()
+        vas = set()
+        for i in xrange(500):
+            va = rnd.randint(0x1000, 0x1400)
+            size = rnd.randint(0, 8)
+            rs.addRange(va, size)
+            vas.update(xrange(va, va + size))
+
+        ranges = rs.getRanges()
+        self.assertEqual(len(rs), len(ranges))
+        self.assertEqual(sum([ size for va, size in ranges ]), len(vas))
+        # Overlapping and touching ranges were merged
+        for (va0, size0), (va1, size1) in zip(ranges, ranges[1:]):
+            self.assertLess(va0 + size0, va1)
+
+        for va in xrange(0xff0, 0x1420):
+            self.assertEqual(rs.isRangeSet(va, 1), va in vas)
+            self.assertEqual(rs.isRangeSet(va, 4), bool(vas.intersection(xrange(va, va + 4))))
@@ -10,6 +10,7 @@ import sys
 import time
 import Queue
 import string
+import bisect
 import struct
 import weakref
 import hashlib
@@ -40,7 +41,13 @@ import vstruct.primitives as vs_prims
 
 import vivisect.base as viv_base
 import vivisect.parsers as viv_parsers
+import vivisect.storage as viv_storage
 import vivisect.codegraph as viv_codegraph
+import vivisect.impemu.pool as viv_imp_pool
+import vivisect.parallel as viv_parallel
+import vivisect.profiler as viv_profiler
+import vivisect.incremental as viv_incremental
+import vivisect.opcache as viv_opcache
 import vivisect.impemu.lookup as viv_imp_lookup
 
 from vivisect.exc import *
@@ -49,6 +56,9 @@ from vivisect.defconfig import *
 
 import vivisect.analysis.generic.emucode as v_emucode
 
+# How many words findPointers decodes at once
+pointer_scan_words = 0x10000
+
 class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
 
     def __init__(self):
@@ -79,10 +89,17 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         self.relocations = []
         self._dead_data = []
         self.iscode = {}
+        self.emupool = viv_imp_pool.EmulatorPool(self)
+        # Decoded opcodes shared by code flow and the emulators
+        self.opcache = viv_opcache.OpcodeCache(maxsize=self.config.viv.opcache.maxsize)
+        self._arch_idx = 0 # The default arch index (see _mcb_Architecture)
 
-        self.xrefs = []
+        self.xrefs = viv_base.OrderedSet()
         self.xrefs_by_to = {}
         self.xrefs_by_from = {}
+        # vas whose by_to/by_from lists may hold deleted xrefs
+        self._xrefs_stale_to = set()
+        self._xrefs_stale_from = set()
 
         # XXX - make config option
         self.greedycode = 0
@@ -115,6 +132,12 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         # Extended *function* analysis modules
         self.fmods = {}
         self.fmodlist = []
+        # The parallel function analysis scheduler (during analyze())
+        self.funcsched = None
+        # The per module analysis profiler (during analyze())
+        self.profiler = None
+        # What has changed since the last analysis (see reanalyze())
+        self.dirty = viv_incremental.DirtyQueue(self)
 
         self.chan_lookup = {}
         self.nextchanid = 1
@@ -161,12 +184,16 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         return self._viv_gui
 
     def loadWorkspace(self, wsname):
-        mname = self.getMeta("StorageModule")
+        # Existing workspace files tell us which storage module wrote them
+        mname = viv_storage.getStorageModuleName(wsname)
+        if mname == None:
+            mname = self.getMeta("StorageModule")
         mod = self.loadModule(mname)
         mod.loadWorkspace(self, wsname)
         self.setMeta("StorageName", wsname)
         # The event list thusfar came *only* from the load...
         self._createSaveMark()
+        self.dirty.reset()
         # Snapin our analysis modules
         self._snapInAnalysisModules()
 
@@ -207,6 +234,22 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
 
         return eclass(self, logwrite=logwrite, logread=logread)
 
+    def getEmulatorPool(self):
+        """
+        Get the EmulatorPool for this workspace.  Pooled emulators are
+        reset (rather than rebuilt) between uses, which is much faster
+        for analysis which emulates many addresses.
+
+        Example:
+            pool = vw.getEmulatorPool()
+            emu = pool.getEmulator()
+            try:
+                emu.runFunction(va, maxhit=1)
+            finally:
+                pool.putEmulator(emu)
+        """
+        return self.emupool
+
     def addLibraryDependancy(self, libname):
         """
         Add a *normalized* library name to the import search
@@ -312,7 +355,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         """
         if not self.isValidPointer(va):
             return False
-        offset, bytes = self.getByteDef(va)
+        offset, bytes = self.getPageByteDef(va)
         return self.sigtree.isSignature(bytes, offset=offset)
 
     def addNoReturnApi(self, funcname):
@@ -434,24 +477,28 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         """
         Import and initialize data from the given vivisect workspace
         export.
+
+        NOTE: the events are applied in bulk (they are *not* sent to the
+              server) and then delivered to any event channels.
         """
-        # During import, if we have a server, be sure not to notify
-        # the server about the events he just gave us...
-        local = False
-        if self.server != None:
-            local = True
+        idx = len(self._event_list)
+        self._bulkImportEvents(wsevents)
 
-        # Process the events from the import data...
-        fe = self._fireEvent
-        for event, einfo in wsevents:
-            fe(event, einfo, local=local)
-        return
+        if self.chan_lookup:
+            events = self._event_list[idx:]
+            for q in self.chan_lookup.values():
+                for evtup in events:
+                    q.put_nowait(evtup)
 
     def exportWorkspace(self):
         '''
         Return the (probably big) list of events which define this
         workspace.
         '''
+        if self._event_snap != None:
+            # Some of our state was loaded without events, build them
+            start, idx, getevents = self._event_snap
+            return self._event_list[:start] + getevents() + self._event_list[idx:]
         return self._event_list
 
     def exportWorkspaceChanges(self):
@@ -523,7 +570,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
 
         lva,lsize,ltype,tinfo = loctup
         if ltype == LOC_OP:
-            op = self.parseOpcode(lva)
+            op = self._parseOpcode(lva)
             return repr(op)
 
         elif ltype == LOC_STRING:
@@ -586,6 +633,16 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
 
         return False
 
+    def prefetchFunctions(self, vas, follow=False):
+        '''
+        Hint that analysis is about to make functions at the given
+        addresses ( or follow pointers to them if follow=True ) in order.
+        During parallel analysis ( see vivisect.parallel ) their emulation
+        is done ahead of time by worker processes.
+        '''
+        if self.funcsched != None:
+            self.funcsched.prefetch(vas, follow=follow)
+
     def analyze(self):
         """
         Call this to ask any available analysis modules
@@ -595,6 +652,77 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         if self.verbose: self.vprint('...analyzing exports.')
 
         starttime = time.time()
+
+        workers = self.config.viv.analysis.parallel.workers
+        if workers > 0:
+            self.funcsched = viv_parallel.FunctionScheduler(self, workers)
+
+        self.profiler = viv_profiler.AnalysisProfiler(self)
+
+        try:
+            pstart = self.profiler.start()
+            self.prefetchFunctions(self.getEntryPoints())
+            for eva in self.getEntryPoints():
+                if self.isFunction(eva):
+                    continue
+                if not self.probeMemory(eva, 1, e_mem.MM_EXEC):
+                    continue
+                self.makeFunction(eva)
+
+            self.profiler.stopModule('entrypoints', pstart)
+
+            # Now lets engage any extended analysis modules.  If any modules return
+            # true, they managed to change things and we should run again...
+            for mname in self.amodlist:
+                mod = self.amods.get(mname)
+                if self.verbose: self.vprint("Extended Analysis: %s" % mod.__name__)
+                failed = False
+                pstart = self.profiler.start()
+                try:
+                    mod.analyze(self)
+                except Exception, e:
+                    failed = True
+                    if self.verbose:
+                        traceback.print_exc()
+                    self.verbprint("Extended Analysis Exception %s: %s" % (mod.__name__,e))
+
+                self.profiler.stopModule(mname, pstart, failed=failed)
+
+        finally:
+            if self.funcsched != None:
+                self.funcsched.close()
+                self.funcsched = None
+
+            self.setTransMeta('AnalysisProfile', self.profiler.getProfile())
+            self.profiler = None
+
+        endtime = time.time()
+        if self.verbose: 
+            self.vprint('...analysis complete! (%d sec)' % (endtime-starttime))
+            self.printDiscoveredStats()
+        self._fireEvent(VWE_AUTOANALFIN, (endtime, starttime))
+        self.dirty.reset()
+
+    def reanalyze(self):
+        '''
+        Incrementally analyze the changes made since the last analysis.
+        The function analysis modules run again over the existing functions
+        whose code changed, and the analysis modules which were invalidated
+        by the changes run again ( see vivisect.incremental ).
+
+        Returns a tuple of ( [ fva, ... ], [ modname, ... ] ) for what
+        was analyzed.
+
+        Example:
+            vw.makeFunction(va)
+            vw.reanalyze()
+        '''
+        starttime = time.time()
+        funcs = self.dirty.popFunctions()
+        for fva in funcs:
+            if self.verbose: self.vprint('Reanalyzing function: 0x%.8x' % fva)
+            self.reanalyzeFunction(fva)
+
         for eva in self.getEntryPoints():
             if self.isFunction(eva):
                 continue
@@ -602,23 +730,50 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
                 continue
             self.makeFunction(eva)
 
-        # Now lets engage any extended analysis modules.  If any modules return
-        # true, they managed to change things and we should run again...
+        amods = []
         for mname in self.amodlist:
             mod = self.amods.get(mname)
-            if self.verbose: self.vprint("Extended Analysis: %s" % mod.__name__)
+            events = getattr(mod, 'reanalyze_events', None)
+            if not events:
+                continue
+
+            regions = self.dirty.getRegions(events)
+            if not regions:
+                continue
+
+            amods.append(mname)
+            if self.verbose: self.vprint("Extended Reanalysis: %s (%d regions)" % (mod.__name__, len(regions)))
             try:
-                mod.analyze(self)
+                if hasattr(mod, 'analyzeRegions'):
+                    mod.analyzeRegions(self, regions)
+                else:
+                    mod.analyze(self)
             except Exception, e:
                 if self.verbose:
                     traceback.print_exc()
-                self.verbprint("Extended Analysis Exception %s: %s" % (mod.__name__,e))
+                self.verbprint("Extended Reanalysis Exception %s: %s" % (mod.__name__,e))
 
         endtime = time.time()
-        if self.verbose: 
-            self.vprint('...analysis complete! (%d sec)' % (endtime-starttime))
-            self.printDiscoveredStats()
+        if self.verbose:
+            self.vprint('...reanalysis complete! (%d sec)' % (endtime-starttime))
         self._fireEvent(VWE_AUTOANALFIN, (endtime, starttime))
+        self.dirty.reset()
+        return funcs, amods
+
+    def markDirtyRegion(self, va, size):
+        '''
+        Mark a region as changed so the next reanalyze() looks at it again.
+        '''
+        self.dirty.markRegion(va, size)
+
+    def markDirtyFunction(self, fva):
+        '''
+        Mark a function as changed so the next reanalyze() runs the
+        function analysis modules over it again.
+        '''
+        if not self.isFunction(fva):
+            raise InvalidFunction(fva)
+        self.dirty.markFunction(fva)
 
 
     def printDiscoveredStats(self):
@@ -635,15 +790,9 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
             if not self.isExecutable(mva):
                 continue
 
-            off = 0
-            while off < msz:
-                loc = self.getLocation(mva+off)
-                if loc == None:
-                    off += 1
-                    undisc += 1
-                else:
-                    off += loc[L_SIZE]
-                    disc += loc[L_SIZE]
+            mundisc = sum([ size for va, size in self.iterUndefinedRanges(mva, msz) ])
+            disc += msz - mundisc
+            undisc += mundisc
         return disc, undisc
 
     def getImports(self):
@@ -684,12 +833,110 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         """
         return self.exports_by_va.get(va)
 
-    def findPointers(self, cache=True):
+    def _getPointerRanges(self):
+        '''
+        Return a sorted list of (va, vamax) tuples for the memory maps
+        (adjacent maps are merged) which valid pointers point into.
+        '''
+        ranges = []
+        for mva, msize, mperm, mname in sorted(self.getMemoryMaps()):
+            if ranges and ranges[-1][1] >= mva:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], mva + msize))
+                continue
+            ranges.append((mva, mva + msize))
+        return ranges
+
+    def _scanPointerWords(self, bytes, offset, maxoff, size, ranges):
+        '''
+        Bulk decode every (aligned and unaligned) little endian word of
+        the given size at offsets offset -> maxoff in bytes and return a
+        sorted list of (offset, value) tuples for the words which point
+        into the (va, vamax) ranges from _getPointerRanges().
+        '''
+        ret = []
+        if not ranges or maxoff <= offset:
+            return ret
+
+        fmtchar = e_bits.le_fmt_chars[size][-1]
+        starts = [ rva for rva, rvamax in ranges ]
+        ends = [ rvamax for rva, rvamax in ranges ]
+        lo = starts[0]
+        hi = ends[-1]
+
+        for phase in xrange(size):
+            off = offset + phase
+            while off < maxoff:
+                count = min(pointer_scan_words, (maxoff - off + size - 1) // size)
+                words = struct.unpack_from('<%d%s' % (count, fmtchar), bytes, off)
+
+                hits = [ (off + (i * size), x) for i, x in enumerate(words) if lo <= x < hi ]
+                if len(ranges) > 1:
+                    hits = [ (hoff, x) for hoff, x in hits if x < ends[bisect.bisect_right(starts, x) - 1] ]
+
+                ret.extend(hits)
+                off += count * size
+
+        ret.sort()
+        return ret
+
+    def _findPointersInRange(self, va, size, ranges):
+        # Find the pointers in the undefined space within va -> va+size
+        # (which must be within one memory map)
+        ret = []
+        psize = self.psize
+
+        offset, bytes = self.getByteDef(va)
+        delta = va - offset
+        maxva = min(va + size, delta + len(bytes) - (psize * 2))
+
+        # Bulk decode every word in the range and keep the pointers
+        ptrs = self._scanPointerWords(bytes, offset, maxva - delta, psize, ranges)
+        if not ptrs:
+            return ret
+
+        ptroffs = [ off for off, x in ptrs ]
+
+        # Then mask out the defined locations (a pointer skips the
+        # bytes it covers, even if they run past the end of the gap)
+        while va < maxva:
+            nextva = None
+            for gva, gsize in self.iterUndefinedRanges(va, maxva - va):
+                gvamax = gva + gsize
+                i = bisect.bisect_left(ptroffs, gva - delta)
+                while i < len(ptroffs):
+                    pva = ptroffs[i] + delta
+                    if pva >= gvamax:
+                        break
+                    ret.append((pva, ptrs[i][1]))
+                    gva = pva + psize
+                    i = bisect.bisect_left(ptroffs, gva - delta, i)
+
+                if gva > gvamax:
+                    nextva = gva
+                    break
+
+            if nextva == None:
+                break
+            va = nextva
+
+        return ret
+
+    def findPointers(self, cache=True, regions=None):
         """
         Search through all currently "undefined" space and see
         if you can find pointers there...  Returns a list of tuples
         where the tuple is (<ptr at>,<pts to>).
+
+        If regions (a list of (va, size) tuples) is specified only the
+        undefined space within them is searched (and nothing is cached).
         """
+        if regions != None:
+            ret = []
+            ranges = self._getPointerRanges()
+            for va, size in viv_incremental.clipRegions(self, viv_incremental.mergeRegions(regions)):
+                ret.extend(self._findPointersInRange(va, size, ranges))
+            return ret
+
         if cache:
             ret = self.getTransMeta('findPointers')
             if ret != None:
@@ -699,30 +946,9 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
                 return ret
 
         ret = []
-        size = self.psize
-
+        ranges = self._getPointerRanges()
         for mva, msize, mperm, mname in self.getMemoryMaps():
-
-            offset, bytes = self.getByteDef(mva)
-            maxsize = len(bytes) - size
-
-            while offset + size < maxsize:
-                dbg = 0
-                va = mva + offset
-
-                loctup = self.getLocation(va)
-                if loctup != None:
-                    offset += loctup[L_SIZE]
-                    continue
-
-                x = e_bits.parsebytes(bytes, offset, size)
-                if self.isValidPointer(x):
-                    ret.append((va, x))
-                    offset += size
-                    continue
-                        
-
-                offset += 1
+            ret.extend(self._findPointersInRange(mva, msize, ranges))
 
         if cache:
             self.setTransMeta('findPointers', ret)
@@ -804,14 +1030,16 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         if self.iscode.get(va):
             return False
         self.iscode[va] = True
-        emu = self.getEmulator()
+        emu = self.emupool.getEmulator()
         wat = v_emucode.watcher(self, va)
         emu.setEmulationMonitor(wat)
         try:
             emu.runFunction(va, maxhit=1)
         except Exception, e:
             return False
- 
+        finally:
+            self.emupool.putEmulator(emu)
+
         if wat.looksgood():
             return True
         return False
@@ -828,7 +1056,25 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
 
         note: differs from the IMemory interface by checking loclist
         '''
+        archidx = self._getOpcodeArch(va, arch)
         b = self.readMemory(va, 16)
+        return self.imem_archs[ archidx ].archParseOpcode(b, 0, va)
+
+    def _parseOpcode(self, va, arch=envi.ARCH_DEFAULT):
+        # Like parseOpcode() but from the opcode cache ( see vivisect.opcache )
+        # NOTE: the opcode is shared, only for callers which don't modify it
+        archidx = self._getOpcodeArch(va, arch)
+
+        # NOTE: "is None" because Opcode.__eq__ is slow
+        op = self.opcache.get(va, archidx)
+        if op is None:
+            b = self.readMemory(va, 16)
+            op = self.imem_archs[ archidx ].archParseOpcode(b, 0, va)
+            self.opcache.put(va, archidx, op)
+        return op
+
+    def _getOpcodeArch(self, va, arch):
+        # The arch index to parse the opcode at va with
         if arch == envi.ARCH_DEFAULT:
             loctup = self.getLocation(va)
             # XXX - in the case where we've set a location on what should be an 
@@ -837,7 +1083,41 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
             if loctup != None and loctup[ L_TINFO ] and loctup[ L_LTYPE ] == LOC_OP:
                 arch = loctup[ L_TINFO ]
 
-        return self.imem_archs[ (arch & envi.ARCH_MASK) >> 16 ].archParseOpcode(b, 0, va)
+        # The default arch is cached by its real index (see vivisect.opcache)
+        archidx = (arch & envi.ARCH_MASK) >> 16
+        if archidx == 0:
+            archidx = self._arch_idx
+        return archidx
+
+    def parseOpcodes(self, va, size, arch=envi.ARCH_DEFAULT, stopflags=0):
+        '''
+        Linear sweep disassemble the size bytes at the specified virtual
+        address into an envi.OpcodeArrays ( which only builds Opcode
+        objects on demand, see ArchitectureModule.archParseOpcodes ).
+
+        Example: ops = vw.parseOpcodes(bva, bsize)
+
+        note: like parseOpcode, the arch comes from the location at va
+        '''
+        if arch == envi.ARCH_DEFAULT:
+            loctup = self.getLocation(va)
+            if loctup != None and loctup[ L_TINFO ] and loctup[ L_LTYPE ] == LOC_OP:
+                arch = loctup[ L_TINFO ]
+
+        archidx = (arch & envi.ARCH_MASK) >> 16
+        if archidx == 0:
+            archidx = self._arch_idx
+
+        b = self.readMemory(va, size)
+        return self.imem_archs[ archidx ].archParseOpcodes(b, 0, va, stopflags=stopflags)
+
+    def writeMemory(self, va, bytes):
+        '''
+        Write bytes to the workspace memory ( and drop any cached opcodes
+        which were decoded from them ).
+        '''
+        e_mem.MemoryObject.writeMemory(self, va, bytes)
+        self.opcache.invalidate(va, len(bytes))
 
     def makeOpcode(self, va, op=None, arch=envi.ARCH_DEFAULT):
         """
@@ -847,7 +1127,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         if op == None:
             try:
 
-                op = self.parseOpcode(va, arch=arch)
+                op = self._parseOpcode(va, arch=arch)
 
             except envi.InvalidInstruction, msg:
                 #FIXME something is just not right about this...
@@ -944,7 +1224,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
                     # lets make it either a pointer or a number...
                     if self.getLocation(ref) == None:
 
-                        offset, bytes = self.getByteDef(ref)
+                        offset, bytes = self.getPageByteDef(ref)
 
                         val = e_bits.parsebytes(bytes, offset, o.tsize)
 
@@ -979,7 +1259,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         '''
         Show the repr of an instruction in the current canvas *before* making it that
         '''
-        op = self.parseOpcode(va, arch)
+        op = self._parseOpcode(va, arch)
         self.vprint("0x%x  (%d bytes)  %s" % (va, len(op), repr(op)))
 
     #################################################################
@@ -1033,6 +1313,44 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
 
         self.cfctx.addEntryPoint(va, arch=arch)
 
+    def analyzeFunction(self, fva):
+        '''
+        Run the function analysis modules ( in order ) over the function.
+        '''
+        prof = self.profiler
+        for fmname in self.fmodlist:
+            fmod = self.fmods.get(fmname)
+            failed = False
+            if prof != None:
+                pstart = prof.start()
+
+            try:
+                # Parallel analysis may have already emulated the function
+                if self.funcsched == None or not self.funcsched.analyzeFunction(fva, fmod):
+                    fmod.analyzeFunction(self, fva)
+            except Exception, e:
+                failed = True
+                if self.verbose:
+                    traceback.print_exc()
+                self.verbprint("Function Analysis Exception for 0x%x   %s: %s" % (fva, fmod.__name__, e))
+                self.setFunctionMeta(fva, "%s fail" % fmod.__name__, traceback.format_exc())
+
+            if prof != None:
+                prof.stopFunction(fmname, fva, pstart, failed=failed)
+
+    def reanalyzeFunction(self, fva):
+        '''
+        Drop the code blocks of an existing function and run the function
+        analysis modules over it again ( to pick up changes to its code ).
+        '''
+        if not self.isFunction(fva):
+            raise InvalidFunction(fva)
+
+        for cb in list(self.getFunctionBlocks(fva)):
+            self.delCodeBlock(cb[CB_VA])
+
+        self.analyzeFunction(fva)
+
     def delFunction(self, funcva):
         """
         Remove a function, it's code blocks and all associated meta
@@ -1281,9 +1599,10 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         """
         Return the entire list of XREF tuples for this workspace.
         """
+        xrefs = self.xrefs.getList()
         if rtype:
-            return [ xtup for xtup in self.xrefs if xtup[XR_RTYPE] == rtype ]
-        return self.xrefs
+            return [ xtup for xtup in xrefs if xtup[XR_RTYPE] == rtype ]
+        return xrefs
 
     def getXrefsFrom(self, va, rtype=None):
         """
@@ -1296,7 +1615,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
             dostuff(tova)
         """
         ret = []
-        xrefs = self.xrefs_by_from.get(va, None)
+        xrefs = self._getXrefList(self.xrefs_by_from, self._xrefs_stale_from, va)
         if xrefs == None:
             return ret
         if rtype == None:
@@ -1308,9 +1627,8 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         Get a list of xrefs which point to the given va. Optionally,
         specify an rtype to get only xrefs of that type.
         """
-        # FIXME make xrefs use MapLookup!
         ret = []
-        xrefs = self.xrefs_by_to.get(va, None)
+        xrefs = self._getXrefList(self.xrefs_by_to, self._xrefs_stale_to, va)
         if xrefs == None:
             return ret
         if rtype == None:
@@ -1396,7 +1714,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         Callers are expected to do their own xref analysis (ie, makeCode() etc)
         """
         ref = (fromva,tova,reftype,rflags)
-        if ref in self.getXrefsFrom(fromva):
+        if ref in self.xrefs:
             return
         self._fireEvent(VWE_ADDXREF, (fromva, tova, reftype, rflags))
 
@@ -1405,7 +1723,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         Remove the given xref.  This *will* exception if the
         xref doesn't already exist...
         """
-        if ref not in self.getXrefsFrom(ref[XR_FROM]):
+        if ref not in self.xrefs:
             raise Exception("Unknown Xref: %x %x %d" % ref)
         self._fireEvent(VWE_DELXREF, ref)
 
@@ -1500,7 +1818,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         create a location object or do anything other
         than parse memory.
         """
-        offset, bytes = self.getByteDef(va)
+        offset, bytes = self.getPageByteDef(va)
         return e_bits.parsebytes(bytes, offset, self.psize)
 
     def makePointer(self, va, tova=None, follow=True):
@@ -1513,7 +1831,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
 
         # Get and document the xrefs created for the new location
         if tova == None:
-            offset, bytes = self.getByteDef(va)
+            offset, bytes = self.getPageByteDef(va)
             tova = e_bits.parsebytes(bytes, offset, psize)
 
         self.addXref(va, tova, REF_PTR)
@@ -1547,7 +1865,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         Example:
             val = vw.parseNumber(0x41414140, 4)
         '''
-        offset, bytes = self.getByteDef(va)
+        offset, bytes = self.getPageByteDef(va)
         return e_bits.parsebytes(bytes, offset, size)
 
     def makeString(self, va, size=None):
@@ -1596,10 +1914,10 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         Example: vw.addStructureModule('ntdll', 'vstruct.defs.windows.win_5_1_i386.ntdll')
 
         This allows subsequent struct lookups by names like
-        '''
 
-        mod = self.loadModule(modname)
-        self.vsbuilder.addVStructNamespace(namespace, mod)
+        NOTE: the module is not imported until the first lookup.
+        '''
+        self.vsbuilder.addVStructNamespaceModule(namespace, modname)
 
     def getStructure(self, va, vstructname):
         """
@@ -1720,12 +2038,78 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         of a particular type.
         """
         if ltype == None:
-            return list(self.loclist)
+            return list(self.locset.getList())
+
+        locs = self.locs_by_type.get(ltype)
+        if locs == None:
+            return []
 
         if linfo == None:
-            return [ loc for loc in self.loclist if loc[2] == ltype ]
+            return list(locs.getList())
+
+        return [ loc for loc in locs.getList() if loc[L_TINFO] == linfo ]
 
-        return [ loc for loc in self.loclist if (loc[2] == ltype and loc[3] == linfo) ]
+    def iterLocations(self, va, size, ltype=None):
+        """
+        Yield the location tuples which begin within va -> va+size in
+        address order.  Optionally, only yield locations of type ltype.
+
+        Example:
+            for lva, lsize, ltype, tinfo in vw.iterLocations(va, 0x1000, LOC_POINTER):
+                dostuff(lva)
+        """
+        vamax = va + size
+        if ltype == None:
+            # The location map is already sorted by address...
+            lastloc = None
+            for rva, rvamax, loc in self.locmap.getMapLookupRanges(va, size):
+                if loc is not lastloc and loc[L_VA] >= va:
+                    yield loc
+                lastloc = loc
+            return
+
+        locs = self.locs_by_type.get(ltype)
+        if locs == None:
+            return
+
+        # The sorted list changes in place if the caller adds or deletes
+        # locations, so find our place again (by the last loc) each time.
+        locs = locs.getSorted()
+        i = bisect.bisect_left(locs, (va,))
+        while i < len(locs) and locs[i][L_VA] < vamax:
+            loc = locs[i]
+            yield loc
+            i = bisect.bisect_right(locs, loc)
+
+    def iterUndefinedRanges(self, va, size):
+        """
+        Yield (va, size) tuples for the runs of undefined bytes (bytes
+        with no location) within va -> va+size.  Defined space is stepped
+        over by location size (the same way a byte by byte getLocation()
+        walk would) using the location map rather than per byte lookups.
+
+        NOTE: the gaps are computed as the iterator goes, callers which
+              add locations within a gap should restart the iteration.
+
+        Example:
+            for gva, gsize in vw.iterUndefinedRanges(mapva, mapsize):
+                dostuff(gva, gsize)
+        """
+        vamax = va + size
+        nextrange = self.locmap.getNextMapLookupRange
+        while va < vamax:
+            rng = nextrange(va)
+            if rng == None or rng[0] >= vamax:
+                yield va, vamax - va
+                return
+
+            rva, rvamax, loc = rng
+            if rva > va:
+                yield va, rva - va
+                va = rva
+                continue
+
+            va += max(loc[L_SIZE], 1)
 
     def isLocation(self, va, range=False):
         """
@@ -1765,23 +2149,20 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         """
         ret = []
         endva = va+size
-        undefva = None
-        while va < endva:
-            ltup = self.getLocation(va)
-            if ltup == None:
-                if undefva == None:
-                    undefva = va
-                va += 1
-            else:
-                if undefva != None:
-                    ret.append((undefva, va-undefva, LOC_UNDEF, None))
-                    undefva = None
+        for undefva, undefsize in self.iterUndefinedRanges(va, size):
+            # Step through the locations before the gap
+            while va < undefva:
+                ltup = self.getLocation(va)
                 ret.append(ltup)
-                va += ltup[L_SIZE]
+                va += max(ltup[L_SIZE], 1)
 
-        # Mop up any hanging udefs
-        if undefva != None:
-            ret.append((undefva, va-undefva, LOC_UNDEF, None))
+            ret.append((undefva, undefsize, LOC_UNDEF, None))
+            va = undefva + undefsize
+
+        while va < endva:
+            ltup = self.getLocation(va)
+            ret.append(ltup)
+            va += max(ltup[L_SIZE], 1)
 
         return ret
 
@@ -1858,18 +2239,9 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         you find one or hit the edge of the segment.
         """
         va -= 1
-        ret = self.locmap.getMapLookup(va)
-        if ret != None:
-            return ret
         if adjacent:
-            return None
-        va -= 1
-        while va > 0:
-            ret = self.locmap.getMapLookup(va)
-            if ret != None:
-                return ret
-            va -= 1
-        return None
+            return self.locmap.getMapLookup(va)
+        return self.locmap.getPrevMapLookup(va)
 
     def vaByName(self, name):
         return self.va_by_name.get(name, None)
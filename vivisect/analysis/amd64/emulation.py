@@ -12,6 +12,10 @@ from vivisect.const import *
 
 import vivisect.analysis.generic.switchcase as vag_switch
 
+# The emulation is worth farming out to worker processes during
+# parallel analysis ( see vivisect.parallel )
+parallel = True
+
 regops = set(['cmp','sub'])
 
 class AnalysisMonitor(viv_monitor.AnalysisMonitor):
@@ -1,3 +1,6 @@
+import re
+import struct
+
 import envi
 from vivisect.const import *
 
@@ -22,8 +25,26 @@ md5_xform = [
     4149444226, 3174756917, 718787259,  3951481745,
 ]
 
+md5_consts = set(md5_inits + md5_xform)
+
+# Find ( possibly overlapping ) encodings of the constants in code bytes
+md5_regex = re.compile('(?=(%s))' % '|'.join([ re.escape(struct.pack(fmt, c)) for c in md5_consts for fmt in ('<I', '>I') ]))
+
 vlname = "Crypto Constants"
 
+def getCandidates(ops):
+    '''
+    Return the sorted indexes of the instructions in the envi.OpcodeArrays
+    whose bytes encode one of the md5 constants ( or which branch to one ).
+    Only those may have one as an immediate operand.
+    '''
+    ret = set([ idx for idx, tva in enumerate(ops.targets) if tva in md5_consts ])
+    for match in md5_regex.finditer(ops.bytez):
+        idx = ops.getIndex(ops.baseva + match.start())
+        if idx >= 0:
+            ret.add(idx)
+    return sorted(ret)
+
 def analyze(vw):
 
     rows = []
@@ -32,9 +53,9 @@ def analyze(vw):
         md5_init_score = 0
         md5_xform_score = 0
         for va, size, funcva in vw.getFunctionBlocks(fva):
-            maxva = va+size
-            while va < maxva:
-                op = vw.parseOpcode(va)
+            ops = vw.parseOpcodes(va, size)
+            for idx in getCandidates(ops):
+                op = ops.getOpcode(idx)
                 for o in op.opers:
 
                     if not o.isImmed():
@@ -48,8 +69,6 @@ def analyze(vw):
                     if imm in md5_xform:
                         md5_xform_score += 1
 
-                va += len(op)
-
         if md5_init_score == len(md5_inits):
             rows.append((fva, "MD5 Init"))
 
@@ -7,6 +7,7 @@ if they are code by emulation behaviorial analysis.
 import envi
 import vivisect
 import vivisect.reports as viv_rep
+import vivisect.incremental as viv_incremental
 from envi.archs.i386.opconst import *
 import vivisect.impemu.monitor as viv_imp_monitor
 
@@ -14,6 +15,9 @@ from vivisect.const import *
 
 verbose = False
 
+# New names, pointers and pointer xrefs (see vivisect.incremental)
+reanalyze_events = (VWE_ADDMMAP, VWE_DELLOCATION, VWE_SETNAME, VWE_ADDXREF)
+
 class watcher(viv_imp_monitor.EmulationMonitor):
 
     def __init__(self, vw, tryva):
@@ -98,9 +102,35 @@ class watcher(viv_imp_monitor.EmulationMonitor):
             self.hasret = True
             emu.stopEmu()
 
+def getCandidates(vw, regions=None):
+    '''
+    Return the undefined targets of names, pointers and pointer xrefs
+    ( only those in or from the given regions ).
+    '''
+    if regions == None:
+        vatodo = [ va for va, name in vw.getNames() if vw.getLocation(va) == None ]
+        vatodo.extend( [ va for addr, va in vw.findPointers() if vw.getLocation(va) == None ] ) 
+        vatodo.extend( [tova for fromva, tova, reftype, rflags in vw.getXrefs(rtype=REF_PTR) if vw.getLocation(tova) == None] )
+        return vatodo
+
+    isin = viv_incremental.isInRegions
+    vatodo = [ va for va, name in vw.getNames() if isin(regions, va) and vw.getLocation(va) == None ]
+    vatodo.extend( [ va for addr, va in vw.findPointers(regions=regions) if vw.getLocation(va) == None ] )
+    for fromva, tova, reftype, rflags in vw.getXrefs(rtype=REF_PTR):
+        if (isin(regions, fromva) or isin(regions, tova)) and vw.getLocation(tova) == None:
+            vatodo.append(tova)
+    return vatodo
+
 def analyze(vw):
+    findCode(vw)
+
+def analyzeRegions(vw, regions):
+    findCode(vw, regions=regions)
+
+def findCode(vw, regions=None):
 
     flist = vw.getFunctions()
+    emupool = vw.getEmulatorPool()
 
     tried = {}
     vasetrows = []
@@ -108,10 +138,7 @@ def analyze(vw):
         docode = []
         bcode  = []
        
-        vatodo = []
-        vatodo = [ va for va, name in vw.getNames() if vw.getLocation(va) == None ]
-        vatodo.extend( [ va for addr, va in vw.findPointers() if vw.getLocation(va) == None ] ) 
-        vatodo.extend( [tova for fromva, tova, reftype, rflags in vw.getXrefs(rtype=REF_PTR) if vw.getLocation(tova) == None] )
+        vatodo = getCandidates(vw, regions=regions)
 
         for va in set(vatodo):
             if vw.getLocation(va) != None:
@@ -128,13 +155,15 @@ def analyze(vw):
                 continue
 
             tried[va] = True
-            emu = vw.getEmulator()
+            emu = emupool.getEmulator()
             wat = watcher(vw, va)
             emu.setEmulationMonitor(wat)
             try:
                 emu.runFunction(va, maxhit=1)
             except Exception, e:
                 continue
+            finally:
+                emupool.putEmulator(emu)
             if wat.looksgood():
                 docode.append(va)
             # flag to tell us to be greedy w/ finding code
@@ -11,6 +11,14 @@ import traceback
 import envi
 import envi.memory as e_mem
 import vivisect
+import vivisect.incremental as viv_incremental
+
+from vivisect.const import *
+
+# Newly undefined space (see vivisect.incremental)
+# NOTE: addFunctionSignatureBytes() fires no event, signatures added after
+# analysis need a vw.markDirtyRegion() over the code to be scanned for.
+reanalyze_events = (VWE_ADDMMAP, VWE_DELLOCATION)
 
 def analyze(vw):
     """
@@ -19,38 +27,54 @@ def analyze(vw):
     brute force find other function entry points based on the
     entry signatures db.
     """
-    # FIXME make the below code an undefined space iterator
-    # and use in findPointers too
     for mapva,mapsize,mapflags,fname in vw.getMemoryMaps():
 
         # Segment permissions check for likely code stuff at all
         if not mapflags & e_mem.MM_EXEC:
             continue
 
-        i = 0
-        maxsize = mapsize - 4
-        while i < maxsize:
-            va = mapva + i
-            loctup = vw.getLocation(va)
-            if loctup != None:
-                i += loctup[vivisect.L_SIZE]
-                continue
+        va = mapva
+        maxva = mapva + mapsize - 4
+        while va != None and va < maxva:
+            va = scanUndefined(vw, va, maxva)
 
-            i+=1
+def analyzeRegions(vw, regions):
+    """
+    Brute force the entry signatures over the (executable) dirty regions.
+    """
+    for rva, rsize in viv_incremental.clipRegions(vw, regions, perms=e_mem.MM_EXEC):
+        mapva, mapsize, mapflags, fname = vw.getMemoryMap(rva)
+        va = rva
+        maxva = min(rva + rsize, mapva + mapsize - 4)
+        while va != None and va < maxva:
+            va = scanUndefined(vw, va, maxva)
 
+def scanUndefined(vw, va, maxva):
+    """
+    Check the undefined bytes from va to maxva for function signatures.
+    Returns the va to resume scanning from once a function is made (the
+    locations have changed) or None when done.
+    """
+    for gva, gsize in vw.iterUndefinedRanges(va, maxva - va):
+        for va in xrange(gva, gva + gsize):
+            matched = False
             try:
 
                 if vw.isFunctionSignature(va):
                     #print "MATCH MATCH MATCH: 0x%.8x" % va
+                    matched = True
                     vw.makeFunction(va)
 
             except vivisect.InvalidLocation, msg:
                 if vw.verbose: vw.vprint("InvalidLocation: %s" % msg)
             except envi.InvalidInstruction, e:
-                continue
+                pass
             except envi.EnviException, msg:
                 if vw.verbose: vw.vprint("%s: %s" % (msg.__class__.__name__,msg))
             except Exception, msg:
                 traceback.print_exc()
-                continue
 
+            if matched:
+                return va + 1
+
+    return None
@@ -5,12 +5,23 @@ country looking for pointers to interesting things.
 in a previous life, this analysis code lived inside VivWorkspace.analyze()
 This will *actually* make pointers!
 """
+from vivisect.const import *
+
+# Space which is newly undefined may have pointers (see vivisect.incremental)
+reanalyze_events = (VWE_ADDMMAP, VWE_DELLOCATION)
+
 def analyze(vw):
 
     if vw.verbose: vw.vprint('...analyzing pointers.')
 
     # Now, lets find likely free-hanging pointers
-    for addr, pval in vw.findPointers():
+    makePointers(vw, vw.findPointers())
+
+def analyzeRegions(vw, regions):
+    makePointers(vw, vw.findPointers(regions=regions))
+
+def makePointers(vw, pointers):
+    for addr, pval in pointers:
         try:
             vw.followPointer(pval)
             if vw.getLocation(addr) == None:
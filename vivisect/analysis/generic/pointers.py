@@ -5,12 +5,25 @@ country looking for pointers to interesting things.
 
 in a previous life, this analysis code lived inside VivWorkspace.analyze()
 """
+from vivisect.const import *
+
+# Space which is newly undefined may have pointers (see vivisect.incremental)
+reanalyze_events = (VWE_ADDMMAP, VWE_DELLOCATION)
+
 def analyze(vw):
 
     if vw.verbose: vw.vprint('...analyzing pointers.')
 
     # Now, lets find likely free-hanging pointers
-    for addr, pval in vw.findPointers():
+    followPointers(vw, vw.findPointers())
+
+def analyzeRegions(vw, regions):
+    followPointers(vw, vw.findPointers(regions=regions))
+
+def followPointers(vw, pointers):
+    vw.prefetchFunctions([ pval for addr, pval in pointers ], follow=True)
+
+    for addr, pval in pointers:
         if vw.isDeadData(pval):
             continue
         try:
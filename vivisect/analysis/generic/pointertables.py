@@ -20,14 +20,23 @@ def handleArray(vw, plist):
             if ltype not in tlist:
                 tlist.append(ltype)
         
+# Space which is newly undefined may have pointers (see vivisect.incremental)
+reanalyze_events = (VWE_ADDMMAP, VWE_DELLOCATION)
+
 def analyze(vw):
 
     #FIXME this won't do anything on a second pass and it might be good if it did
+    findTables(vw, vw.findPointers())
+
+def analyzeRegions(vw, regions):
+    findTables(vw, vw.findPointers(regions=regions))
+
+def findTables(vw, pointers):
     align = vw.arch.getPointerSize()
     rlen = vw.config.viv.analysis.pointertables.table_min_len
 
     plist = []
-    for va, pval in vw.findPointers():
+    for va, pval in pointers:
 
         if len(plist):
 
@@ -4,9 +4,22 @@ point to valid locations.
 """
 
 import vivisect
+import vivisect.incremental as viv_incremental
+
+from vivisect.const import *
+
+# The targets of new relocations (see vivisect.incremental)
+reanalyze_events = (VWE_ADDRELOC,)
 
 def analyze(vw):
-    for va, rtype in vw.getRelocations():
+    checkRelocations(vw, vw.getRelocations())
+
+def analyzeRegions(vw, regions):
+    relocs = [ (va, rtype) for va, rtype in vw.getRelocations() if viv_incremental.isInRegions(regions, va) ]
+    checkRelocations(vw, relocs)
+
+def checkRelocations(vw, relocs):
+    for va, rtype in relocs:
         if rtype == vivisect.RTYPE_BASERELOC:
             ptr = vw.castPointer(va)
             if vw.isValidPointer(ptr):
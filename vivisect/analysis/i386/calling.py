@@ -16,6 +16,10 @@ import envi
 import envi.archs.i386 as e_i386
 import envi.archs.i386.opcode86 as opcode86
 
+# The emulation is worth farming out to worker processes during
+# parallel analysis ( see vivisect.parallel )
+parallel = True
+
 regcalls = {
     (e_i386.REG_ECX,):               ('thiscall',1),
     (e_i386.REG_EAX,):               ('bfastcall',1),
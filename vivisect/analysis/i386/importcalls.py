@@ -19,7 +19,7 @@ def analyze(vw):
         if loc[L_LTYPE] != LOC_IMPORT:
             continue
 
-        offset,bytes = vw.getByteDef(va)
+        offset,bytes = vw.getPageByteDef(va)
         if offset < 2:
             continue
 
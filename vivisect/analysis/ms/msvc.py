@@ -10,7 +10,7 @@ vs = v_msvc.VisualStudioVamp()
 
 def analyzeFunction(vw, funcva):
 
-    offset, bytes = vw.getByteDef(funcva)
+    offset, bytes = vw.getPageByteDef(funcva)
     sig = vs.getSignature(bytes, offset)
     if sig != None:
         fname = sig.split(".")[-1]
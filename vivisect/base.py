@@ -1,4 +1,5 @@
 import Queue
+import bisect
 import traceback
 import threading
 import collections
@@ -86,6 +87,25 @@ vaset_xlate = {
     str:VASET_STRING,
 }
 
+# Events which do not read locations or xrefs.  During a bulk import,
+# ADDLOCATION/ADDXREF events are deferred across these.
+bulk_passthru = set([
+    VWE_ADDSEGMENT,
+    VWE_ADDRELOC,
+    VWE_ADDFUNCTION,
+    VWE_SETFUNCARGS,
+    VWE_SETFUNCMETA,
+    VWE_ADDCODEBLOCK,
+    VWE_SETNAME,
+    VWE_ADDMMAP,
+    VWE_COMMENT,
+    VWE_ADDCOLOR,
+    VWE_SETVASETROW,
+    VWE_ADDFREF,
+    VWE_SYMHINT,
+    VWE_AUTOANALFIN,
+])
+
 class VivEventDist(VivEventCore):
     '''
     Similar to an event core, but does optimized distribution
@@ -144,13 +164,79 @@ class VivEventDist(VivEventCore):
 def ddict():
     return collections.defaultdict(dict)
 
+class OrderedSet(object):
+    '''
+    An insertion ordered set (of xref or location tuples).  Adds, deletes
+    and membership checks are O(1) and the ordered list is only rebuilt
+    after a delete.  Once the sorted list has been asked for, it is kept
+    up to date ( bisect ) on each add and delete.
+    '''
+    def __init__(self):
+        self._os_seq = {}
+        self._os_next = 0
+        self._os_list = []
+        self._os_dirty = False
+        self._os_sorted = None
+
+    def __contains__(self, item):
+        return item in self._os_seq
+
+    def __len__(self):
+        return len(self._os_seq)
+
+    def __iter__(self):
+        return iter(self.getList())
+
+    def add(self, item):
+        '''
+        Add an item (returns False if it was already present).
+        '''
+        if item in self._os_seq:
+            return False
+
+        self._os_seq[item] = self._os_next
+        self._os_next += 1
+        if self._os_sorted != None:
+            bisect.insort(self._os_sorted, item)
+        if not self._os_dirty:
+            self._os_list.append(item)
+        return True
+
+    def remove(self, item):
+        self._os_seq.pop(item)
+        self._os_dirty = True
+        if self._os_sorted != None:
+            del self._os_sorted[bisect.bisect_left(self._os_sorted, item)]
+
+    def getList(self):
+        '''
+        Return the list of items in the order they were added.
+        '''
+        if self._os_dirty:
+            seq = self._os_seq
+            self._os_list = sorted(seq, key=seq.get)
+            self._os_dirty = False
+        return self._os_list
+
+    def getSorted(self):
+        '''
+        Return the sorted list of items.
+
+        NOTE: the list is updated in place by later adds and deletes.
+        '''
+        if self._os_sorted == None:
+            self._os_sorted = sorted(self._os_seq)
+        return self._os_sorted
+
 class VivWorkspaceCore(object,viv_impapi.ImportApi):
 
     def __init__(self):
         viv_impapi.ImportApi.__init__(self)
-        self.loclist = []
-        self.locmap   = e_page.MapLookup()
-        self.blockmap = e_page.MapLookup()
+        # Locations in the order they were added (and by type)
+        self.locset = OrderedSet()
+        self.locs_by_type = {}
+        self.locmap   = e_page.RangeLookup()
+        self.blockmap = e_page.RangeLookup()
         self._mods_loaded = False
 
         # Storage for function local symbols
@@ -164,6 +250,8 @@ class VivWorkspaceCore(object,viv_impapi.ImportApi):
 
         self._event_list = []
         self._event_saved = 0 # The index of the last "save" event...
+        # (index, callback) for workspace state loaded *without* events
+        self._event_snap = None
 
         # Give ourself a structure namespace!
         self.vsbuilder = vs_builder.VStructBuilder()
@@ -187,10 +275,166 @@ class VivWorkspaceCore(object,viv_impapi.ImportApi):
         '''
         self._event_saved = len(self._event_list)
 
+    def _setEventSnap(self, getevents, replace=False):
+        '''
+        Used by storage modules which load workspace state directly
+        (rather than by replaying events).  getevents() must return
+        the list of events which would re-create the loaded state and
+        is only called if the full event list is exported.
+
+        If replace is True, the state ( saved by the storage module )
+        includes the events so far, so getevents() replaces them.
+        '''
+        idx = len(self._event_list)
+        start = idx
+        if replace:
+            start = 0
+        self._event_snap = (start, idx, getevents)
+
+    def _bulkAddLocations(self, locs, ranges=None):
+        '''
+        Add a list of location tuples straight to the location indexes.
+        ( the equivalent of _handleADDLOCATION for each, but sorted
+        locations are indexed in one pass )
+
+        If the locations overlap, ranges may specify the (va, size, loc)
+        tuples for the location map as they were originally painted.
+        '''
+        if ranges == None:
+            ranges = [ (loc[0], loc[1], loc) for loc in locs ]
+        self.locmap.setMapLookups(ranges)
+
+        noret = self.getMeta('NoReturnApis', {})
+        for loc in locs:
+            self._addLocIndexes(loc)
+            lva, lsize, ltype, linfo = loc
+            if ltype == LOC_IMPORT and noret.get(linfo.lower()):
+                self.cfctx.addNoReturnAddr(lva)
+
+    def _bulkAddXrefs(self, xrefs):
+        '''
+        Add a list of xref tuples straight to the xref indexes.
+        ( the equivalent of _handleADDXREF for each )
+        '''
+        if self._xrefs_stale_to or self._xrefs_stale_from:
+            for xref in xrefs:
+                self._handleADDXREF(xref)
+            return
+
+        xrset = self.xrefs
+        xrefs_by_to = self.xrefs_by_to
+        xrefs_by_from = self.xrefs_by_from
+        for xref in xrefs:
+            if not xrset.add(xref):
+                continue
+
+            fromva, tova, reftype, rflags = xref
+
+            xr_to = xrefs_by_to.get(tova)
+            if xr_to == None:
+                xrefs_by_to[tova] = [xref]
+            else:
+                xr_to.append(xref)
+
+            xr_from = xrefs_by_from.get(fromva)
+            if xr_from == None:
+                xrefs_by_from[fromva] = [xref]
+            else:
+                xr_from.append(xref)
+
+    def _getXrefList(self, xrdict, stale, va):
+        '''
+        Return the list of xrefs from xrdict for va (or None), pruning
+        any deleted xrefs if va is in the stale set.
+        '''
+        xrefs = xrdict.get(va)
+        if va in stale:
+            stale.remove(va)
+            if xrefs != None:
+                xrefs = [ xref for xref in xrefs if xref in self.xrefs ]
+                xrdict[va] = xrefs
+        return xrefs
+
+    def _bulkAddCodeBlocks(self, cbs, ranges=None):
+        '''
+        Add a list of code block tuples straight to the code block indexes.
+        ( the functions must already be initialized, see _bulkAddLocations
+        for ranges )
+        '''
+        if ranges == None:
+            ranges = [ (cb[0], cb[1], cb) for cb in cbs ]
+        self.blockmap.setMapLookups(ranges)
+        for cb in cbs:
+            self.codeblocks_by_funcva.get(cb[CB_FUNCVA]).append(cb)
+        self.codeblocks.extend(cbs)
+
+    def _bulkImportEvents(self, events):
+        '''
+        Apply a list of events straight to the event handlers ( with no
+        server or event channel fan-out ).  ADDLOCATION and ADDXREF events
+        are collected and indexed in batches.
+        '''
+        ehand = self.ehand
+        elist = self._event_list
+        locs = []
+        xrefs = []
+        for event, einfo in events:
+
+            if event == VWE_ADDLOCATION:
+                locs.append(einfo)
+                elist.append((event, einfo))
+                continue
+
+            if event == VWE_ADDXREF:
+                xrefs.append(einfo)
+                elist.append((event, einfo))
+                continue
+
+            if event not in bulk_passthru and (locs or xrefs):
+                self._bulkFlush(locs, xrefs)
+                locs = []
+                xrefs = []
+
+            try:
+                ehand[event](einfo)
+                elist.append((event, einfo))
+            except Exception, e:
+                traceback.print_exc()
+
+        self._bulkFlush(locs, xrefs)
+
+    def _bulkFlush(self, locs, xrefs):
+        bulks = (
+            (locs, self._bulkAddLocations, self._handleADDLOCATION),
+            (xrefs, self._bulkAddXrefs, self._handleADDXREF),
+        )
+        for einfos, bulkfunc, handler in bulks:
+            if not einfos:
+                continue
+
+            try:
+                bulkfunc(einfos)
+            except Exception, e:
+                # Something is amiss in the batch, go one at a time...
+                for einfo in einfos:
+                    try:
+                        handler(einfo)
+                    except Exception, e:
+                        traceback.print_exc()
+
+    def _addLocIndexes(self, loc):
+        self.locset.add(loc)
+        ltype = loc[L_LTYPE]
+        locs = self.locs_by_type.get(ltype)
+        if locs == None:
+            locs = OrderedSet()
+            self.locs_by_type[ltype] = locs
+        locs.add(loc)
+
     def _handleADDLOCATION(self, loc):
         lva, lsize, ltype, linfo = loc
         self.locmap.setMapLookup(lva, lsize, loc)
-        self.loclist.append(loc)
+        self._addLocIndexes(loc)
 
         # A few special handling cases...
         if ltype == LOC_IMPORT:
@@ -202,7 +446,9 @@ class VivWorkspaceCore(object,viv_impapi.ImportApi):
         # FIXME delete xrefs
         lva, lsize, ltype, linfo = loc
         self.locmap.setMapLookup(lva, lsize, None)
-        self.loclist.remove(loc)
+        self.locset.remove(loc)
+        self.locs_by_type[ltype].remove(loc)
+        self.opcache.invalidate(lva, lsize, memory=False)
 
     def _handleADDSEGMENT(self, einfo):
         self.segments.append(einfo)
@@ -275,8 +521,12 @@ class VivWorkspaceCore(object,viv_impapi.ImportApi):
 
     def _handleADDXREF(self, einfo):
         fromva, tova, reftype, rflags = einfo
-        xr_to = self.xrefs_by_to.get(tova, None)
-        xr_from = self.xrefs_by_from.get(fromva, None)
+        if einfo in self.xrefs:
+            return
+
+        # Prune any deleted xrefs first (it may have been this one)
+        xr_to = self._getXrefList(self.xrefs_by_to, self._xrefs_stale_to, tova)
+        xr_from = self._getXrefList(self.xrefs_by_from, self._xrefs_stale_from, fromva)
         if xr_to == None:
             xr_to = []
             self.xrefs_by_to[tova] = xr_to
@@ -285,15 +535,16 @@ class VivWorkspaceCore(object,viv_impapi.ImportApi):
             xr_from = []
             self.xrefs_by_from[fromva] = xr_from
 
-        if einfo not in xr_to: # Just check one for now
-            xr_to.append(einfo)
-            xr_from.append(einfo)
-            self.xrefs.append(einfo)
+        xr_to.append(einfo)
+        xr_from.append(einfo)
+        self.xrefs.add(einfo)
 
     def _handleDELXREF(self, einfo):
         fromva, tova, reftype, refflags = einfo
-        self.xrefs_by_to[tova].remove(einfo)
-        self.xrefs_by_from[fromva].remove(einfo)
+        # The by_to/by_from lists are pruned on their next use
+        self.xrefs.remove(einfo)
+        self._xrefs_stale_to.add(tova)
+        self._xrefs_stale_from.add(fromva)
 
     def _handleSETNAME(self, einfo):
         va,name = einfo
@@ -319,6 +570,7 @@ class VivWorkspaceCore(object,viv_impapi.ImportApi):
         blen = len(mbytes)
         self.locmap.initMapLookup(va, blen)
         self.blockmap.initMapLookup(va, blen)
+        self.opcache.invalidate(va, blen)
 
         # On loading a new memory map, we need to crush a few
         # transmeta items...
@@ -542,6 +794,8 @@ class VivWorkspaceCore(object,viv_impapi.ImportApi):
 
         archid = envi.getArchByName(value)
         self.setMemArchitecture(archid)
+        self._arch_idx = archid >> 16
+        self.opcache.clear()
 
         # Default calling convention for architecture
         # This will be superceded by Platform and Parser settings
@@ -624,6 +878,9 @@ class VivCodeFlowContext(e_codeflow.CodeFlowContext):
         vw.setVaSetRow('NoReturnCalls', (lva,))
 
     # NOTE: self._mem is the viv workspace...
+    def _parseOpcode(self, va, arch):
+        return self._mem._parseOpcode(va, arch=arch)
+
     def _cb_opcode(self, va, op, branches):
 
         loc = self._mem.getLocation(va)
@@ -655,15 +912,7 @@ class VivCodeFlowContext(e_codeflow.CodeFlowContext):
         vw._fireEvent(VWE_ADDFUNCTION, (fva,fmeta))
 
         # Go through the function analysis modules in order
-        for fmname in vw.fmodlist:
-            fmod = vw.fmods.get(fmname)
-            try:
-                fmod.analyzeFunction(vw, fva)
-            except Exception, e:
-                if vw.verbose:
-                    traceback.print_exc()
-                vw.verbprint("Function Analysis Exception for 0x%x   %s: %s" % (fva, fmod.__name__, e))
-                vw.setFunctionMeta(fva, "%s fail" % fmod.__name__, traceback.format_exc())
+        vw.analyzeFunction(fva)
 
         fname = vw.getName( fva )
         if vw.getMeta('NoReturnApis').get( fname.lower() ):
@@ -0,0 +1,377 @@
+'''
+Batch ( corpus ) analysis.
+
+Load, analyze and save every sample in the given directories ( and files,
+or @<filelist> files with one path per line ) using a pool of worker
+processes.  Workers are started with the parsers and analysis modules
+already imported and are reused from one sample to the next.  A sample
+which runs longer than the timeout, or whose worker grows beyond the
+RSS limit, has its worker killed ( and replaced ).
+
+Each sample gets one line in the ( JSON lines ) manifest:
+
+    {"filename": "...", "status": "ok", "time": 1.2, "functions": 88,
+     "coverage": 0.93, ...}
+
+where status is one of ok, error, timeout, memory or crash.
+
+Usage: python -m vivisect.batch [options] <dir|file|@filelist> ...
+'''
+import os
+import sys
+import json
+import time
+import pkgutil
+import optparse
+import resource
+import traceback
+import multiprocessing
+
+import envi.benchmarks as e_bench
+import vivisect
+import vivisect.analysis as viv_analysis
+
+# The modules every worker imports before its first sample
+preload_modules = (
+    'vivisect.parsers.pe',
+    'vivisect.parsers.elf',
+    'vivisect.parsers.macho',
+    'vivisect.parsers.blob',
+    'vivisect.parsers.ihex',
+    'vivisect.storage.basicfile',
+)
+
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+STATUS_TIMEOUT = 'timeout'
+STATUS_MEMORY = 'memory'
+STATUS_CRASH = 'crash'
+
+def getSamples(paths):
+    '''
+    Return the sorted list of sample files from the given directories
+    ( walked recursively ), files and @<filelist> files.
+    '''
+    ret = set()
+    for path in paths:
+        if path.startswith('@'):
+            with open(path[1:], 'rb') as f:
+                ret.update([ line.strip() for line in f if line.strip() ])
+
+        elif os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                for fname in filenames:
+                    # Don't analyze our own saved workspaces
+                    if fname.endswith('.viv'):
+                        continue
+                    ret.add(os.path.join(dirpath, fname))
+
+        else:
+            ret.add(path)
+
+    return sorted(ret)
+
+def preload():
+    '''
+    Import the parsers and the analysis modules ( so each sample does
+    not pay for them ).
+    '''
+    for modname in preload_modules:
+        __import__(modname)
+
+    prefix = viv_analysis.__name__ + '.'
+    for imp, modname, ispkg in pkgutil.walk_packages(viv_analysis.__path__, prefix):
+        try:
+            __import__(modname)
+        except Exception, e:
+            pass
+
+def getStorageName(filename, outdir=None):
+    '''
+    Return where the workspace for the sample is saved.
+    '''
+    if outdir == None:
+        return filename + '.viv'
+    return os.path.join(outdir, os.path.basename(filename) + '.viv')
+
+def analyzeSample(filename, outdir=None, save=True):
+    '''
+    Load, analyze and ( optionally ) save the sample and return the dict
+    of results for the manifest.
+    '''
+    ret = {'filename':filename, 'status':STATUS_OK}
+    start = time.time()
+    try:
+        vw = vivisect.VivWorkspace()
+        vw.setMeta('StorageName', getStorageName(filename, outdir))
+
+        ret['load_time'], x = e_bench.timeit(vw.loadFromFile, filename)
+        ret['format'] = vw.getMeta('Format')
+        ret['arch'] = vw.getMeta('Architecture')
+
+        ret['analysis_time'], x = e_bench.timeit(vw.analyze)
+
+        if save:
+            ret['save_time'], x = e_bench.timeit(vw.saveWorkspace)
+            ret['workspace'] = vw.getMeta('StorageName')
+
+        disc, undisc = vw.getDiscoveredInfo()
+        coverage = 0.0
+        if disc + undisc:
+            coverage = float(disc) / (disc + undisc)
+
+        ret['functions'] = len(vw.getFunctions())
+        ret['discovered'] = disc
+        ret['undiscovered'] = undisc
+        ret['coverage'] = coverage
+
+    except Exception, e:
+        ret['status'] = STATUS_ERROR
+        ret['error'] = '%s: %s' % (e.__class__.__name__, e)
+        ret['traceback'] = traceback.format_exc()
+
+    ret['time'] = time.time() - start
+    return ret
+
+def _workerMain(conn, outdir, save):
+    # The parent does the talking
+    sys.stdout = open(os.devnull, 'w')
+    preload()
+
+    while True:
+        filename = conn.recv()
+        if filename == None:
+            break
+
+        ret = analyzeSample(filename, outdir=outdir, save=save)
+        ret['rss'] = e_bench.getRss()
+        conn.send(ret)
+
+def getProcessRss(pid):
+    '''
+    Return the resident set size (in bytes) of the process ( or None where
+    there is no /proc ).
+    '''
+    try:
+        with open('/proc/%d/statm' % pid, 'rb') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, OSError, ValueError):
+        return None
+
+class BatchWorker:
+    '''
+    A ( warm ) worker process which analyzes one sample at a time.
+    '''
+    def __init__(self, outdir=None, save=True):
+        self.conn, child = multiprocessing.Pipe()
+        self.proc = multiprocessing.Process(target=_workerMain, args=(child, outdir, save))
+        self.proc.daemon = True
+        self.proc.start()
+        child.close()
+
+        self.filename = None
+        self.started = None
+        self.samples = 0
+        self.closed = False
+
+    def submit(self, filename):
+        self.filename = filename
+        self.started = time.time()
+        self.samples += 1
+        self.conn.send(filename)
+
+    def poll(self, timeout=0):
+        '''
+        Return the results for the current sample ( or None if it is not
+        done yet ).
+        '''
+        try:
+            if not self.conn.poll(timeout):
+                if self.proc.is_alive():
+                    return None
+                # It may have finished just before it exited
+                if not self.conn.poll():
+                    return self._failed(STATUS_CRASH, 'exit code %s' % self.proc.exitcode)
+            ret = self.conn.recv()
+        except (EOFError, IOError), e:
+            return self._failed(STATUS_CRASH, 'worker died')
+
+        self.filename = None
+        return ret
+
+    def _failed(self, status, error):
+        ret = {
+            'filename':self.filename,
+            'status':status,
+            'error':error,
+            'time':time.time() - self.started,
+        }
+        self.filename = None
+        return ret
+
+    def kill(self, status=STATUS_CRASH, error=None):
+        '''
+        Kill the worker and return the failure for the current sample
+        ( if any ).
+        '''
+        ret = None
+        if self.filename != None:
+            ret = self._failed(status, error)
+
+        if not self.closed:
+            self.closed = True
+            self.proc.terminate()
+            self.proc.join()
+            self.conn.close()
+        return ret
+
+    def wait(self, timeout):
+        '''
+        Wait ( up to timeout seconds ) for the worker to have something
+        to say.
+        '''
+        self.conn.poll(timeout)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.conn.send(None)
+        except (IOError, ValueError), e:
+            pass
+        self.proc.join(5)
+        if self.proc.is_alive():
+            self.proc.terminate()
+            self.proc.join()
+        self.conn.close()
+
+class BatchAnalyzer:
+    '''
+    Analyze samples using a pool of worker processes.
+
+    Example:
+        batch = BatchAnalyzer(workers=4, timeout=600, maxrss=2<<30)
+        for ret in batch.run(getSamples(['samples/'])):
+            print ret['filename'], ret['status']
+    '''
+    def __init__(self, workers=1, timeout=None, maxrss=None, maxtasks=None, outdir=None, save=True):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.maxrss = maxrss
+        self.maxtasks = maxtasks
+        self.outdir = outdir
+        self.save = save
+
+    def _checkWorker(self, worker):
+        # Return the ( possibly failed ) result or None if still busy
+        ret = worker.poll()
+        if ret != None:
+            return ret
+
+        if self.timeout != None and time.time() - worker.started > self.timeout:
+            return worker.kill(STATUS_TIMEOUT, 'timeout after %d sec' % self.timeout)
+
+        if self.maxrss != None:
+            rss = getProcessRss(worker.proc.pid)
+            if rss != None and rss > self.maxrss:
+                return worker.kill(STATUS_MEMORY, 'rss %d > %d' % (rss, self.maxrss))
+
+    def run(self, samples):
+        '''
+        Analyze the samples, yielding the results for each as it completes.
+        '''
+        # Fork the workers from an already warm parent
+        preload()
+
+        todo = list(samples)
+        todo.reverse()
+        idle = []
+        busy = []
+        try:
+            while todo or busy:
+                while todo and len(idle) + len(busy) < self.workers:
+                    idle.append(BatchWorker(outdir=self.outdir, save=self.save))
+
+                while todo and idle:
+                    worker = idle.pop()
+                    worker.submit(todo.pop())
+                    busy.append(worker)
+
+                # Wait a bit on the oldest one
+                busy[0].wait(0.05)
+                for worker in list(busy):
+                    ret = self._checkWorker(worker)
+                    if ret == None:
+                        continue
+
+                    busy.remove(worker)
+                    if not worker.proc.is_alive():
+                        worker.kill()
+                    elif self.maxtasks != None and worker.samples >= self.maxtasks:
+                        worker.close()
+                    elif self.maxrss != None and ret.get('rss', 0) > self.maxrss:
+                        worker.close()
+                    else:
+                        idle.append(worker)
+                    yield ret
+
+        finally:
+            for worker in busy:
+                worker.kill()
+            for worker in idle:
+                worker.close()
+
+def runBatch(samples, manifest, **kwargs):
+    '''
+    Analyze the samples ( see BatchAnalyzer for the options ) and write
+    the results to the given JSON lines manifest file.  Returns a dict of
+    the totals.
+    '''
+    totals = {'samples':0, 'functions':0}
+    batch = BatchAnalyzer(**kwargs)
+    start = time.time()
+    with open(manifest, 'wb') as f:
+        for ret in batch.run(samples):
+            ret.pop('traceback', None)
+            f.write(json.dumps(ret, sort_keys=True) + '\n')
+            f.flush()
+
+            totals['samples'] += 1
+            totals['functions'] += ret.get('functions', 0)
+            totals[ret['status']] = totals.get(ret['status'], 0) + 1
+
+    totals['time'] = time.time() - start
+    totals['samples_per_sec'] = e_bench.rate(totals['samples'], totals['time'])
+    return totals
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] <dir|file|@filelist> ...')
+    parser.add_option('-j', dest='workers', default=multiprocessing.cpu_count(), type='int', help='worker processes')
+    parser.add_option('-t', dest='timeout', default=None, type='int', help='per sample timeout (sec)')
+    parser.add_option('-r', dest='maxrss', default=None, type='int', help='per worker RSS limit (MB)')
+    parser.add_option('-n', dest='maxtasks', default=None, type='int', help='restart workers after this many samples')
+    parser.add_option('-d', dest='outdir', default=None, help='save the workspaces here ( not beside the samples )')
+    parser.add_option('-N', dest='save', default=True, action='store_false', help='do not save the workspaces')
+    parser.add_option('-o', dest='manifest', default='manifest.jsonl', help='JSON lines manifest file')
+    opts, args = parser.parse_args(argv)
+    if not args:
+        parser.error('samples are required')
+
+    maxrss = None
+    if opts.maxrss != None:
+        maxrss = opts.maxrss << 20
+
+    if opts.outdir != None and not os.path.isdir(opts.outdir):
+        os.makedirs(opts.outdir)
+
+    samples = getSamples(args)
+    totals = runBatch(samples, opts.manifest, workers=opts.workers, timeout=opts.timeout,
+                      maxrss=maxrss, maxtasks=opts.maxtasks, outdir=opts.outdir, save=opts.save)
+
+    e_bench.printResults('Batch: %d samples' % len(samples), sorted(totals.items()))
+    if totals.get(STATUS_OK, 0) != totals['samples']:
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
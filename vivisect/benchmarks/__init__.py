@@ -0,0 +1,21 @@
+'''
+Workspace level benchmarks.  ( see envi.benchmarks for the helpers )
+
+Each module has a main() and may be run directly:
+
+    python -m vivisect.benchmarks.locmap <binary>
+'''
+import vivisect
+
+def loadWorkspace(filename, analyze=False):
+    '''
+    Load a binary (or a .viv workspace) into a new VivWorkspace.
+    '''
+    vw = vivisect.VivWorkspace()
+    if filename.endswith('.viv'):
+        vw.loadWorkspace(filename)
+    else:
+        vw.loadFromFile(filename)
+        if analyze:
+            vw.analyze()
+    return vw
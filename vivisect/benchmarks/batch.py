@@ -0,0 +1,134 @@
+'''
+Measure the batch analysis throughput ( see vivisect.batch ) over a
+corpus of synthetic ELF and PE samples for each of the given worker
+counts.
+
+Usage: python -m vivisect.benchmarks.batch [-n 16] [-f 200] [-j 1,2] [-o <results.json>]
+'''
+import sys
+import shutil
+import struct
+import os.path
+import optparse
+import tempfile
+
+import envi.benchmarks as e_bench
+import vivisect.batch as viv_batch
+
+def getFuncsCode(count):
+    '''
+    Return the ( code, entry offset ) for count i386 functions and an
+    entry point which calls each of them in turn.
+    '''
+    code = ''
+    funcs = []
+    for i in xrange(count):
+        funcs.append(len(code))
+        # push ebp; mov ebp,esp; mov eax,[ebp+8]; add eax,<i>;
+        # mov esp,ebp; pop ebp; ret 4
+        code += '\x55\x89\xe5\x8b\x45\x08\x05' + struct.pack('<I', i) + '\x89\xec\x5d\xc2\x04\x00'
+
+    # NOTE: The functions do not call each other ( a deep call chain
+    # runs the recursive code flow into the recursion limit )
+    entry = len(code)
+    for fva in funcs:
+        # push <arg>; call <fva>
+        code += '\x68' + struct.pack('<I', len(code)) + '\xe8' + struct.pack('<i', fva - (len(code) + 10))
+    return code + '\xc3', entry
+
+def buildElf(code, entry, baseva=0x08048000):
+    '''
+    Return an ELF32 i386 executable ( one PT_LOAD of the whole file )
+    with the code in .text and the entry point at the given offset.
+    '''
+    shstrtab = '\x00.text\x00.shstrtab\x00'
+    phoff = 52
+    textoff = phoff + 32
+    stroff = textoff + len(code)
+    shoff = (stroff + len(shstrtab) + 3) & ~3
+    filesize = shoff + 3 * 40
+    entry += baseva + textoff
+
+    ehdr = struct.pack('<16sHHIIIIIHHHHHH', '\x7fELF\x01\x01\x01'.ljust(16, '\x00'),
+                       2, 3, 1, entry, phoff, shoff, 0, 52, 32, 1, 40, 3, 2)
+    phdr = struct.pack('<IIIIIIII', 1, 0, baseva, baseva, filesize, filesize, 5, 0x1000)
+    shdrs = '\x00' * 40
+    shdrs += struct.pack('<IIIIIIIIII', 1, 1, 6, baseva + textoff, textoff, len(code), 0, 0, 16, 0)
+    shdrs += struct.pack('<IIIIIIIIII', 7, 3, 0, 0, stroff, len(shstrtab), 0, 0, 1, 0)
+    return (ehdr + phdr + code + shstrtab).ljust(shoff, '\x00') + shdrs
+
+def buildPe(code, entry, baseva=0x400000):
+    '''
+    Return a PE32 i386 executable with the code in its one ( .text )
+    section and the entry point at the given offset.
+    '''
+    peoff = 0x40
+    textrva = 0x1000
+    textoff = 0x200
+    rawsize = (len(code) + 0x1ff) & ~0x1ff
+    imagesize = textrva + ((rawsize + 0xfff) & ~0xfff)
+    entry += textrva
+
+    dos = 'MZ'.ljust(0x3c, '\x00') + struct.pack('<I', peoff)
+    coff = struct.pack('<HHIIIHH', 0x14c, 1, 0, 0, 0, 0xe0, 0x0102)
+    opt = struct.pack('<HBBIIIIIIIIIHHHHHHIIIIHHIIIIII',
+                      0x10b, 0, 0, rawsize, 0, 0, entry, textrva, 0, baseva,
+                      0x1000, 0x200, 4, 0, 0, 0, 4, 0, 0, imagesize, textoff, 0,
+                      3, 0, 0x100000, 0x1000, 0x100000, 0x1000, 0, 16)
+    opt += '\x00' * (16 * 8)
+    sec = struct.pack('<8sIIIIIIHHI', '.text', len(code), textrva, rawsize, textoff, 0, 0, 0, 0, 0x60000020)
+    hdrs = dos.ljust(peoff, '\x00') + 'PE\x00\x00' + coff + opt + sec
+    return hdrs.ljust(textoff, '\x00') + code.ljust(rawsize, '\x00')
+
+def makeCorpus(dirname, count, funcs=100):
+    '''
+    Write count synthetic samples ( alternating ELF and PE, each with
+    funcs functions ) to the directory and return their file names.
+    '''
+    ret = []
+    code, entry = getFuncsCode(funcs)
+    for i in xrange(count):
+        if i % 2:
+            filename = os.path.join(dirname, 'sample%.4d.exe' % i)
+            sbytes = buildPe(code, entry)
+        else:
+            filename = os.path.join(dirname, 'sample%.4d.elf' % i)
+            sbytes = buildElf(code, entry)
+
+        with open(filename, 'wb') as f:
+            f.write(sbytes)
+        ret.append(filename)
+    return ret
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-n', dest='samples', default=16, type='int', help='number of samples')
+    parser.add_option('-f', dest='funcs', default=200, type='int', help='functions per sample')
+    parser.add_option('-j', dest='workers', default='1,2', help='comma separated worker counts')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    opts, args = parser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        samples = makeCorpus(tmpdir, opts.samples, funcs=opts.funcs)
+        manifest = os.path.join(tmpdir, 'manifest.jsonl')
+
+        rows = []
+        results = {'samples':opts.samples, 'funcs':opts.funcs, 'runs':[]}
+        for workers in [ int(w) for w in opts.workers.split(',') ]:
+            totals = viv_batch.runBatch(samples, manifest, workers=workers, save=False)
+            totals['workers'] = workers
+            results['runs'].append(totals)
+            rows.append(('%d workers (sec)' % workers, totals['time']))
+            rows.append(('%d workers (samples/sec)' % workers, totals['samples_per_sec']))
+            rows.append(('%d workers ok' % workers, totals.get(viv_batch.STATUS_OK, 0)))
+
+    finally:
+        shutil.rmtree(tmpdir)
+
+    e_bench.printResults('Batch: %d samples' % opts.samples, rows)
+    if opts.output:
+        e_bench.saveResults(opts.output, results)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,186 @@
+'''
+Measure the ARM ( and thumb ) linear sweep disassembly throughput over a
+firmware blob loaded with the blob parser ( vivisect.parsers.blob ).
+For each arch, report the instructions/sec, a digest of the disassembly
+( to compare between commits ) and the number of instruction words for
+which the direct-indexed encoding classifiers ( ienc_table and the thumb
+index tables ) disagree with the table scan / tree walk they replace.
+
+Without a blob, a synthetic one ( random words ) of -s bytes is used.
+
+Usage: python -m vivisect.benchmarks.blob [-a arm,thumb16] [-b 0x20200000] [-s <bytes>] [-n 3] [-o <results.json>] [<blob>]
+'''
+import os
+import sys
+import struct
+import hashlib
+import optparse
+import tempfile
+
+import envi
+import envi.benchmarks as e_bench
+import envi.benchmarks.disasm as e_b_disasm
+import envi.archs.arm.disasm as e_arm_disasm
+import vivisect
+
+# The instruction alignment for each arch
+aligns = {
+    'arm':4,
+    'thumb16':2,
+    'thumb2':2,
+}
+
+def loadBlob(filename, archname, baseaddr):
+    '''
+    Load the blob into a new VivWorkspace ( without analysis ).
+    '''
+    vw = vivisect.VivWorkspace()
+    blobcfg = vw.config.viv.parsers.blob
+    # Do not save the options to the user's viv.json
+    blobcfg.autosave = False
+    blobcfg['arch'] = archname
+    blobcfg['baseaddr'] = baseaddr
+    vw.loadFromFile(filename, fmtname='blob')
+    return vw
+
+def getBlobCode(vw):
+    '''
+    Return the [ (va, bytes), ... ] for the workspace memory maps.
+    '''
+    return [ (va, vw.readMemory(va, size)) for va, size, perms, fname in vw.getMemoryMaps() ]
+
+def sweep(archmod, chunks, align):
+    '''
+    Disassemble each chunk front to back ( skipping an aligned unit on
+    each decode error ) and return the ( instructions, errors ) tuple.
+    '''
+    count = 0
+    errors = 0
+    for va, bytez in chunks:
+        offset = 0
+        size = len(bytez) - align + 1
+        while offset < size:
+            try:
+                op = archmod.archParseOpcode(bytez, offset, va + offset)
+                offset += op.size
+                count += 1
+            except Exception, e:
+                offset += align
+                errors += 1
+    return count, errors
+
+def getDigest(archmod, chunks, align):
+    '''
+    Return a digest of the sweep ( each instruction's repr and iflags ).
+    '''
+    md5 = hashlib.md5()
+    for va, bytez in chunks:
+        offset = 0
+        size = len(bytez) - align + 1
+        while offset < size:
+            try:
+                op = archmod.archParseOpcode(bytez, offset, va + offset)
+                md5.update('%d %d %s\n' % (offset, op.iflags, repr(op)))
+                offset += op.size
+            except Exception, e:
+                md5.update('%d error\n' % offset)
+                offset += align
+    return md5.hexdigest()
+
+def classifierMismatches(archmod, chunks, align):
+    '''
+    Return the number of instruction words ( halfwords for thumb ) the
+    direct-indexed classifier and the table scan disagree on.
+    '''
+    bad = 0
+    if align == 4:
+        for va, bytez in chunks:
+            for opval in struct.unpack('<%dI' % (len(bytez) / 4), bytez[:len(bytez) & ~3]):
+                if opval >> 28 == e_arm_disasm.COND_EXTENDED:
+                    continue
+                idx = ((opval >> 16) & 0xff0) | ((opval >> 4) & 0xf)
+                if e_arm_disasm.ienc_table[idx] != e_arm_disasm.scanEncoding(opval):
+                    bad += 1
+        return bad
+
+    dis = archmod._arch_dis
+    for va, bytez in chunks:
+        for val in struct.unpack('<%dH' % (len(bytez) / 2), bytez[:len(bytez) & ~1]):
+            try:
+                ninfo = dis._tree.getInt(val, 16)
+            except TypeError:
+                ninfo = None
+            if dis._table[val >> 8][val & 0xff] is not ninfo:
+                bad += 1
+    return bad
+
+def measure(archname, name, chunks, repeat=1):
+    '''
+    Sweep the chunks ( keeping the best of repeat runs ) and return the
+    dict of results.
+    '''
+    archmod = envi.getArchModule(archname)
+    align = aligns.get(archname, 1)
+    elapsed, (count, errors) = e_b_disasm.best(repeat, sweep, archmod, chunks, align)
+    return {
+        'arch':archname,
+        'name':name,
+        'bytes':sum([ len(bytez) for va, bytez in chunks ]),
+        'instructions':count,
+        'errors':errors,
+        'time':elapsed,
+        'insns_sec':e_bench.rate(count, elapsed),
+        'digest':getDigest(archmod, chunks, align),
+        'mismatches':classifierMismatches(archmod, chunks, align),
+    }
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] [<blob>]')
+    parser.add_option('-a', dest='archs', default='arm,thumb16', help='comma separated arch names')
+    parser.add_option('-b', dest='baseaddr', default='0x20200000', help='blob base address')
+    parser.add_option('-s', dest='size', default=0x40000, type='int', help='synthetic blob size ( without a blob )')
+    parser.add_option('-n', dest='repeat', default=3, type='int', help='runs per measurement ( best is kept )')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    opts, args = parser.parse_args(argv)
+    if len(args) > 1:
+        parser.error('only one blob at a time')
+
+    baseaddr = int(opts.baseaddr, 0)
+
+    tmpname = None
+    if args:
+        filename = args[0]
+    else:
+        fd, tmpname = tempfile.mkstemp(suffix='.bin')
+        os.write(fd, e_b_disasm.getRandomCode(opts.size)[0][1])
+        os.close(fd)
+        filename = tmpname
+
+    name = 'synthetic'
+    if args:
+        name = os.path.basename(args[0])
+
+    try:
+        results = []
+        for archname in opts.archs.split(','):
+            vw = loadBlob(filename, archname, baseaddr)
+            results.append(measure(archname, name, getBlobCode(vw), repeat=opts.repeat))
+    finally:
+        if tmpname != None:
+            os.unlink(tmpname)
+
+    rows = []
+    for res in results:
+        name = '%s %s' % (res['arch'], res['name'])
+        rows.append(('%s instructions' % name, res['instructions']))
+        rows.append(('%s errors' % name, res['errors']))
+        rows.append(('%s (insns/sec)' % name, res['insns_sec']))
+        rows.append(('%s digest' % name, res['digest']))
+        rows.append(('%s classifier mismatches' % name, res['mismatches']))
+
+    e_bench.printResults('Blob disassembly ( linear sweep )', rows)
+    if opts.output:
+        e_bench.saveResults(opts.output, {'blob':results})
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,141 @@
+'''
+The emulator benchmark suite.
+
+Emulate every function in a workspace with WorkspaceEmulator.runFunction()
+( without a monitor, and with an AnalysisMonitor which hooks each
+instruction ) and report the instructions/sec, the objects left for the
+cyclic GC per instruction and a digest of the emulated paths ( to compare
+between commits ).
+
+Without any binaries, the bundled test binaries are used and the
+envi.benchmarks.emulator instruction streams are run as well.
+
+Usage: python -m vivisect.benchmarks.emulator [-n <max>] [-s <count>] [-o <results.json>] [<binary|.viv> ...]
+'''
+import gc
+import os
+import sys
+import hashlib
+import optparse
+
+import envi.benchmarks as e_bench
+import envi.benchmarks.emulator as e_b_emulator
+import vivisect.benchmarks as v_bench
+import vivisect.impemu.monitor as viv_monitor
+import visgraph.pathcore as vg_path
+
+def getPathValists(emu):
+    '''
+    Return the list of emulated instruction addresses for each of the
+    code path nodes ( depth first ).
+    '''
+    ret = []
+    todo = [emu.path]
+    while todo:
+        node = todo.pop()
+        ret.append(vg_path.getNodeProp(node, 'valist'))
+        todo.extend(reversed(vg_path.getNodeKids(node)))
+    return ret
+
+def emulate(vw, fvas, monitor=False):
+    '''
+    Emulate each function and return the ( instruction count, digest ).
+    '''
+    count = 0
+    md5 = hashlib.md5()
+    pool = vw.getEmulatorPool()
+    for fva in fvas:
+        emu = pool.getEmulator()
+        try:
+            if monitor:
+                emu.setEmulationMonitor(viv_monitor.AnalysisMonitor(vw, fva))
+            try:
+                emu.runFunction(fva, maxhit=1)
+            except Exception, e:
+                pass
+
+            valists = getPathValists(emu)
+            count += sum([ len(valist) for valist in valists ])
+            md5.update(repr((fva, valists, emu.getRegisterSnap())))
+        finally:
+            pool.putEmulator(emu)
+
+    return count, md5.hexdigest()
+
+def getBundledBinaries():
+    '''
+    Return the test binaries which ship with vivisect.
+    '''
+    import vtrace.platforms
+    dirname = os.path.join(os.path.dirname(vtrace.platforms.__file__), 'windll')
+    return [ os.path.join(dirname, arch, 'symsrv.dll') for arch in ('i386', 'amd64') ]
+
+def measure(vw, fvas, monitor=False):
+    '''
+    Emulate the functions and return the dict of results.
+    '''
+    gc.collect()
+    objcount = len(gc.get_objects())
+    elapsed, (count, digest) = e_bench.timeit(emulate, vw, fvas, monitor=monitor)
+    objects = len(gc.get_objects()) - objcount
+    return {
+        'time':elapsed,
+        'instructions':count,
+        'insns_sec':e_bench.rate(count, elapsed),
+        'objects_per_insn':float(objects) / max(count, 1),
+        'peakrss':e_bench.getPeakRss(),
+        'digest':digest,
+    }
+
+def runFunctions(filename, maxfuncs=None):
+    '''
+    Load ( and analyze ) the binary and return the results for emulating
+    its functions without and with a monitor.
+    '''
+    vw = v_bench.loadWorkspace(filename, analyze=True)
+    fvas = sorted(vw.getFunctions())
+    if maxfuncs != None:
+        fvas = fvas[:maxfuncs]
+
+    # Warm up the emulator pool and the opcode caches
+    emulate(vw, fvas)
+
+    return {
+        'arch':vw.getMeta('Architecture'),
+        'functions':len(fvas),
+        'nomon':measure(vw, fvas),
+        'monitor':measure(vw, fvas, monitor=True),
+    }
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] [<binary|.viv> ...]')
+    parser.add_option('-n', dest='maxfuncs', default=None, type='int', help='only emulate the first n functions')
+    parser.add_option('-s', dest='streams', default=20000, type='int', help='instructions per stream workload ( 0 to skip )')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    opts, args = parser.parse_args(argv)
+
+    results = {'functions':{}}
+    if not args:
+        args = getBundledBinaries()
+        if opts.streams:
+            results['streams'] = e_b_emulator.runSuite(sorted(e_b_emulator.workloads.keys()), opts.streams)
+            e_bench.printResults('Emulator instruction streams', e_b_emulator.getResultRows(results['streams']))
+
+    for filename in args:
+        res = runFunctions(filename, maxfuncs=opts.maxfuncs)
+        results['functions'][filename] = res
+
+        rows = [('functions', res['functions'])]
+        for name in ('nomon', 'monitor'):
+            rows.append(('%s instructions' % name, res[name]['instructions']))
+            rows.append(('%s (insns/sec)' % name, res[name]['insns_sec']))
+            rows.append(('%s (objects/insn)' % name, res[name]['objects_per_insn']))
+            rows.append(('%s digest' % name, res[name]['digest']))
+        rows.append(('peak rss', e_bench.getPeakRss()))
+        e_bench.printResults('Emulator %s: %s' % (res['arch'], filename), rows)
+
+    if opts.output:
+        e_bench.saveResults(opts.output, results)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
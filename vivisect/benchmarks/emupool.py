@@ -0,0 +1,87 @@
+'''
+Emulate every emucode style candidate ( undefined names, pointers, and
+pointer xref targets in executable memory ) with a new emulator for each
+candidate and with the workspace emulator pool, and report candidates/sec.
+
+Usage: python -m vivisect.benchmarks.emupool [-n <max>] [-o <results.json>] <binary|.viv>
+'''
+import sys
+import optparse
+
+import envi.benchmarks as e_bench
+import vivisect.benchmarks as v_bench
+import vivisect.analysis.generic.emucode as v_emucode
+
+from vivisect.const import *
+
+def getCandidates(vw):
+    vatodo = [ va for va, name in vw.getNames() ]
+    vatodo.extend([ va for addr, va in vw.findPointers() ])
+    vatodo.extend([ tova for fromva, tova, rtype, rflags in vw.getXrefs(rtype=REF_PTR) ])
+    return sorted([ va for va in set(vatodo) if vw.isExecutable(va) ])
+
+def emulate(vw, emu, va):
+    wat = v_emucode.watcher(vw, va)
+    emu.setEmulationMonitor(wat)
+    try:
+        emu.runFunction(va, maxhit=1)
+    except Exception, e:
+        pass
+    return (wat.looksgood(), wat.iscode(), wat.insn_count)
+
+def runFresh(vw, vas):
+    return [ emulate(vw, vw.getEmulator(), va) for va in vas ]
+
+def runPooled(vw, vas):
+    ret = []
+    pool = vw.getEmulatorPool()
+    for va in vas:
+        emu = pool.getEmulator()
+        try:
+            ret.append(emulate(vw, emu, va))
+        finally:
+            pool.putEmulator(emu)
+    return ret
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] <binary|.viv>')
+    parser.add_option('-n', dest='maxcands', default=None, type='int', help='only emulate the first n candidates')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a binary (or .viv) is required')
+
+    vw = v_bench.loadWorkspace(args[0], analyze=True)
+    vas = getCandidates(vw)
+    if opts.maxcands != None:
+        vas = vas[:opts.maxcands]
+
+    freshtime, fresh = e_bench.timeit(runFresh, vw, vas)
+    pooltime, pooled = e_bench.timeit(runPooled, vw, vas)
+
+    results = {
+        'candidates':len(vas),
+        'identical':fresh == pooled,
+        'fresh_time':freshtime,
+        'pooled_time':pooltime,
+        'fresh_cands_sec':e_bench.rate(len(vas), freshtime),
+        'pooled_cands_sec':e_bench.rate(len(vas), pooltime),
+    }
+
+    rows = [
+        ('candidates', len(vas)),
+        ('identical results', results['identical']),
+        ('new emulators (sec)', freshtime),
+        ('pooled emulators (sec)', pooltime),
+        ('new emulators (cands/sec)', results['fresh_cands_sec']),
+        ('pooled emulators (cands/sec)', results['pooled_cands_sec']),
+    ]
+    e_bench.printResults('Emulator Pool: %s' % args[0], rows)
+    if opts.output:
+        e_bench.saveResults(opts.output, results)
+
+    if not results['identical']:
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,47 @@
+'''
+Measure workspace import throughput (events/sec) for the bulk
+importWorkspace path against firing each event through _fireEvent.
+
+Usage: python -m vivisect.benchmarks.importws [-o <results.json>] <binary|.viv>
+'''
+import sys
+import optparse
+
+import vivisect
+import envi.benchmarks as e_bench
+import vivisect.benchmarks as v_bench
+
+def fireEvents(vw, events):
+    for event, einfo in events:
+        vw._fireEvent(event, einfo)
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] <binary|.viv>')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a binary (or .viv) is required')
+
+    vw = v_bench.loadWorkspace(args[0], analyze=True)
+    events = list(vw.exportWorkspace())
+    vw = None
+
+    results = {'events':len(events)}
+    rows = [('events', len(events))]
+
+    fvw = vivisect.VivWorkspace()
+    elapsed, x = e_bench.timeit(fireEvents, fvw, events)
+    results['fire_events_sec'] = e_bench.rate(len(events), elapsed)
+    rows.append(('_fireEvent (events/sec)', results['fire_events_sec']))
+
+    ivw = vivisect.VivWorkspace()
+    elapsed, x = e_bench.timeit(ivw.importWorkspace, events)
+    results['import_events_sec'] = e_bench.rate(len(events), elapsed)
+    rows.append(('importWorkspace (events/sec)', results['import_events_sec']))
+
+    e_bench.printResults('Workspace Import: %s' % args[0], rows)
+    if opts.output:
+        e_bench.saveResults(opts.output, results)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
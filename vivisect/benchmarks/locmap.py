@@ -0,0 +1,61 @@
+'''
+Compare the per-byte MapLookup with the RangeLookup used for the workspace
+location map.  The locations from a (optionally analyzed) binary are
+loaded into each lookup type and the RSS growth and lookup rate reported.
+
+Usage: python -m vivisect.benchmarks.locmap [-a] [-n <lookups>] <binary>
+'''
+import sys
+import random
+import optparse
+
+import envi.pagelookup as e_page
+import envi.benchmarks as e_bench
+import vivisect.benchmarks as v_bench
+
+def buildLookup(cls, maps, locs):
+    lookup = cls()
+    for mva, msize, mperm, mname in maps:
+        lookup.initMapLookup(mva, msize)
+    for loc in locs:
+        lookup.setMapLookup(loc[0], loc[1], loc)
+    return lookup
+
+def lookupRate(lookup, vas):
+    getmap = lookup.getMapLookup
+    elapsed, x = e_bench.timeit(lambda: [ getmap(va) for va in vas ])
+    return e_bench.rate(len(vas), elapsed)
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] <binary>')
+    parser.add_option('-a', dest='analyze', default=False, action='store_true', help='analyze the binary first')
+    parser.add_option('-n', dest='count', default=1000000, type='int', help='number of random lookups')
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a binary (or .viv) is required')
+
+    vw = v_bench.loadWorkspace(args[0], analyze=opts.analyze)
+    maps = vw.getMemoryMaps()
+    locs = vw.getLocations()
+
+    rnd = random.Random(0x4c4f43)
+    vas = []
+    for i in xrange(opts.count):
+        mva, msize, mperm, mname = rnd.choice(maps)
+        vas.append(mva + rnd.randrange(msize))
+
+    rows = [
+        ('maps', len(maps)),
+        ('mapped bytes', sum([ m[1] for m in maps ])),
+        ('locations', len(locs)),
+    ]
+    for cls in (e_page.MapLookup, e_page.RangeLookup):
+        rss, lookup = e_bench.rssdelta(buildLookup, cls, maps, locs)
+        rows.append(('%s rss (KB)' % cls.__name__, rss / 1024))
+        rows.append(('%s lookups/sec' % cls.__name__, lookupRate(lookup, vas)))
+        lookup = None
+
+    e_bench.printResults('Location Map: %s' % args[0], rows)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,83 @@
+'''
+Analyze a binary without the workspace opcode cache and then with it
+( for each of the given cache sizes ) and report the analysis time, the
+cache hit rate, and whether the output was identical.  Then time a pass
+which parses every opcode location ( like the codeblocks, renderers or
+crypto.constants passes do ) with each cache.
+
+Usage: python -m vivisect.benchmarks.opcache [-s 50000] [-o <results.json>] <binary>
+'''
+import sys
+import optparse
+
+import envi.benchmarks as e_bench
+import vivisect.benchmarks as v_bench
+import vivisect.benchmarks.parallel as v_b_parallel
+
+from vivisect.const import *
+
+def analyze(filename, maxsize):
+    vw = v_bench.loadWorkspace(filename)
+    vw.opcache.maxsize = maxsize
+    vw.opcache.clear()
+    elapsed, x = e_bench.timeit(vw.analyze)
+    return vw, elapsed, vw.opcache.getStats(), v_b_parallel.getDigest(vw)
+
+def reparse(vw):
+    for lva, lsize, ltype, linfo in vw.getLocations(LOC_OP):
+        vw._parseOpcode(lva)
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] <binary>')
+    parser.add_option('-s', dest='sizes', default='50000', help='comma separated cache sizes')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a binary is required')
+
+    vw, basetime, x, base = analyze(args[0], 0)
+    opcount = len(vw.getLocations(LOC_OP))
+    basereparse, x = e_bench.timeit(reparse, vw)
+    results = {
+        'opcodes':opcount,
+        'uncached_time':basetime,
+        'uncached_reparse_time':basereparse,
+        'cached':[],
+    }
+
+    rows = [
+        ('opcodes', opcount),
+        ('no cache (sec)', basetime),
+        ('no cache reparse (ops/sec)', e_bench.rate(opcount, basereparse)),
+    ]
+
+    identical = True
+    for maxsize in [ int(s) for s in opts.sizes.split(',') ]:
+        vw, elapsed, stats, digest = analyze(args[0], maxsize)
+        identical = identical and digest == base
+        reparsetime, x = e_bench.timeit(reparse, vw)
+
+        stats['time'] = elapsed
+        stats['speedup'] = basetime / elapsed
+        stats['identical'] = digest == base
+        stats['reparse_time'] = reparsetime
+        stats['reparse_speedup'] = basereparse / reparsetime
+        results['cached'].append(stats)
+
+        rows.append(('%d cache (sec)' % maxsize, elapsed))
+        rows.append(('%d cache (speedup)' % maxsize, stats['speedup']))
+        rows.append(('%d cache hit rate' % maxsize, stats['hitrate']))
+        rows.append(('%d cache reparse (ops/sec)' % maxsize, e_bench.rate(opcount, reparsetime)))
+        rows.append(('%d cache reparse (speedup)' % maxsize, stats['reparse_speedup']))
+        rows.append(('%d cache evictions' % maxsize, stats['evictions']))
+        rows.append(('%d cache identical' % maxsize, stats['identical']))
+
+    e_bench.printResults('Opcode Cache: %s' % args[0], rows)
+    if opts.output:
+        e_bench.saveResults(opts.output, results)
+
+    if not identical:
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
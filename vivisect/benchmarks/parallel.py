@@ -0,0 +1,86 @@
+'''
+Analyze a binary serially and with parallel function analysis for each
+of the given worker counts, and report the time and speedup per core
+( the workers plus the analysis process ) along with whether the output
+was identical to serial analysis.
+
+Usage: python -m vivisect.benchmarks.parallel [-j 1,2,4] [-o <results.json>] <binary>
+'''
+import sys
+import hashlib
+import optparse
+import multiprocessing
+
+import envi.benchmarks as e_bench
+import vivisect.benchmarks as v_bench
+
+def getDigest(vw):
+    '''
+    Return a hash of the analysis output of the workspace.
+    '''
+    funcmeta = [ (fva, sorted(meta.items())) for fva, meta in vw.funcmeta.items() ]
+    output = (
+        sorted(vw.getLocations()),
+        sorted(vw.getXrefs()),
+        sorted(vw.getNames()),
+        sorted(funcmeta),
+        sorted(vw.getComments()),
+    )
+    return hashlib.md5(repr(output)).hexdigest()
+
+def analyze(filename, workers):
+    vw = v_bench.loadWorkspace(filename)
+    # Only for this run ( not saved to the config file )
+    vw.config.viv.analysis.parallel.cfginfo['workers'] = workers
+    elapsed, x = e_bench.timeit(vw.analyze)
+    return elapsed, getDigest(vw)
+
+def main(argv):
+    cpus = multiprocessing.cpu_count()
+    defworkers = ','.join([ str(i) for i in (1, 2, 4, 8) if i < cpus ]) or '1'
+
+    parser = optparse.OptionParser(usage='%prog [options] <binary>')
+    parser.add_option('-j', dest='workers', default=defworkers, help='comma separated worker counts')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a binary is required')
+
+    serialtime, serial = analyze(args[0], 0)
+    results = {
+        'cpus':cpus,
+        'serial_time':serialtime,
+        'parallel':[],
+    }
+
+    rows = [
+        ('cpus', cpus),
+        ('serial (sec)', serialtime),
+    ]
+
+    identical = True
+    for workers in [ int(w) for w in opts.workers.split(',') ]:
+        elapsed, digest = analyze(args[0], workers)
+        speedup = serialtime / elapsed
+        identical = identical and digest == serial
+
+        results['parallel'].append({
+            'workers':workers,
+            'cores':workers + 1,
+            'time':elapsed,
+            'speedup':speedup,
+            'identical':digest == serial,
+        })
+        rows.append(('%d workers (sec)' % workers, elapsed))
+        rows.append(('%d cores (speedup)' % (workers + 1), speedup))
+        rows.append(('%d workers identical' % workers, digest == serial))
+
+    e_bench.printResults('Parallel Analysis: %s' % args[0], rows)
+    if opts.output:
+        e_bench.saveResults(opts.output, results)
+
+    if not identical:
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,86 @@
+'''
+Compare the bulk decoding findPointers against the original byte by byte
+scan ( parsebytes / isValidPointer per offset ) of the undefined space.
+
+Usage: python -m vivisect.benchmarks.pointers [-a] [-o <results.json>] <binary|.viv>
+'''
+import sys
+import optparse
+
+import envi.bits as e_bits
+import envi.benchmarks as e_bench
+import vivisect.benchmarks as v_bench
+
+from vivisect.const import *
+
+def findPointersBytewise(vw):
+    '''
+    The original findPointers scan (for reference).
+    '''
+    ret = []
+    size = vw.psize
+    for mva, msize, mperm, mname in vw.getMemoryMaps():
+
+        offset, bytes = vw.getByteDef(mva)
+        maxsize = len(bytes) - size
+
+        while offset + size < maxsize:
+            va = mva + offset
+
+            loctup = vw.getLocation(va)
+            if loctup != None:
+                offset += loctup[L_SIZE]
+                continue
+
+            x = e_bits.parsebytes(bytes, offset, size)
+            if vw.isValidPointer(x):
+                ret.append((va, x))
+                offset += size
+                continue
+
+            offset += 1
+
+    return ret
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] <binary|.viv>')
+    parser.add_option('-a', dest='analyze', default=False, action='store_true', help='analyze the binary first')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a binary (or .viv) is required')
+
+    vw = v_bench.loadWorkspace(args[0], analyze=opts.analyze)
+    scanned = sum([ msize for mva, msize, mperm, mname in vw.getMemoryMaps() ])
+
+    oldtime, oldptrs = e_bench.timeit(findPointersBytewise, vw)
+    newtime, newptrs = e_bench.timeit(vw.findPointers, False)
+
+    results = {
+        'bytes':scanned,
+        'pointers':len(newptrs),
+        'identical':oldptrs == newptrs,
+        'bytewise_time':oldtime,
+        'bulk_time':newtime,
+        'bytewise_bytes_sec':e_bench.rate(scanned, oldtime),
+        'bulk_bytes_sec':e_bench.rate(scanned, newtime),
+    }
+
+    rows = [
+        ('bytes scanned', scanned),
+        ('pointers', len(newptrs)),
+        ('identical results', results['identical']),
+        ('bytewise (sec)', oldtime),
+        ('bulk (sec)', newtime),
+        ('bytewise (bytes/sec)', results['bytewise_bytes_sec']),
+        ('bulk (bytes/sec)', results['bulk_bytes_sec']),
+    ]
+    e_bench.printResults('findPointers: %s' % args[0], rows)
+    if opts.output:
+        e_bench.saveResults(opts.output, results)
+
+    if not results['identical']:
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,75 @@
+'''
+Measure the time and memory to load a binary ( like vivbin -B does before
+the analysis ) with the lazy impapi and structure namespaces, and with
+them imported up front ( as they used to be ).  Each run is done in a
+fresh python process.
+
+Usage: python -m vivisect.benchmarks.startup [-o <results.json>] <binary>
+'''
+import sys
+import json
+import optparse
+import subprocess
+
+import envi.benchmarks as e_bench
+
+def startup(filename, eager):
+    import vivisect.benchmarks as v_bench
+
+    vw = v_bench.loadWorkspace(filename)
+    if eager:
+        for api, arch in vw._api_pending:
+            __import__('vivisect.impapi.%s.%s' % (api, arch))
+        for nsname, ns in vw.vsbuilder.getVStructNamespaces():
+            ns._vsGetModule()
+
+    # The first import lookup ( compiles the tables if needed )
+    vw.getImpApi('ntdll.main_entry')
+    return vw
+
+def child(filename, eager):
+    elapsed, vw = e_bench.timeit(startup, filename, eager)
+    print(json.dumps({'time':elapsed, 'rss':e_bench.getRss()}))
+
+def run(filename, eager):
+    args = [sys.executable, '-m', 'vivisect.benchmarks.startup', '-c']
+    if eager:
+        args.append('-e')
+    args.append(filename)
+    return json.loads(subprocess.check_output(args))
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] <binary>')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    parser.add_option('-c', dest='child', default=False, action='store_true', help=optparse.SUPPRESS_HELP)
+    parser.add_option('-e', dest='eager', default=False, action='store_true', help=optparse.SUPPRESS_HELP)
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a binary is required')
+
+    if opts.child:
+        return child(args[0], opts.eager)
+
+    # Once to be sure the tables are compiled
+    run(args[0], False)
+
+    lazy = run(args[0], False)
+    eager = run(args[0], True)
+    results = {
+        'lazy':lazy,
+        'eager':eager,
+        'speedup':eager['time'] / lazy['time'],
+    }
+
+    e_bench.printResults('Startup: %s' % args[0], [
+        ('eager (sec)', eager['time']),
+        ('eager rss', eager['rss']),
+        ('lazy (sec)', lazy['time']),
+        ('lazy rss', lazy['rss']),
+        ('speedup', results['speedup']),
+    ])
+    if opts.output:
+        e_bench.saveResults(opts.output, results)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
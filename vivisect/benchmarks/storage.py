@@ -0,0 +1,91 @@
+'''
+Compare the workspace storage modules.  The (analyzed) workspace is saved
+with each storage module and then opened in a fresh process to measure the
+open time and peak RSS.
+
+Usage: python -m vivisect.benchmarks.storage [-o <results.json>] <binary|.viv>
+'''
+import os
+import sys
+import json
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+import vivisect
+import envi.benchmarks as e_bench
+import vivisect.benchmarks as v_bench
+
+storage_mods = (
+    'vivisect.storage.basicfile',
+    'vivisect.storage.columnfile',
+)
+
+def openWorkspace(filename):
+    '''
+    Open a saved workspace (in this process) and return a results dict.
+    '''
+    rss = e_bench.getPeakRss()
+    vw = vivisect.VivWorkspace()
+    elapsed, x = e_bench.timeit(vw.loadWorkspace, filename)
+    return {
+        'open_time':elapsed,
+        'peak_rss':e_bench.getPeakRss(),
+        'base_rss':rss,
+        'locations':len(vw.getLocations()),
+    }
+
+def openInProcess(filename):
+    '''
+    Open the workspace in a new interpreter so peak RSS is not polluted.
+    '''
+    env = dict(os.environ)
+    basedir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env['PYTHONPATH'] = os.pathsep.join([basedir, env.get('PYTHONPATH', '')])
+    args = [sys.executable, '-m', 'vivisect.benchmarks.storage', '--open', filename]
+    output = subprocess.check_output(args, env=env)
+    return json.loads(output.strip().split('\n')[-1])
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] <binary|.viv>')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    parser.add_option('--open', dest='open', default=False, action='store_true', help=optparse.SUPPRESS_HELP)
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a binary (or .viv) is required')
+
+    if opts.open:
+        print(json.dumps(openWorkspace(args[0])))
+        return 0
+
+    vw = v_bench.loadWorkspace(args[0], analyze=True)
+
+    results = {}
+    rows = []
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for modname in storage_mods:
+            filename = os.path.join(tmpdir, '%s.viv' % modname.split('.')[-1])
+            vw.setMeta('StorageModule', modname)
+            vw.setMeta('StorageName', filename)
+            savetime, x = e_bench.timeit(vw.saveWorkspace)
+
+            res = openInProcess(filename)
+            res['save_time'] = savetime
+            res['file_size'] = os.path.getsize(filename)
+            results[modname] = res
+
+            rows.append(('%s save (sec)' % modname, savetime))
+            rows.append(('%s size (KB)' % modname, res['file_size'] / 1024))
+            rows.append(('%s open (sec)' % modname, res['open_time']))
+            rows.append(('%s peak rss (KB)' % modname, res['peak_rss'] / 1024))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    e_bench.printResults('Workspace Storage: %s' % args[0], rows)
+    if opts.output:
+        e_bench.saveResults(opts.output, results)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
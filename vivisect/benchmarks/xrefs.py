@@ -0,0 +1,78 @@
+'''
+Stress the xref indexes with one very hot target.  A synthetic i386 blob
+with <count> "call dword [import]" instructions is analyzed, and then the
+xrefs to the import are deleted and re-added.
+
+Usage: python -m vivisect.benchmarks.xrefs [-n <count>] [-o <results.json>]
+'''
+import sys
+import struct
+import optparse
+
+import envi.memory as e_mem
+import envi.benchmarks as e_bench
+
+import vivisect
+from vivisect.const import *
+
+baseva = 0x41410000
+
+def buildWorkspace(count):
+    '''
+    Build a workspace with one function which calls the same import
+    count times.
+    '''
+    impva = baseva
+    codeva = baseva + 0x10
+    code = ('\xff\x15' + struct.pack('<I', impva)) * count + '\xc3'
+
+    vw = vivisect.VivWorkspace()
+    vw.setMeta('Architecture', 'i386')
+    vw.setMeta('Format', 'blob')
+    vw.addMemoryMap(baseva, e_mem.MM_RWX, 'calls', '\x00' * 0x10 + code)
+    vw.makeImport(impva, 'kernel32', 'GetTickCount')
+    return vw, codeva
+
+def delXrefs(vw, xrefs):
+    for xref in xrefs:
+        vw.delXref(xref)
+
+def addXrefs(vw, xrefs):
+    for xref in xrefs:
+        vw.addXref(*xref)
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-n', dest='count', default=100000, type='int', help='number of calls to the import')
+    parser.add_option('-o', dest='output', default=None, help='save results as JSON')
+    opts, args = parser.parse_args(argv)
+
+    vw, codeva = buildWorkspace(opts.count)
+    elapsed, x = e_bench.timeit(vw.makeFunction, codeva)
+
+    xrefs = list(vw.getXrefsTo(baseva))
+    results = {
+        'calls':opts.count,
+        'xrefs_to_import':len(xrefs),
+        'analysis_time':elapsed,
+    }
+
+    elapsed, x = e_bench.timeit(delXrefs, vw, xrefs)
+    results['del_xrefs_sec'] = e_bench.rate(len(xrefs), elapsed)
+
+    elapsed, x = e_bench.timeit(addXrefs, vw, xrefs)
+    results['add_xrefs_sec'] = e_bench.rate(len(xrefs), elapsed)
+
+    rows = [
+        ('calls', opts.count),
+        ('xrefs to import', len(xrefs)),
+        ('makeFunction (sec)', results['analysis_time']),
+        ('delXref (xrefs/sec)', results['del_xrefs_sec']),
+        ('addXref (xrefs/sec)', results['add_xrefs_sec']),
+    ]
+    e_bench.printResults('Hot Xref Target', rows)
+    if opts.output:
+        e_bench.saveResults(opts.output, results)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
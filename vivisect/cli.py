@@ -207,6 +207,18 @@ class VivCli(e_cli.EnviCli, vivisect.VivWorkspace):
         self.saveWorkspace()
         self.vprint("...save complete!")
 
+    def do_reanalyze(self, line):
+        """
+        Re-analyze only what has changed since the last analysis
+        (see vivisect.incremental).
+
+        Usage: reanalyze
+        """
+        funcs, amods = self.reanalyze()
+        self.vprint("Reanalyzed %d functions" % len(funcs))
+        for mname in amods:
+            self.vprint("Reanalyzed: %s" % mname)
+
     def do_xrefs(self, line):
         """
         Show xrefs for a particular location.
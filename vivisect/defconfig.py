@@ -5,6 +5,10 @@ defconfig = {
 
         'SymbolCacheSave':True,
 
+        'opcache':{
+            'maxsize':50000,
+        },
+
         'parsers':{
             'pe':{
                 'loadresources':False,
@@ -29,6 +33,14 @@ defconfig = {
             'pointertables':{
                 'table_min_len':4,
             },
+            'parallel':{
+                'workers':0,
+            },
+        },
+        'storage':{
+            'basicfile':{
+                'recover':False,
+            },
         },
     },
     'cli':vdb.defconfig.get('cli'), # FIXME make our own...
@@ -44,6 +56,10 @@ docconfig = {
 
         'SymbolCacheSave':'Save vivisect names to the vdb configured symbol cache?',
 
+        'opcache':{
+            'maxsize':'How many decoded opcodes may the workspace cache? (0 disables the cache)',
+        },
+
         'parsers':{
             'pe':{
                 'loadresources':'Should we load resource segments?',
@@ -69,6 +85,15 @@ docconfig = {
             'pointertables':{
                 'table_min_len':'How many pointers must be in a row to make a table?',
             },
+            'parallel':{
+                'workers':'How many worker processes analyze functions ahead of time? (experimental, 0 is serial)',
+            },
+        },
+
+        'storage':{
+            'basicfile':{
+                'recover':'Skip corrupt chunks when loading a workspace (rather than failing the load)?',
+            },
         },
 
     },
@@ -6,12 +6,44 @@ import sys
 import vstruct.primitives
 
 class ImportApi:
-
+    '''
+    The api definitions from addImpApi() are loaded ( from their compiled
+    tables, see vivisect.impapi.apitable ) on first lookup.
+    '''
     def __init__(self):
         self._api_lookup = {}
         self._apitype_lookup = {}
+        self._api_pending = []
+        self._api_tables = []
+        self._apitype_tables = []
+
+    def _loadApiTables(self):
+        import vivisect.impapi.apitable as v_apitable
+        while self._api_pending:
+            api, arch = self._api_pending.pop(0)
+            table = v_apitable.loadTable(api, arch)
+            self._api_tables.insert(0, table)
+            self._apitype_tables.insert(0, table)
+
+    def _getApi(self, funcname):
+        normname = funcname.lower()
+        ret = self._api_lookup.get(normname)
+        if ret != None:
+            return ret
+
+        self._loadApiTables()
+        # The most recently added api wins
+        for table in self._api_tables:
+            ret = table.getApi(normname)
+            if ret != None:
+                self._api_lookup[normname] = ret
+                return ret
 
     def getImpApiType(self, tname):
+        self._loadApiTables()
+        while self._apitype_tables:
+            table = self._apitype_tables.pop()
+            self._apitype_lookup.update(table.getApiTypes())
         return self._apitype_lookup.get( tname )
 
     def updateApiDef(self, apidict):
@@ -22,53 +54,52 @@ class ImportApi:
         An API definition consists of the following:
             ( rettype, retname, callconv, funcname, ( (argtype, argname), ...) )
         '''
-        return self._api_lookup.get( funcname.lower() )
+        return self._getApi(funcname)
 
     def getImpApiCallConv(self, funcname):
-        ret = self._api_lookup.get( funcname.lower() )
+        ret = self._getApi(funcname)
         if ret == None:
             return None
         return ret[2]
 
     def getImpApiArgs(self, funcname):
-        ret = self._api_lookup.get( funcname.lower() )
+        ret = self._getApi(funcname)
         if ret == None:
             return None
         return ret[4]
 
     def getImpApiRetType(self, funcname):
-        ret = self._api_lookup.get( funcname.lower() )
+        ret = self._getApi(funcname)
         if ret == None:
             return None
         return ret[0]
 
     def getImpApiRetName(self, funcname):
-        ret = self._api_lookup.get( funcname.lower() )
+        ret = self._getApi(funcname)
         if ret == None:
             return None
         return ret[1]
 
     def getImpApiArgTypes(self, funcname):
-        ret = self._api_lookup.get( funcname.lower() )
+        ret = self._getApi(funcname)
         if ret == None:
             return None
         return [ argt for (argt,argn) in ret[4] ]
 
     def getImpApiArgNames(self, funcname):
-        ret = self._api_lookup.get( funcname.lower() )
+        ret = self._getApi(funcname)
         if ret == None:
             return None
         return [ argn for (argt,argn) in ret[4] ]
 
     def addImpApi(self, api, arch):
+        '''
+        Add the vivisect.impapi.<api>.<arch> definitions ( which are
+        loaded on the first lookup ).
+        '''
         api = api.lower()
         arch = arch.lower()
-        modname = 'vivisect.impapi.%s.%s' % ( api, arch )
-        #mod = imp.load_module( modname, *imp.find_module( modname ) )
-        __import__( modname )
-        mod = sys.modules[ modname ]
-        self._api_lookup.update( mod.api )
-        self._apitype_lookup.update( mod.apitypes )
+        self._api_pending.append( (api, arch) )
 
 def getImportApi( api, arch ):
     impapi = ImportApi()
@@ -0,0 +1,171 @@
+'''
+Precompiled ( compact ) lookup tables for the impapi definitions.
+
+Importing one of the vivisect.impapi.<api>.<arch> modules builds dicts of
+thousands of tuples which most workspaces never look at.  Instead, the
+definitions are compiled ( once ) into a table file in the vivisect home
+directory holding the sorted api names and an offset index into the
+repr()'d definitions, which are only decoded when they are looked up.
+
+A table is rebuilt ( from the module ) whenever the sources of its api
+package change.
+
+Usage: python -m vivisect.impapi.apitable [-d <dir>] <api>.<arch> ...
+'''
+import os
+import ast
+import sys
+import array
+import bisect
+import struct
+import hashlib
+import optparse
+import tempfile
+
+import envi.config as e_config
+
+magic = 'VIVAPITB'
+hdrfmt = '<8s16sIII'
+hdrlen = struct.calcsize(hdrfmt)
+
+def getTableDir():
+    '''
+    Return the directory where the compiled tables are kept.
+    '''
+    return e_config.gethomedir('.viv', 'impapi')
+
+def getSourceHash(api):
+    '''
+    Return the md5 digest of the python sources for the api package
+    ( the arch modules may derive from each other ).
+    '''
+    pkgname = 'vivisect.impapi.%s' % api
+    __import__(pkgname)
+    pkgdir = os.path.dirname(sys.modules[pkgname].__file__)
+
+    md5 = hashlib.md5()
+    for fname in sorted(os.listdir(pkgdir)):
+        if not fname.endswith('.py'):
+            continue
+        md5.update(fname)
+        with open(os.path.join(pkgdir, fname), 'rb') as f:
+            md5.update(f.read())
+    return md5.digest()
+
+def compileTable(api, arch, srchash):
+    '''
+    Import the api module and return the bytes of its compiled table.
+    '''
+    modname = 'vivisect.impapi.%s.%s' % (api, arch)
+    __import__(modname)
+    mod = sys.modules[modname]
+
+    names = sorted(mod.api.keys())
+    offsets = array.array('I', [0])
+    values = []
+    for name in names:
+        value = repr(mod.api[name])
+        values.append(value)
+        offsets.append(offsets[-1] + len(value))
+
+    types = repr(mod.apitypes)
+    keys = '\n'.join(names)
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+
+    hdr = struct.pack(hdrfmt, magic, srchash, len(names), len(types), len(keys))
+    return ''.join([hdr, types, keys, offsets.tostring()] + values)
+
+def loadTable(api, arch, tabledir=None):
+    '''
+    Return the ApiTable for the api and arch ( compiling and saving it
+    if it is missing or out of date ).
+    '''
+    if tabledir == None:
+        tabledir = getTableDir()
+
+    srchash = getSourceHash(api)
+    filename = os.path.join(tabledir, '%s_%s.vtab' % (api, arch))
+    try:
+        with open(filename, 'rb') as f:
+            return ApiTable(f.read(), srchash)
+    except Exception:
+        pass
+
+    tbytes = compileTable(api, arch, srchash)
+
+    # Save it atomically ( a read-only home just means no caching )
+    try:
+        fd, tmpname = tempfile.mkstemp(dir=tabledir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(tbytes)
+        os.rename(tmpname, filename)
+    except Exception:
+        pass
+
+    return ApiTable(tbytes, srchash)
+
+class ApiTable:
+    '''
+    A compiled impapi table ( see compileTable ).  Definitions are
+    decoded on lookup.
+    '''
+    def __init__(self, tbytes, srchash=None):
+        tmagic, thash, count, typelen, keylen = struct.unpack_from(hdrfmt, tbytes)
+        if tmagic != magic:
+            raise Exception('Invalid impapi table')
+        if srchash != None and thash != srchash:
+            raise Exception('Stale impapi table')
+
+        off = hdrlen
+        self._types = tbytes[off:off + typelen]
+        off += typelen
+
+        self.names = []
+        if count:
+            self.names = tbytes[off:off + keylen].split('\n')
+        off += keylen
+
+        offlen = 4 * (count + 1)
+        self.offsets = array.array('I')
+        self.offsets.fromstring(tbytes[off:off + offlen])
+        if sys.byteorder != 'little':
+            self.offsets.byteswap()
+        off += offlen
+
+        self.values = buffer(tbytes, off)
+        if len(self.names) != count or len(self.values) != self.offsets[-1]:
+            raise Exception('Truncated impapi table')
+
+    def getApiTypes(self):
+        '''
+        Return the dict of api types.
+        '''
+        return ast.literal_eval(self._types)
+
+    def getApi(self, name):
+        '''
+        Return the api definition tuple for the ( normalized ) name or None.
+        '''
+        i = bisect.bisect_left(self.names, name)
+        if i == len(self.names) or self.names[i] != name:
+            return None
+        return ast.literal_eval(self.values[self.offsets[i]:self.offsets[i + 1]])
+
+    def __len__(self):
+        return len(self.names)
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] <api>.<arch> ...')
+    parser.add_option('-d', dest='tabledir', default=None, help='table directory')
+    opts, args = parser.parse_args(argv)
+    if not args:
+        parser.error('an api is required ( such as windows.i386 )')
+
+    for name in args:
+        api, arch = name.lower().split('.')
+        table = loadTable(api, arch, tabledir=opts.tabledir)
+        print('%s: %d apis' % (name, len(table)))
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -5,12 +5,20 @@ import itertools
 import envi
 import envi.bits as e_bits
 import envi.memory as e_mem
+import envi.pagelookup as e_page
 import envi.registers as e_reg
 
 import visgraph.pathcore as vg_path
+import vivisect.impemu.monitor as vi_monitor
 
 from vivisect.const import *
 
+# The most opcodes runFunction() caches in one block
+max_block_ops = 256
+
+# Opcodes with these flags end a runFunction() block
+block_end_flags = envi.IF_NOFALL | envi.IF_BRANCH | envi.IF_CALL | envi.IF_RET
+
 # Pre-initialize a stack memory bytes
 init_stack_map = ''
 for i in xrange(8192/4):
@@ -45,7 +53,12 @@ class WorkspaceEmulator:
         self.curpath = self.path
         self.op = None
         self.opcache = {}
+        self.blocks = {} # va: [op, ...] ( see getBlock )
+        self._block_span = None # The (min, max) va of the cached opcodes
+        self._block_gen = 0 # Bumped when cached opcodes are dropped
+        self._code_writes = e_page.RangeSet() # Writes over cached opcodes ( see setEmuSnap )
         self.emumon = None
+        self._emu_writes = e_page.RangeSet() # the non-stack writes (see resetEmuState)
         self.psize = self.getPointerSize()
 
         self.stack_map_mask = e_bits.sign_extend(0xfff00000, 4, vw.psize)
@@ -60,9 +73,9 @@ class WorkspaceEmulator:
         self.addMemoryMap(self.stack_map_base, 6, "[stack]", init_stack_map)
 
         # Map in all the memory associated with the workspace
-        for va, size, perms, fname in vw.getMemoryMaps():
-            offset, bytes = vw.getByteDef(va)
-            self.addMemoryMap(va, perms, fname, bytes)
+        # ( shared copy-on-write so this doesn't scale with image size )
+        self.shareMemoryMaps(vw)
+        self._opcache_gen = vw.opcache.generation
 
         for regidx in self.taintregs:
             rname = self.getRegisterName(regidx)
@@ -88,6 +101,56 @@ class WorkspaceEmulator:
 
             self.hooks[impname] = val
 
+        self._reset_state = None
+
+    def saveResetState(self):
+        '''
+        Save the current (pristine) state of the emulator to be restored
+        by resetEmuState().  Memory is snapped copy-on-write, so a reset
+        costs in proportion to what the emulation touched.
+        '''
+        nexttaint = self.taintva.next()
+        self.taintva = itertools.count(nexttaint, 8192)
+        self._reset_state = (
+            self.getEmuSnap(),
+            dict(self.taints),
+            nexttaint,
+            dict(self._emu_opts),
+            list(self._emu_segments),
+            self._safe_mem,
+            self._func_only,
+        )
+
+    def resetEmuState(self):
+        '''
+        Restore the emulator to the state saved by saveResetState().
+        ( used by the workspace emulator pool )
+        '''
+        esnap, taints, nexttaint, opts, segs, safemem, funconly = self._reset_state
+
+        # Cached opcodes stay valid unless their bytes were written
+        writes = self._emu_writes.getRanges()
+        if writes:
+            self._dropBlocks(writes)
+            self._emu_writes = e_page.RangeSet()
+
+        self.setEmuSnap(esnap)
+        self._code_writes = e_page.RangeSet()
+        self.taints = dict(taints)
+        self.taintva = itertools.count(nexttaint, 8192)
+        self._emu_opts = dict(opts)
+        self._emu_segments = list(segs)
+        self._safe_mem = safemem
+        self._func_only = funconly
+
+        self.funcva = None
+        self.emustop = False
+        self.uninit_use = {}
+        self.path = self.newCodePathNode()
+        self.curpath = self.path
+        self.op = None
+        self.emumon = None
+
     def stopEmu(self):
         '''
         This is called by monitor to stop emulation
@@ -115,12 +178,49 @@ class WorkspaceEmulator:
     def parseOpcode(self, pc):
         # We can make an opcode *faster* with the workspace because of
         # getByteDef etc... use it.
+        # NOTE: the opcodes are shared ( emulation only reads them )
+        # NOTE: "is None" because Opcode.__eq__ is slow
         op = self.opcache.get(pc)
-        if op == None:
+        if op is not None:
+            return op
+
+        # Until we write them ( or the workspace does ) our bytes are the
+        # workspace bytes, so we share the workspace opcode cache.
+        vw = self.vw
+        shared = self._isWorkspaceCode(pc)
+        if shared:
+            op = vw.opcache.get(pc, vw._arch_idx)
+
+        if op is None:
             op = envi.Emulator.parseOpcode(self, pc)
-            self.opcache[pc] = op
+            if shared:
+                vw.opcache.put(pc, vw._arch_idx, op)
+
+        span = self._block_span
+        if span is None:
+            self._block_span = (pc, pc + op.size)
+        elif pc < span[0] or pc + op.size > span[1]:
+            self._block_span = (min(pc, span[0]), max(pc + op.size, span[1]))
+
+        self.opcache[pc] = op
         return op
 
+    def _isWorkspaceCode(self, pc):
+        # Would we decode the same opcode at pc as the workspace?
+        opcache = self.vw.opcache
+        if opcache.maxsize <= 0 or opcache.generation != self._opcache_gen:
+            return False
+
+        if self.isStackPointer(pc):
+            return False
+
+        # Unreadable bytes are emulated as 'A's
+        mdef = self._getMapDef(pc)
+        if mdef == None or pc + 16 > mdef[1] or not mdef[2][2] & e_mem.MM_READ:
+            return False
+
+        return not self._emu_writes.isRangeSet(pc, 16)
+
     def checkCall(self, starteip, endeip, op):
         """
         Check if this was a call, and if so, do the required
@@ -229,6 +329,68 @@ class WorkspaceEmulator:
         if not self.checkCall(starteip, endeip, op):
             self.checkBranches(starteip, endeip, op)
 
+    def getBlock(self, va):
+        '''
+        Return the ( cached ) list of opcodes which runFunction() steps
+        through from va.  Only the last may branch, call or return.
+        '''
+        block = self.blocks.get(va)
+        if block is not None:
+            return block
+
+        vw = self.vw
+        block = [ self.parseOpcode(va) ]
+        while len(block) < max_block_ops:
+            op = block[-1]
+            if op.iflags & block_end_flags or len(op.getBranches()) != 1:
+                break
+
+            va += op.size
+            if not vw.isValidPointer(va):
+                break
+
+            try:
+                block.append(self.parseOpcode(va))
+            except Exception, e:
+                # It's decoded ( and fails ) when we get there
+                break
+
+        self.blocks[block[0].va] = block
+        return block
+
+    def _dropBlocks(self, writes):
+        # Drop the cached opcodes ( and blocks ) decoded from any of the
+        # written bytes ( usually the writes are nowhere near the code )
+        if self._block_span is None:
+            return
+
+        smin, smax = self._block_span
+        writes = [ (va, size) for va, size in writes if va < smax and va + size > smin ]
+        if not writes:
+            return
+
+        self._block_gen += 1
+        for va, size in writes:
+            for pc in xrange(va - 15, va + size):
+                self.opcache.pop(pc, None)
+
+        for bva, block in self.blocks.items():
+            bmax = block[-1].va + block[-1].size
+            for va, size in writes:
+                if va < bmax and va + size > bva:
+                    self.blocks.pop(bva)
+                    break
+
+    def _getMonitorHook(self, name):
+        # The monitor hook ( or None if it's the do-nothing default )
+        if self.emumon is None:
+            return None
+
+        hook = getattr(self.emumon, name, None)
+        if getattr(hook, 'im_func', None) is getattr(vi_monitor.EmulationMonitor, name).im_func:
+            return None
+        return hook
+
     def runFunction(self, funcva, stopva=None, maxhit=None, maxloop=None):
         """
         This is a utility function specific to WorkspaceEmulation (and impemu) that
@@ -245,6 +407,10 @@ class WorkspaceEmulator:
         todo = [(funcva,self.getEmuSnap(),self.path),]
         vw = self.vw # Save a dereference many many times
 
+        # Monitors which don't override a hook don't get called for it
+        prehook = self._getMonitorHook('prehook')
+        posthook = self._getMonitorHook('posthook')
+
         while len(todo):
 
             va,esnap,self.curpath = todo.pop()
@@ -259,12 +425,26 @@ class WorkspaceEmulator:
                 if lcount > maxloop:
                     continue
 
+            curpath = None
+            block = ()
+            bidx = 0
+            bgen = None
+
             while True:
 
                 starteip = self.getProgramCounter()
 
-                if not vw.isValidPointer(starteip):
-                    break
+                # Are we still stepping through a block? ( which were valid
+                # pointers when it was decoded, and which the emulation
+                # hasn't written over since )
+                if bidx < len(block) and block[bidx].va == starteip and bgen == self._block_gen:
+                    op = block[bidx]
+                    bidx += 1
+
+                else:
+                    if not vw.isValidPointer(starteip):
+                        break
+                    op = None
 
                 if starteip == stopva:
                     return
@@ -282,28 +462,41 @@ class WorkspaceEmulator:
                 if self.curpath == None:
                     break
 
+                if self.curpath is not curpath:
+                    curpath = self.curpath
+                    valist = vg_path.getNodeProp(curpath, 'valist')
+
                 try:
 
                     # FIXME unify with stepi code...
-                    op = self.parseOpcode(starteip)
+                    if op is None:
+                        block = self.getBlock(starteip)
+                        bgen = self._block_gen
+                        op = block[0]
+                        bidx = 1
+
                     self.op = op
-                    if self.emumon:
-                        self.emumon.prehook(self, op, starteip)
+                    if prehook is not None:
+                        prehook(self, op, starteip)
 
                         if self.emustop:
                             return 
 
                     # Execute the opcode
                     self.executeOpcode(op)
-                    vg_path.getNodeProp(self.curpath, 'valist').append(starteip)
+                    valist.append(starteip)
 
                     endeip = self.getProgramCounter()
 
-                    if self.emumon:
-                        self.emumon.posthook(self, op, endeip)
+                    if posthook is not None:
+                        posthook(self, op, endeip)
                         if self.emustop:
                             return 
 
+                    # Only the last opcode in a block may call or branch
+                    if bidx < len(block):
+                        continue
+
                     iscall = self.checkCall(starteip, endeip, op)
                     if self.emustop:
                         return
@@ -496,7 +689,25 @@ class WorkspaceEmulator:
         if self._safe_mem and not probeok:
             return
 
-        return e_mem.MemoryObject.writeMemory(self, va, bytes)
+        if not self.isStackPointer(va):
+            self._emu_writes.addRange(va, len(bytes))
+
+        ret = e_mem.MemoryObject.writeMemory(self, va, bytes)
+
+        # Self modifying code must not run the opcodes we decoded before
+        span = self._block_span
+        if span is not None and va < span[1] and va + len(bytes) > span[0]:
+            self._dropBlocks([(va, len(bytes))])
+            self._code_writes.addRange(va, len(bytes))
+
+        return ret
+
+    def setEmuSnap(self, snap):
+        # Restoring a snap may put back code bytes we wrote over ( and
+        # decoded since ), those opcodes must go again.
+        envi.Emulator.setEmuSnap(self, snap)
+        if len(self._code_writes):
+            self._dropBlocks(self._code_writes.getRanges())
 
     def logUninitRegUse(self, regid):
         self.uninit_use[regid] = True
@@ -97,7 +97,7 @@ class AnalysisMonitor(EmulationMonitor):
                 if vw.getLocation(val) != None:
                     continue
 
-                offset, bytes = vw.getByteDef(val)
+                offset, bytes = vw.getPageByteDef(val)
                 pval = e_bits.parsebytes(bytes, offset, tsize)
                 if (vw.psize == tsize and vw.isValidPointer(pval)):
                     vw.makePointer(val, tova=pval)
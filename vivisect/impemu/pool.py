@@ -0,0 +1,65 @@
+'''
+A per-workspace pool of WorkspaceEmulators.  Building an emulator maps in
+the workspace memory, sets up the taints and stack, and looks up the
+import hooks, so analysis passes which emulate many candidate addresses
+re-use pooled emulators which are reset to a snapshot between runs.
+'''
+
+class EmulatorPool:
+    '''
+    Example:
+        pool = vw.getEmulatorPool()
+        emu = pool.getEmulator()
+        try:
+            emu.runFunction(va, maxhit=1)
+        finally:
+            pool.putEmulator(emu)
+    '''
+
+    def __init__(self, vw):
+        self.vw = vw
+        self.emus = []
+        self.emukey = None
+
+    def _getEmuKey(self):
+        # The platform/arch and the memory the emulators share
+        vw = self.vw
+        return (vw.getMeta('Platform'), vw.getMeta('Architecture'), vw.getMemoryGeneration())
+
+    def getEmulator(self):
+        '''
+        Get a pristine emulator from the pool (or build a new one).  The
+        emulator should be given back with putEmulator() when done.
+        '''
+        key = self._getEmuKey()
+        if key != self.emukey:
+            # The workspace memory changed, the pooled emulators are stale
+            self.emus = []
+            self.emukey = key
+
+        try:
+            return self.emus.pop()
+        except IndexError:
+            pass
+
+        emu = self.vw.getEmulator()
+        emu.saveResetState()
+        emu._pool_key = key
+        return emu
+
+    def putEmulator(self, emu):
+        '''
+        Reset an emulator from getEmulator() and return it to the pool.
+        '''
+        if getattr(emu, '_pool_key', None) != self.emukey:
+            return
+
+        emu.resetEmuState()
+        self.emus.append(emu)
+
+    def clear(self):
+        '''
+        Drop all the pooled emulators.
+        '''
+        self.emus = []
+        self.emukey = None
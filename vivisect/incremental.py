@@ -0,0 +1,193 @@
+'''
+Incremental re-analysis.
+
+Every workspace event since the last analysis ( VivWorkspace.analyze() or
+VivWorkspace.reanalyze() ) marks the addresses it touched dirty.  Analysis
+modules declare which event types invalidate them and may analyze only
+the dirty regions:
+
+    from vivisect.const import *
+
+    # The events which make this module worth running again
+    reanalyze_events = (VWE_ADDMMAP, VWE_DELLOCATION)
+
+    def analyzeRegions(vw, regions):
+        # Only look at the [ (va, size), ... ] dirty regions
+        ...
+
+VivWorkspace.reanalyze() then runs only the analysis modules which were
+invalidated ( over the dirty regions if they have an analyzeRegions(),
+otherwise over everything ), and the function analysis modules over the
+existing functions whose code ( or code xrefs ) changed.  Modules without
+reanalyze_events only run during analyze().
+
+Example:
+    vw.makeCode(va)
+    vw.addXref(jmpva, va, REF_CODE)
+    vw.reanalyze()
+'''
+import bisect
+import collections
+
+from vivisect.const import *
+
+# The events which make a ( previously analyzed ) function dirty when
+# they touch one of its code blocks.
+function_events = (
+    VWE_ADDLOCATION,
+    VWE_DELLOCATION,
+    VWE_ADDXREF,
+    VWE_DELXREF,
+)
+
+def mergeRegions(regions):
+    '''
+    Return the sorted list of (va, size) regions with the overlapping
+    ( or adjacent ) ones merged.
+    '''
+    ret = []
+    for va, size in sorted(regions):
+        if ret:
+            lva, lsize = ret[-1]
+            if va <= lva + lsize:
+                ret[-1] = (lva, max(lsize, va + size - lva))
+                continue
+        ret.append((va, size))
+    return ret
+
+def isInRegions(regions, va):
+    '''
+    Check if the va is within the (merged) regions.
+    '''
+    i = bisect.bisect_right(regions, (va, 0xffffffffffffffff)) - 1
+    if i < 0:
+        return False
+    rva, rsize = regions[i]
+    return va < rva + rsize
+
+def clipRegions(vw, regions, perms=0):
+    '''
+    Return the parts of the (merged) regions which are within the memory
+    maps ( with all of the given perms ).
+    '''
+    ret = []
+    for mva, msize, mperms, mname in vw.getMemoryMaps():
+        if mperms & perms != perms:
+            continue
+
+        mvamax = mva + msize
+        for va, size in regions:
+            cva = max(va, mva)
+            cvamax = min(va + size, mvamax)
+            if cva < cvamax:
+                ret.append((cva, cvamax - cva))
+
+    ret.sort()
+    return ret
+
+def getEventRegions(vw, event, einfo):
+    '''
+    Return the list of (va, size) regions touched by the workspace event.
+    '''
+    if event in (VWE_ADDLOCATION, VWE_DELLOCATION, VWE_ADDCODEBLOCK):
+        return [ (einfo[0], einfo[1]) ]
+
+    if event in (VWE_ADDXREF, VWE_DELXREF):
+        return [ (einfo[0], 1), (einfo[1], 1) ]
+
+    if event == VWE_ADDMMAP:
+        return [ (einfo[0], len(einfo[3])) ]
+
+    if event == VWE_ADDRELOC:
+        return [ (einfo[0], vw.psize) ]
+
+    if event in (VWE_ADDFUNCTION, VWE_SETFUNCMETA, VWE_SETFUNCARGS, VWE_SETNAME, VWE_ADDFREF, VWE_SYMHINT):
+        return [ (einfo[0], 1) ]
+
+    if event == VWE_DELFUNCTION:
+        return [ (einfo, 1) ]
+
+    return []
+
+class DirtyQueue:
+    '''
+    Track the regions and functions made dirty by the workspace events
+    since the last analysis.
+    '''
+    def __init__(self, vw):
+        self.vw = vw
+        self.reset()
+
+    def reset(self):
+        '''
+        Everything up to now has been analyzed.
+        '''
+        self.mark = len(self.vw._event_list)
+        self.regions = collections.defaultdict(list)
+        self.funcs = set()
+        self.newfuncs = set()
+
+    def markRegion(self, va, size, events=None):
+        '''
+        Mark a region dirty ( for the given event types or all of them )
+        so the modules interested in it run again.
+        '''
+        if events == None:
+            events = range(VWE_MAX)
+
+        for event in events:
+            self.regions[event].append((va, size))
+
+    def markFunction(self, fva):
+        '''
+        Mark a function dirty so the function analysis modules run again.
+        '''
+        self.funcs.add(fva)
+
+    def _update(self):
+        # Consume the events fired since we last looked
+        vw = self.vw
+        events = vw._event_list[self.mark:]
+        self.mark = len(vw._event_list)
+
+        for event, einfo in events:
+            if event == VWE_ADDFUNCTION:
+                self.newfuncs.add(einfo[0])
+
+            elif event == VWE_DELFUNCTION:
+                self.funcs.discard(einfo)
+                self.newfuncs.discard(einfo)
+
+            regions = getEventRegions(vw, event, einfo)
+            if not regions:
+                continue
+
+            self.regions[event].extend(regions)
+
+            if event not in function_events:
+                continue
+
+            for va, size in regions:
+                cb = vw.getCodeBlock(va)
+                if cb != None and cb[CB_FUNCVA] not in self.newfuncs:
+                    self.funcs.add(cb[CB_FUNCVA])
+
+    def getRegions(self, events):
+        '''
+        Return the merged (va, size) dirty regions for the given event types.
+        '''
+        self._update()
+        regions = []
+        for event in events:
+            regions.extend(self.regions.get(event, ()))
+        return mergeRegions(regions)
+
+    def popFunctions(self):
+        '''
+        Return ( and clear ) the sorted list of dirty functions.
+        '''
+        self._update()
+        vw = self.vw
+        ret = sorted([ fva for fva in self.funcs if vw.isFunction(fva) ])
+        self.funcs = set()
+        return ret
@@ -0,0 +1,127 @@
+'''
+The workspace opcode cache.
+
+Workspace code flow ( and makeOpcode() ) and the workspace emulators share
+a bounded ( least recently used ) cache of decoded opcodes keyed by
+(va, arch) where arch is the architecture index ( envi.ARCH_FOO >> 16 ).
+Writes to the workspace memory and deleted locations invalidate the
+opcodes they touch.
+
+NOTE: cached opcodes are shared, so only the internal callers which never
+      modify them use the cache ( see VivWorkspace._parseOpcode ).  The
+      public VivWorkspace.parseOpcode() always returns a new opcode.
+
+NOTE: the va type ( int or long ) is part of the match since the operand
+      values of the opcode ( and so the analysis output ) follow it.
+
+Example:
+    vw.makeFunction(va)
+    print vw.opcache.getStats()
+'''
+import itertools
+
+# The most bytes an opcode may be decoded from ( see parseOpcode )
+max_opsize = 16
+
+class OpcodeCache:
+    '''
+    When full, the least recently used quarter of the opcodes is evicted
+    ( so the bookkeeping for each lookup is just a use counter ).
+    '''
+    def __init__(self, maxsize=50000):
+        self.maxsize = maxsize
+        self.cache = {} # (va, arch): [op, lastuse]
+        self.archs = set()
+        self.ticks = itertools.count()
+        # Bumped when memory changes ( see WorkspaceEmulator.parseOpcode )
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, va, arch):
+        '''
+        Return the cached opcode ( or None ) for the va and arch index.
+        '''
+        ent = self.cache.get((va, arch))
+        # An int va must not get the opcode decoded for a long va ( or vice
+        # versa ), the operand values would change type
+        if ent is None or ent[0].va.__class__ is not va.__class__:
+            self.misses += 1
+            return None
+
+        ent[1] = self.ticks.next()
+        self.hits += 1
+        return ent[0]
+
+    def put(self, va, arch, op):
+        '''
+        Cache the opcode decoded at va for the arch index.
+        '''
+        if self.maxsize <= 0:
+            return
+
+        if len(self.cache) >= self.maxsize:
+            self._evict()
+
+        self.archs.add(arch)
+        self.cache[(va, arch)] = [op, self.ticks.next()]
+
+    def _evict(self):
+        # Keep the most recently used three quarters
+        cache = self.cache
+        count = max(1, len(cache) / 4)
+        uses = sorted([ ent[1] for ent in cache.itervalues() ])
+        cutoff = uses[count - 1]
+        self.cache = dict([ (key, ent) for key, ent in cache.iteritems() if ent[1] > cutoff ])
+        self.evictions += len(cache) - len(self.cache)
+
+    def invalidate(self, va, size, memory=True):
+        '''
+        Drop the cached opcodes which were decoded from any of the bytes
+        va -> va+size.  Set memory=False if the bytes themselves did not
+        change ( such as a deleted location ).
+        '''
+        if memory:
+            self.generation += 1
+
+        cache = self.cache
+        start = va - max_opsize + 1
+        end = va + size
+        if (end - start) * len(self.archs) > len(cache):
+            keys = [ key for key in cache.iterkeys() if start <= key[0] < end ]
+        else:
+            keys = [ (pc, arch) for pc in xrange(start, end) for arch in self.archs ]
+
+        for key in keys:
+            if cache.pop(key, None) != None:
+                self.invalidations += 1
+
+    def clear(self):
+        '''
+        Drop all the cached opcodes.
+        '''
+        self.generation += 1
+        self.cache.clear()
+        self.archs = set()
+
+    def getStats(self):
+        '''
+        Return a dict of the cache statistics ( including the hit rate ).
+        '''
+        lookups = self.hits + self.misses
+        hitrate = 0.0
+        if lookups:
+            hitrate = float(self.hits) / lookups
+
+        return {
+            'size':len(self.cache),
+            'maxsize':self.maxsize,
+            'hits':self.hits,
+            'misses':self.misses,
+            'hitrate':hitrate,
+            'evictions':self.evictions,
+            'invalidations':self.invalidations,
+        }
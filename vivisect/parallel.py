@@ -0,0 +1,260 @@
+'''
+Parallel function analysis ( experimental ).
+
+When enabled ( vivbin -j <workers> or the viv.analysis.parallel.workers
+config option ) analysis hints which functions it is about to make
+( see VivWorkspace.prefetchFunctions() ) and worker processes, forked
+from ( and so sharing a copy-on-write image of ) the workspace, analyze
+them ahead of time.  For the function analysis modules which declare
+themselves worth it ( parallel = True, see vivisect.analysis.i386.calling )
+the workers send back the workspace events the analysis fired.
+
+The workspace itself is still analyzed serially.  When it reaches a
+function a worker analyzed, the events are fired ( through the normal
+_fireEvent path ) instead of running the module, as long as the function
+still has the same code blocks, the memory is unchanged, the functions
+it calls look the same as they did to the worker and none of the locations
+or xrefs it adds were made since ( say by another function defining the
+same pointer ).  Analysis which makes functions or code blocks ( or
+deletes anything ) is always left to the workspace.
+
+NOTE: the output is not yet shown to be identical to serial analysis for
+every binary, which is why the default is still 0 workers.
+'''
+import os
+import sys
+import Queue
+import cPickle as pickle
+import multiprocessing
+
+import envi
+import envi.memory as e_mem
+
+from vivisect.const import *
+
+# Events which change the shape of the workspace must happen in order
+serial_events = (
+    VWE_ADDFUNCTION,
+    VWE_ADDCODEBLOCK,
+    VWE_DELFUNCTION,
+    VWE_DELLOCATION,
+    VWE_DELXREF,
+)
+
+def checkEvents(vw, events):
+    '''
+    Returns True if the location and xref events ( from a worker ) would
+    still be fired by analysis in the workspace as it is now.  Analysis
+    only adds a location where there is none and an xref which is new.
+    '''
+    added = []
+    for event, einfo in events:
+        if event == VWE_ADDLOCATION:
+            lva, lsize = einfo[0], max(einfo[1], 1)
+            for ava, asize in added:
+                if lva < ava + asize and ava < lva + lsize:
+                    return False
+
+            for va in xrange(lva, lva + lsize):
+                if vw.getLocation(va) != None:
+                    return False
+
+            added.append((lva, lsize))
+
+        elif event == VWE_ADDXREF:
+            if einfo in vw.xrefs:
+                return False
+
+    return True
+
+def getCalleeState(vw, blocks):
+    '''
+    Return what the workspace knows about the functions ( and imports )
+    called from the given code blocks, which function emulation uses.
+    '''
+    ret = []
+    for cbva, cbsize, cbfva in blocks:
+        for lva, lsize, ltype, tinfo in vw.getLocationRange(cbva, cbsize):
+            if ltype != LOC_OP:
+                continue
+
+            for fromva, tova, rtype, rflags in vw.getXrefsFrom(lva, REF_CODE):
+                if not rflags & envi.BR_PROC:
+                    continue
+                ret.append((tova,
+                            vw.isFunction(tova),
+                            vw.getFunctionMeta(tova, 'api'),
+                            vw.getFunctionMeta(tova, 'Thunk'),
+                            vw.getName(tova),
+                            vw.getLocation(tova)))
+    return ret
+
+def _workerPrefetch(vw, vas, follow, queue):
+    # The parent does the talking
+    sys.stdout = open(os.devnull, 'w')
+    vw.verbose = False
+    vw.funcsched.worker = True
+    vw.funcsched.queue = queue
+    vw.funcsched.procs = []
+    vw.funcsched.forkgen = vw.getMemoryGeneration()
+
+    for va in vas:
+        try:
+            if follow:
+                if not vw.isDeadData(va):
+                    vw.followPointer(va)
+                continue
+
+            if vw.isFunction(va):
+                continue
+            if not vw.probeMemory(va, 1, e_mem.MM_EXEC):
+                continue
+            vw.makeFunction(va)
+
+        except Exception, e:
+            pass
+
+class FunctionScheduler:
+    '''
+    Run function analysis ahead of time in worker processes and replay
+    the resulting events ( while they are still valid ) during serial
+    analysis.
+    '''
+    def __init__(self, vw, workers):
+        self.vw = vw
+        self.workers = workers
+        self.worker = False     # Are we the scheduler inside a worker?
+        self.forkgen = None
+        self.results = {}
+        self.procs = []
+        self.queue = None
+
+        # Stats for the benchmarks
+        self.prefetched = 0
+        self.applied = 0
+        self.invalid = 0
+
+    def prefetch(self, vas, follow=False):
+        '''
+        Analyze the given function addresses ( or follow the given pointers )
+        in worker processes, in the background, while analysis carries on.
+        '''
+        if self.worker or self.workers < 1 or not hasattr(os, 'fork'):
+            return
+
+        vas = [ va for va in vas if not self.vw.isFunction(va) ]
+        if not vas:
+            return
+
+        # Workers for an earlier hint are now just in the way
+        self._collect()
+        self._stopWorkers()
+        self.queue = multiprocessing.Queue()
+        self.forkgen = self.vw.getMemoryGeneration()
+
+        # We get to the first chunk ourself before any worker would be
+        # done with it, so each worker takes one of the rest.
+        count = self.workers + 1
+        size = (len(vas) + count - 1) / count
+        for i in xrange(size, len(vas), size):
+            args = (self.vw, vas[i:i + size], follow, self.queue)
+            proc = multiprocessing.Process(target=_workerPrefetch, args=args)
+            proc.daemon = True
+            proc.start()
+            self.procs.append(proc)
+
+    def _stopWorkers(self):
+        # NOTE: a terminated worker may break the queue, so it goes too
+        for proc in self.procs:
+            proc.terminate()
+            proc.join()
+
+        self.procs = []
+        self.queue = None
+
+    def close(self):
+        '''
+        Stop any workers and drop the results.
+        '''
+        self._stopWorkers()
+        self.results = {}
+
+    def _collect(self, timeout=None):
+        # Collect whatever the workers have done so far
+        while self.procs:
+            try:
+                if timeout == None:
+                    key, result = self.queue.get_nowait()
+                else:
+                    key, result = self.queue.get(timeout=timeout)
+
+            except Queue.Empty, e:
+                return
+
+            if self.results.setdefault(key, result) is result:
+                self.prefetched += 1
+
+    def wait(self):
+        '''
+        Wait for the workers to finish ( collecting their results ).
+        '''
+        while self.procs:
+            self._collect(timeout=0.1)
+            if not [ proc for proc in self.procs if proc.is_alive() ]:
+                self._collect()
+                break
+
+        self._stopWorkers()
+
+    def analyzeFunction(self, fva, fmod):
+        '''
+        Called by the code flow callback for each function analysis
+        module.  Returns True if the analysis was done here.
+        '''
+        if not getattr(fmod, 'parallel', False):
+            return False
+
+        if self.worker:
+            return self._recordFunction(fva, fmod)
+
+        self._collect()
+        result = self.results.pop((fmod.__name__, fva), None)
+        if result == None:
+            return False
+
+        vw = self.vw
+        ftype, memgen, blocks, callees, events = pickle.loads(result)
+        if (ftype != type(fva) or
+            memgen != vw.getMemoryGeneration() or
+            blocks != vw.getFunctionBlocks(fva) or
+            callees != getCalleeState(vw, blocks) or
+            not checkEvents(vw, events)):
+            self.invalid += 1
+            return False
+
+        for event, einfo in events:
+            vw._fireEvent(event, einfo)
+
+        self.applied += 1
+        return True
+
+    def _recordFunction(self, fva, fmod):
+        # Analyze (in a worker) and send the parent the events it fired
+        vw = self.vw
+        blocks = list(vw.getFunctionBlocks(fva))
+        callees = getCalleeState(vw, blocks)
+
+        idx = len(vw._event_list)
+        fmod.analyzeFunction(vw, fva)
+        events = vw._event_list[idx:]
+
+        if vw.getMemoryGeneration() != self.forkgen:
+            return True
+
+        for event, einfo in events:
+            if event in serial_events:
+                return True
+
+        result = pickle.dumps((type(fva), self.forkgen, blocks, callees, events), protocol=2)
+        self.queue.put(((fmod.__name__, fva), result))
+        return True
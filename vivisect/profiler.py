@@ -0,0 +1,135 @@
+'''
+Per module analysis profiling.
+
+During analyze() the workspace records the wall time, calls, events fired
+and exceptions for each analysis module ( amodlist ) and function analysis
+module ( fmodlist ) along with the slowest functions for each function
+module.  The results are kept in the "AnalysisProfile" transient meta:
+
+    vw.analyze()
+    prof = vw.getTransMeta('AnalysisProfile')
+    vivisect.profiler.saveProfile(vw, 'profile.json')
+
+The initial pass over the entry points is recorded as the "entrypoints"
+analysis module.
+
+NOTE: analysis module times include the function analysis they trigger.
+'''
+import time
+import json
+import heapq
+import collections
+
+class ModuleProfile:
+
+    def __init__(self, name, topn=0):
+        self.name = name
+        self.topn = topn
+        self.time = 0.0
+        self.calls = 0
+        self.events = 0
+        self.exceptions = 0
+        self.slowest = [] # heap of (time, fva)
+
+    def add(self, elapsed, events, failed=False, fva=None):
+        self.time += elapsed
+        self.calls += 1
+        self.events += events
+        if failed:
+            self.exceptions += 1
+
+        if fva != None and self.topn:
+            if len(self.slowest) < self.topn:
+                heapq.heappush(self.slowest, (elapsed, fva))
+            else:
+                heapq.heappushpop(self.slowest, (elapsed, fva))
+
+    def getProfile(self, vw):
+        ret = {
+            'name':self.name,
+            'time':self.time,
+            'calls':self.calls,
+            'events':self.events,
+            'exceptions':self.exceptions,
+        }
+        if self.topn:
+            slowest = sorted(self.slowest, reverse=True)
+            ret['slowest'] = [ {'va':fva, 'name':vw.getName(fva), 'time':elapsed} for elapsed, fva in slowest ]
+        return ret
+
+class AnalysisProfiler:
+    '''
+    Collect the per module timing for a run of analysis.
+
+    Example:
+        start = prof.start()
+        mod.analyze(vw)
+        prof.stopModule(mname, start)
+    '''
+    def __init__(self, vw, topn=10):
+        self.vw = vw
+        self.topn = topn
+        self.amods = collections.OrderedDict()
+        self.fmods = collections.OrderedDict()
+        self.starttime = time.time()
+
+    def start(self):
+        '''
+        Returns the start "token" for stopModule() / stopFunction().
+        '''
+        return (time.time(), len(self.vw._event_list))
+
+    def _getProfile(self, mods, name, topn=0):
+        mprof = mods.get(name)
+        if mprof == None:
+            mprof = ModuleProfile(name, topn=topn)
+            mods[name] = mprof
+        return mprof
+
+    def stopModule(self, mname, start, failed=False):
+        '''
+        Record a call to an analysis module.
+        '''
+        starttime, nevents = start
+        mprof = self._getProfile(self.amods, mname)
+        mprof.add(time.time() - starttime, len(self.vw._event_list) - nevents, failed=failed)
+
+    def stopFunction(self, fmname, fva, start, failed=False):
+        '''
+        Record a call to a function analysis module.
+        '''
+        starttime, nevents = start
+        mprof = self._getProfile(self.fmods, fmname, topn=self.topn)
+        mprof.add(time.time() - starttime, len(self.vw._event_list) - nevents, failed=failed, fva=fva)
+
+    def getProfile(self):
+        '''
+        Return the (json friendly) profile with the modules in the
+        order they were first run.
+        '''
+        vw = self.vw
+        return {
+            'time':time.time() - self.starttime,
+            'amods':[ mprof.getProfile(vw) for mprof in self.amods.values() ],
+            'fmods':[ mprof.getProfile(vw) for mprof in self.fmods.values() ],
+        }
+
+def getProfileJson(vw):
+    '''
+    Return the analysis profile of the workspace ( or None ) as JSON.
+    '''
+    prof = vw.getTransMeta('AnalysisProfile')
+    if prof == None:
+        return None
+    return json.dumps(prof, indent=2, sort_keys=True)
+
+def saveProfile(vw, filename):
+    '''
+    Save the analysis profile of the workspace as JSON.
+    '''
+    prof = getProfileJson(vw)
+    if prof == None:
+        raise Exception('No analysis profile (has the workspace been analyzed?)')
+
+    with open(filename, 'w') as f:
+        f.write(prof)
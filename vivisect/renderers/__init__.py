@@ -237,7 +237,7 @@ class WorkspaceRenderer(e_canvas.MemoryRenderer):
         elif ltype == LOC_UNDEF:
 
             mcanv.addText(linepre, vatag)
-            offset,bytes = self.vw.getByteDef(lva)
+            offset,bytes = self.vw.getPageByteDef(lva)
             b = bytes[offset].encode('hex')
             mcanv.addNameText(b, typename="undefined")
             if cmnt != None:
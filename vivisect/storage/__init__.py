@@ -4,3 +4,26 @@ a workspace.  the saveWorkspace and loadWorkspace functions
 each take a string for "backing info"
 """
 
+
+# File signatures for the storage modules which may be sniffed
+storage_sigs = (
+    ('VIVCOL01', 'vivisect.storage.columnfile'),
+    ('VIV', 'vivisect.storage.basicfile'),
+)
+
+def getStorageModuleName(filename):
+    '''
+    Return the name of the storage module which saved the given
+    workspace file (or None if the file is missing or unknown).
+    '''
+    try:
+        with open(filename, 'rb') as f:
+            sig = f.read(8)
+    except IOError:
+        return None
+
+    for magic, modname in storage_sigs:
+        if sig.startswith(magic):
+            return modname
+
+    return None
@@ -1,68 +1,288 @@
+'''
+The basic workspace storage module ( a log of workspace events ).
+
+Events are pickled into "chunks", each with a small header containing the
+compression type, lengths, and a CRC of the chunk data.  Saving changes
+appends new chunks to the file, so readers may skip (or verify) chunks
+without decompressing them.  A corrupt chunk fails the load unless the
+caller opts in to recovery ( vivbin --recover ), in which case only the
+events in the corrupt chunk are lost.
+
+Chunk layout (little endian):
+
+    <4sBxxxIII ( "VCNK", compression, raw size, size, crc32 ) + data
+
+Workspaces saved in the legacy format ( appended raw pickles ) are still
+loaded, and changes to them are appended in the legacy format until they
+are compacted:
+
+    python -m vivisect.storage.basicfile -c <workspace.viv>
+'''
+import os
+import sys
+import bz2
+import zlib
+import struct
+import logging
+import optparse
 import cPickle as pickle
+
 import vivisect
 
+logger = logging.getLogger(__name__)
+
 vivsig_cpickle = 'VIV'.ljust(8,'\x00')
+vivsig_chunked = 'VIVLOG01'
+
+chunk_magic = 'VCNK'
+chunk_hdr = '<4sBxxxIII'
+chunk_hdr_size = struct.calcsize(chunk_hdr)
+
+# How many events go in each chunk of a full save
+chunk_events = 50000
+
+COMP_NONE = 0
+COMP_ZLIB = 1
+COMP_BZ2 = 2
+
+comp_default = COMP_ZLIB
+
+compressors = {
+    COMP_NONE:lambda data: data,
+    COMP_ZLIB:lambda data: zlib.compress(data, 1),
+    COMP_BZ2:lambda data: bz2.compress(data),
+}
+
+decompressors = {
+    COMP_NONE:lambda data: data,
+    COMP_ZLIB:zlib.decompress,
+    COMP_BZ2:bz2.decompress,
+}
+
+class CorruptChunk(Exception):
+    def __init__(self, offset, errinfo):
+        Exception.__init__(self, 'Corrupt chunk at 0x%.8x: %s' % (offset, errinfo))
+        self.offset = offset
 
 def saveWorkspaceChanges(vw, filename):
     elist = vw.exportWorkspaceChanges()
     if len(elist):
-        f = file(filename, 'ab')
-        pickle.dump(elist, f, protocol=2)
-        f.close()
+        vivEventsAppendFile(filename, elist)
 
 def saveWorkspace(vw, filename):
     events = vw.exportWorkspace()
     vivEventsToFile(filename, events)
 
-def vivEventsAppendFile(filename, events):
+def _getFileSig(filename):
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(8)
+    except IOError:
+        return None
+
+def _writeChunks(f, events, comp=None):
+    if comp == None:
+        comp = comp_default
+
+    compress = compressors[comp]
+    for i in xrange(0, len(events), chunk_events):
+        data = pickle.dumps(events[i:i+chunk_events], protocol=2)
+        cdata = compress(data)
+        crc = zlib.crc32(cdata) & 0xffffffff
+        f.write(struct.pack(chunk_hdr, chunk_magic, comp, len(data), len(cdata), crc))
+        f.write(cdata)
+
+def vivEventsAppendFile(filename, events, comp=None):
+    sig = _getFileSig(filename)
+    if not sig:
+        return vivEventsToFile(filename, events, comp=comp)
+
     f = file(filename, 'ab')
-    # Mime type for the basic workspace
-    pickle.dump(events, f, protocol=2)
+    if sig == vivsig_chunked:
+        _writeChunks(f, events, comp=comp)
+    else:
+        # Legacy workspace, keep appending raw pickles
+        pickle.dump(events, f, protocol=2)
     f.close()
 
-def vivEventsToFile(filename, events):
+def vivEventsToFile(filename, events, comp=None):
     f = file(filename, 'wb')
     # Mime type for the basic workspace
-    f.write(vivsig_cpickle)
-    pickle.dump(events, f, protocol=2)
+    f.write(vivsig_chunked)
+    _writeChunks(f, events, comp=comp)
     f.close()
 
-def vivEventsFromFile(filename):
-    f = file(filename, "rb")
-    vivsig = f.read(8)
+def _findChunkMagic(f, offset):
+    # Scan forward for the next chunk header (after corruption)
+    tail = ''
+    f.seek(offset)
+    while True:
+        buf = f.read(0x100000)
+        if not buf:
+            return None
 
-    # check for various viv serial formats
-    if vivsig == vivsig_cpickle:
-        pass
+        buf = tail + buf
+        idx = buf.find(chunk_magic)
+        if idx != -1:
+            return offset - len(tail) + idx
 
-    else: # FIXME legacy file format.... ( eventually remove )
-        f.seek(0)
+        offset += len(buf) - len(tail)
+        tail = buf[-(len(chunk_magic) - 1):]
 
-    events = []
-    # Incremental changes are saved to the file by appending more pickled
-    # lists of exported events
-    while True:
-        try:
-            events.extend( pickle.load(f) )
-        except EOFError, e:
+def iterVivChunks(f, recover=False):
+    '''
+    Yield (offset, comp, rawsize, size, crc) tuples for the chunks in an
+    open chunked workspace file without reading the chunk data.  A corrupt
+    header raises CorruptChunk ( or with recover=True, is skipped by
+    scanning for the next chunk ).
+
+    Example:
+        for chunk in iterVivChunks(f):
+            events = readVivChunk(f, chunk)
+    '''
+    offset = len(vivsig_chunked)
+    f.seek(0, os.SEEK_END)
+    fsize = f.tell()
+
+    while offset < fsize:
+        f.seek(offset)
+        hdr = f.read(chunk_hdr_size)
+        if len(hdr) == chunk_hdr_size:
+            magic, comp, rawsize, size, crc = struct.unpack(chunk_hdr, hdr)
+            if magic == chunk_magic and decompressors.get(comp) and offset + chunk_hdr_size + size <= fsize:
+                yield (offset, comp, rawsize, size, crc)
+                offset += chunk_hdr_size + size
+                continue
+
+        if not recover:
+            raise CorruptChunk(offset, 'bad chunk header')
+
+        logger.warning('Corrupt workspace chunk header at 0x%.8x (skipping)', offset)
+        offset = _findChunkMagic(f, offset + 1)
+        if offset == None:
             break
-        except pickle.UnpicklingError, e:
-            raise vivisect.InvalidWorkspace(filename, "invalid workspace file")
 
-    f.close()
+def readVivChunk(f, chunk, verify=True):
+    '''
+    Read, verify, and decompress the list of events for a chunk
+    from iterVivChunks.
+    '''
+    offset, comp, rawsize, size, crc = chunk
+    f.seek(offset + chunk_hdr_size)
+    cdata = f.read(size)
+    if verify and zlib.crc32(cdata) & 0xffffffff != crc:
+        raise CorruptChunk(offset, 'bad crc')
+
+    try:
+        data = decompressors[comp](cdata)
+        if len(data) != rawsize:
+            raise CorruptChunk(offset, 'bad size')
+        return pickle.loads(data)
+    except CorruptChunk:
+        raise
+    except Exception, e:
+        raise CorruptChunk(offset, str(e))
+
+def iterVivEvents(filename, verify=True, recover=False):
+    '''
+    Yield lists of events from a workspace file (one per chunk).  Corrupt
+    chunks raise CorruptChunk unless recover=True ( then they are skipped
+    with a warning ).
+    '''
+    f = file(filename, 'rb')
+    try:
+        vivsig = f.read(8)
+
+        if vivsig == vivsig_chunked:
+            for chunk in iterVivChunks(f, recover=recover):
+                try:
+                    events = readVivChunk(f, chunk, verify=verify)
+                except CorruptChunk, e:
+                    if not recover:
+                        raise
+                    logger.warning('%s (skipping %d bytes)', e, chunk[3])
+                    continue
+                yield events
+            return
 
-    # FIXME - diagnostics to hunt msgpack unsave values
-    #for event in events:
-        #import msgpack
-        #try:
-            #msgpack.dumps(event)
-        #except Exception, e:
-            #print('Unsafe Event: %d %r' % event)
+        # check for various viv serial formats
+        if vivsig == vivsig_cpickle:
+            pass
 
+        else: # FIXME legacy file format.... ( eventually remove )
+            f.seek(0)
+
+        # Incremental changes are saved to the file by appending more pickled
+        # lists of exported events
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError, e:
+                break
+            except pickle.UnpicklingError, e:
+                raise vivisect.InvalidWorkspace(filename, "invalid workspace file")
+
+    finally:
+        f.close()
+
+def vivEventsFromFile(filename, recover=False):
+    events = []
+    for elist in iterVivEvents(filename, recover=recover):
+        events.extend(elist)
     return events
 
+def compactWorkspace(filename, comp=None, recover=False):
+    '''
+    Fold all the (appended) chunks of a workspace file into a single
+    snapshot of evenly sized chunks.  Legacy files are converted.
+    ( with recover=True, the events in corrupt chunks are dropped )
+    '''
+    events = vivEventsFromFile(filename, recover=recover)
+    tmpname = '%s.tmp' % filename
+    vivEventsToFile(tmpname, events, comp=comp)
+    if os.name == 'nt':
+        os.remove(filename)
+    os.rename(tmpname, filename)
+
 def loadWorkspace(vw, filename):
-    events = vivEventsFromFile(filename)
+    recover = vw.config.viv.storage.basicfile.recover
+    events = vivEventsFromFile(filename, recover=recover)
     vw.importWorkspace(events)
     return
 
+def main(argv):
+    logging.basicConfig()
+    parser = optparse.OptionParser(usage='%prog [options] <workspace.viv>')
+    parser.add_option('-c', dest='compact', default=False, action='store_true', help='compact the workspace log')
+    parser.add_option('-z', dest='comp', default=None, choices=('none', 'zlib', 'bz2'), help='compression for -c (none/zlib/bz2)')
+    parser.add_option('-l', dest='list', default=False, action='store_true', help='list (and verify) the chunks')
+    parser.add_option('-r', dest='recover', default=False, action='store_true', help='drop corrupt chunks during -c')
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a workspace file is required')
+
+    filename = args[0]
+    if opts.compact:
+        comp = None
+        if opts.comp != None:
+            comp = {'none':COMP_NONE, 'zlib':COMP_ZLIB, 'bz2':COMP_BZ2}.get(opts.comp)
+        oldsize = os.path.getsize(filename)
+        compactWorkspace(filename, comp=comp, recover=opts.recover)
+        print('Compacted %s: %d -> %d bytes' % (filename, oldsize, os.path.getsize(filename)))
+
+    if opts.list:
+        if _getFileSig(filename) != vivsig_chunked:
+            print('%s is a legacy workspace (use -c to convert)' % filename)
+            return 1
+
+        with open(filename, 'rb') as f:
+            for chunk in iterVivChunks(f, recover=True):
+                offset, comp, rawsize, size, crc = chunk
+                try:
+                    status = '%d events' % len(readVivChunk(f, chunk))
+                except CorruptChunk, e:
+                    status = 'CORRUPT'
+                print('0x%.8x comp: %d size: %d raw: %d %s' % (offset, comp, size, rawsize, status))
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
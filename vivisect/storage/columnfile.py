@@ -0,0 +1,449 @@
+'''
+A columnar workspace storage module.
+
+Rather than a pickled list of events, the workspace *state* is saved as a
+set of typed tables ( locations, xrefs, names, functions and code blocks )
+sorted by address along with a pickled blob for the remaining metadata.
+On load, the tables are read one at a time and unpacked straight into the
+workspace indexes without replaying any events.  The file is closed after
+the load, exporting the events ( exportWorkspace ) reads it again.
+
+To use it, set the StorageModule meta before saving:
+
+    vw.setMeta('StorageModule', 'vivisect.storage.columnfile')
+
+( loading detects the format from the file signature )
+
+File layout (little endian):
+
+    magic       8 bytes "VIVCOL01"
+    header      <II ( version, table count )
+    directory   <32scxxxxxxxQQ ( name, format, offset, count ) per table
+    tables      each aligned to 8 bytes
+
+Table formats:
+
+    Q/q/I       a packed column of count integers
+    B           count raw bytes
+    P           a pickled object count bytes long
+'''
+import os
+import struct
+import cPickle as pickle
+
+import vivisect
+from vivisect.const import *
+
+vivsig_column = 'VIVCOL01'
+column_version = 1
+
+col_header = '<II'
+col_header_size = struct.calcsize(col_header)
+col_table = '<32scxxxxxxxQQ'
+col_table_size = struct.calcsize(col_table)
+
+# "Value" columns hold None, ints, or arbitrary (pickled) objects
+VAL_NONE = 0
+VAL_INT = 1
+VAL_OBJ = 2
+
+class ColumnWriter:
+    '''
+    Accumulate tables and write them out as a column file.
+    '''
+    def __init__(self):
+        self.tables = []
+
+    def addColumn(self, name, fmt, vals):
+        data = struct.pack('<%d%s' % (len(vals), fmt), *vals)
+        self.tables.append((name, fmt, len(vals), data))
+
+    def addBytes(self, name, data):
+        self.tables.append((name, 'B', len(data), data))
+
+    def addObject(self, name, obj):
+        data = pickle.dumps(obj, protocol=2)
+        self.tables.append((name, 'P', len(data), data))
+
+    def addValues(self, name, vals):
+        '''
+        Add a column of values which may be None, ints, or other objects.
+        '''
+        kinds = []
+        ints = []
+        objs = []
+        for val in vals:
+            if val == None:
+                kinds.append(chr(VAL_NONE))
+                ints.append(0)
+
+            elif type(val) == int and -0x8000000000000000 <= val <= 0x7fffffffffffffff:
+                kinds.append(chr(VAL_INT))
+                ints.append(val)
+
+            else:
+                kinds.append(chr(VAL_OBJ))
+                ints.append(len(objs))
+                objs.append(val)
+
+        self.addBytes('%s:kind' % name, ''.join(kinds))
+        self.addColumn('%s:int' % name, 'q', ints)
+        self.addObject('%s:obj' % name, objs)
+
+    def write(self, filename):
+        offset = len(vivsig_column) + col_header_size + (col_table_size * len(self.tables))
+
+        dirs = []
+        for name, fmt, count, data in self.tables:
+            offset += (-offset) % 8
+            dirs.append(struct.pack(col_table, name, fmt, offset, count))
+            offset += len(data)
+
+        # Write a temp file and rename it into place so a failed save
+        # leaves the old file intact.
+        tmpname = '%s.tmp' % filename
+        with open(tmpname, 'wb') as f:
+            f.write(vivsig_column)
+            f.write(struct.pack(col_header, column_version, len(self.tables)))
+            f.write(''.join(dirs))
+            for name, fmt, count, data in self.tables:
+                f.write('\x00' * ((-f.tell()) % 8))
+                f.write(data)
+
+        if os.name == 'nt' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmpname, filename)
+
+class ColumnReader:
+    '''
+    Read a column file and unpack tables by name.
+
+    NOTE: only the directory is kept, each table is read from the file
+          when it is unpacked ( so only one is in memory at a time ).
+    '''
+    def __init__(self, filename):
+        self.filename = filename
+        self.fd = open(filename, 'rb')
+        try:
+            self._readDirectory()
+        except:
+            self.close()
+            raise
+
+    def _readDirectory(self):
+        fd = self.fd
+        if fd.read(len(vivsig_column)) != vivsig_column:
+            raise vivisect.InvalidWorkspace(self.filename, 'not a column workspace file')
+
+        version, count = struct.unpack(col_header, fd.read(col_header_size))
+        if version != column_version:
+            raise vivisect.InvalidWorkspace(self.filename, 'unknown column file version: %d' % version)
+
+        self.tables = {}
+        dirs = fd.read(col_table_size * count)
+        for i in xrange(count):
+            name, fmt, toff, tcount = struct.unpack_from(col_table, dirs, i * col_table_size)
+            self.tables[name.rstrip('\x00')] = (fmt, toff, tcount)
+
+        self.fileid = _getFileId(os.fstat(fd.fileno()))
+
+    def getColumn(self, name):
+        fmt, offset, count = self.tables[name]
+        size = struct.calcsize('<%d%s' % (count, fmt))
+        self.fd.seek(offset)
+        return struct.unpack('<%d%s' % (count, fmt), self.fd.read(size))
+
+    def getBytes(self, name, offset=0, size=None):
+        fmt, toff, count = self.tables[name]
+        if size == None:
+            size = count - offset
+        self.fd.seek(toff + offset)
+        return self.fd.read(size)
+
+    def getObject(self, name):
+        return pickle.loads(self.getBytes(name))
+
+    def getValues(self, name):
+        kinds = self.getBytes('%s:kind' % name)
+        vals = list(self.getColumn('%s:int' % name))
+        if kinds.count(chr(VAL_INT)) == len(kinds):
+            return vals
+
+        objs = self.getObject('%s:obj' % name)
+        for i, kind in enumerate(kinds):
+            if kind == '\x00':
+                vals[i] = None
+            elif kind == '\x02':
+                vals[i] = objs[vals[i]]
+        return vals
+
+    def close(self):
+        self.fd.close()
+
+def _isOverlapping(items):
+    '''
+    Check if any of the sorted (va, size, ...) tuples overlap.
+    '''
+    lastend = None
+    for item in items:
+        if lastend != None and item[0] < lastend:
+            return True
+        lastend = item[0] + item[1]
+    return False
+
+def _addRangeMap(cw, name, lookup, maps, items):
+    '''
+    The range map (locmap/blockmap) is rebuilt from the sorted items on
+    load unless they overlap.  In that case, the painted ranges are saved
+    as (va, size, item index) columns so they load exactly as they were.
+    '''
+    if not _isOverlapping(items):
+        return
+
+    ranges = []
+    for va, size, perms, fname in maps:
+        ranges.extend(lookup.getMapLookupRanges(va, size))
+
+    itemidx = dict([ (item, i) for i, item in enumerate(items) ])
+    cw.addColumn('%s:va' % name, 'Q', [ va for va, vamax, item in ranges ])
+    cw.addColumn('%s:size' % name, 'Q', [ vamax - va for va, vamax, item in ranges ])
+    cw.addColumn('%s:idx' % name, 'Q', [ itemidx[item] for va, vamax, item in ranges ])
+
+def _getRangeMap(cr, name, items):
+    if not cr.tables.has_key('%s:va' % name):
+        return None
+    return [ (va, size, items[idx]) for va, size, idx in
+             zip(cr.getColumn('%s:va' % name), cr.getColumn('%s:size' % name), cr.getColumn('%s:idx' % name)) ]
+
+def saveWorkspace(vw, filename):
+    cw = ColumnWriter()
+
+    maps = vw.getMemoryMaps()
+
+    locs = sorted(vw.getLocations())
+    _addRangeMap(cw, 'locmap', vw.locmap, maps, locs)
+    cw.addColumn('loc:va', 'Q', [ loc[L_VA] for loc in locs ])
+    cw.addColumn('loc:size', 'Q', [ loc[L_SIZE] for loc in locs ])
+    cw.addColumn('loc:type', 'I', [ loc[L_LTYPE] for loc in locs ])
+    cw.addValues('loc:info', [ loc[L_TINFO] for loc in locs ])
+
+    xrefs = sorted(vw.getXrefs())
+    cw.addColumn('xref:from', 'Q', [ xref[XR_FROM] for xref in xrefs ])
+    cw.addColumn('xref:to', 'Q', [ xref[XR_TO] for xref in xrefs ])
+    cw.addColumn('xref:type', 'I', [ xref[XR_RTYPE] for xref in xrefs ])
+    cw.addValues('xref:flags', [ xref[XR_RFLAG] for xref in xrefs ])
+
+    names = sorted(vw.getNames())
+    cw.addColumn('name:va', 'Q', [ va for va, name in names ])
+    cw.addObject('name:name', [ name for va, name in names ])
+
+    funcs = sorted(vw.funcmeta.items())
+    cw.addColumn('func:va', 'Q', [ fva for fva, meta in funcs ])
+    cw.addObject('func:meta', [ meta for fva, meta in funcs ])
+
+    cbs = sorted(vw.getCodeBlocks())
+    _addRangeMap(cw, 'blockmap', vw.blockmap, maps, cbs)
+    cw.addColumn('cb:va', 'Q', [ cb[CB_VA] for cb in cbs ])
+    cw.addColumn('cb:size', 'Q', [ cb[CB_SIZE] for cb in cbs ])
+    cw.addColumn('cb:funcva', 'Q', [ cb[CB_FUNCVA] for cb in cbs ])
+
+    mmaps = []
+    mbytes = []
+    offset = 0
+    for va, size, perms, fname in maps:
+        mmaps.append((va, perms, fname, offset, size))
+        mbytes.append(vw.readMemory(va, size))
+        offset += size
+    cw.addBytes('mmaps', ''.join(mbytes))
+
+    # The meta callbacks for Platform need the Architecture set first
+    metadata = vw.metadata.items()
+    metadata.sort(key=lambda (name, value): (name != 'Architecture', name != 'Platform'))
+
+    state = {
+        'metadata':metadata,
+        'filemeta':vw.filemeta,
+        'maps':mmaps,
+        'segments':vw.segments,
+        'relocations':vw.relocations,
+        'exports':vw.exports,
+        'comments':vw.comments,
+        'symhints':vw.symhints,
+        'colormaps':vw.colormaps,
+        'vasetdefs':vw.vasetdefs,
+        'vasets':vw.vasets,
+        'frefs':vw.frefs,
+        'func_args':vw.func_args,
+    }
+    cw.addObject('state', state)
+
+    cw.write(filename)
+
+    # The file now holds the whole workspace ( and may have replaced the
+    # one we loaded from ) so export reads the events from it.
+    fileid = _getFileId(os.stat(filename))
+    vw._setEventSnap(_getEventReader(filename, fileid), replace=True)
+
+def saveWorkspaceChanges(vw, filename):
+    # Column files are not appendable, save the whole thing...
+    saveWorkspace(vw, filename)
+
+def _getLocations(cr):
+    return zip(cr.getColumn('loc:va'), cr.getColumn('loc:size'),
+               cr.getColumn('loc:type'), cr.getValues('loc:info'))
+
+def _getXrefs(cr):
+    return zip(cr.getColumn('xref:from'), cr.getColumn('xref:to'),
+               cr.getColumn('xref:type'), cr.getValues('xref:flags'))
+
+def _getNames(cr):
+    return zip(cr.getColumn('name:va'), cr.getObject('name:name'))
+
+def _getFunctions(cr):
+    return zip(cr.getColumn('func:va'), cr.getObject('func:meta'))
+
+def _getCodeBlocks(cr):
+    return zip(cr.getColumn('cb:va'), cr.getColumn('cb:size'), cr.getColumn('cb:funcva'))
+
+def _eventsFromReader(cr):
+    '''
+    Build the list of events which re-create the saved workspace.
+    '''
+    state = cr.getObject('state')
+
+    events = []
+    for name, value in state['metadata']:
+        events.append((VWE_SETMETA, (name, value)))
+
+    for fname, fmeta in state['filemeta'].items():
+        events.append((VWE_ADDFILE, (fname, fmeta.get('imagebase'), fmeta.get('md5sum'))))
+        for key, value in fmeta.items():
+            if key not in ('imagebase', 'md5sum'):
+                events.append((VWE_SETFILEMETA, (fname, key, value)))
+
+    for va, perms, fname, offset, size in state['maps']:
+        events.append((VWE_ADDMMAP, (va, perms, fname, cr.getBytes('mmaps', offset, size))))
+
+    events.extend([ (VWE_ADDSEGMENT, seg) for seg in state['segments'] ])
+    events.extend([ (VWE_ADDRELOC, reloc) for reloc in state['relocations'] ])
+    events.extend([ (VWE_ADDLOCATION, loc) for loc in _getLocations(cr) ])
+    events.extend([ (VWE_ADDXREF, xref) for xref in _getXrefs(cr) ])
+    events.extend([ (VWE_SETNAME, name) for name in _getNames(cr) ])
+    events.extend([ (VWE_ADDEXPORT, exp) for exp in state['exports'] ])
+
+    funcs = _getFunctions(cr)
+    events.extend([ (VWE_ADDFUNCTION, func) for func in funcs ])
+    events.extend([ (VWE_ADDCODEBLOCK, cb) for cb in _getCodeBlocks(cr) ])
+    # The call graph edges need the code blocks...
+    for fva, meta in funcs:
+        callsfrom = meta.get('CallsFrom')
+        if callsfrom != None:
+            events.append((VWE_SETFUNCMETA, (fva, 'CallsFrom', callsfrom)))
+
+    events.extend([ (VWE_SETFUNCARGS, fargs) for fargs in state['func_args'].items() ])
+    events.extend([ (VWE_COMMENT, cmnt) for cmnt in state['comments'].items() ])
+
+    for name, defs in state['vasetdefs'].items():
+        rows = state['vasets'].get(name, {}).values()
+        events.append((VWE_ADDVASET, (name, defs, rows)))
+
+    events.extend([ (VWE_ADDCOLOR, cmap) for cmap in state['colormaps'].items() ])
+
+    for (va, idx), val in state['frefs'].items():
+        events.append((VWE_ADDFREF, (va, idx, val)))
+
+    for (va, idx), hint in state['symhints'].items():
+        events.append((VWE_SYMHINT, (va, idx, hint)))
+
+    return events
+
+def vivEventsFromFile(filename):
+    cr = ColumnReader(filename)
+    try:
+        return _eventsFromReader(cr)
+    finally:
+        cr.close()
+
+def _getFileId(st):
+    # Enough of the stat to notice the file changing under us
+    return (st.st_size, st.st_mtime)
+
+def _getEventReader(filename, fileid):
+    '''
+    Return a callable which reads the events back out of the column file
+    for the workspace event snap ( as long as it is still the same file ).
+    '''
+    filename = os.path.abspath(filename)
+    def getevents():
+        cr = ColumnReader(filename)
+        try:
+            if cr.fileid != fileid:
+                raise vivisect.InvalidWorkspace(filename, 'changed since the workspace was loaded (or saved)')
+            return _eventsFromReader(cr)
+        finally:
+            cr.close()
+
+    return getevents
+
+def loadWorkspace(vw, filename):
+    cr = ColumnReader(filename)
+
+    # The bulk install is only valid for an empty workspace
+    if vw.getLocations() or vw.getFunctions():
+        try:
+            vw.importWorkspace(_eventsFromReader(cr))
+        finally:
+            cr.close()
+        return
+
+    state = cr.getObject('state')
+    for name, value in state['metadata']:
+        vw._handleSETMETA((name, value))
+
+    for fname, fmeta in state['filemeta'].items():
+        vw.filemeta[fname] = dict(fmeta)
+
+    for va, perms, fname, offset, size in state['maps']:
+        vw._handleADDMMAP((va, perms, fname, cr.getBytes('mmaps', offset, size)))
+
+    for seg in state['segments']:
+        vw._handleADDSEGMENT(seg)
+
+    for reloc in state['relocations']:
+        vw._handleADDRELOC(reloc)
+
+    locs = _getLocations(cr)
+    vw._bulkAddLocations(locs, ranges=_getRangeMap(cr, 'locmap', locs))
+    vw._bulkAddXrefs(_getXrefs(cr))
+
+    for va, name in _getNames(cr):
+        vw.name_by_va[va] = name
+        vw.va_by_name[name] = va
+
+    for exp in state['exports']:
+        vw.exports.append(exp)
+        vw.exports_by_va[exp[0]] = exp
+
+    funcs = _getFunctions(cr)
+    for func in funcs:
+        vw._handleADDFUNCTION(func)
+
+    cbs = _getCodeBlocks(cr)
+    vw._bulkAddCodeBlocks(cbs, ranges=_getRangeMap(cr, 'blockmap', cbs))
+    for fva, meta in funcs:
+        callsfrom = meta.get('CallsFrom')
+        if callsfrom != None:
+            vw._handleSETFUNCMETA((fva, 'CallsFrom', callsfrom))
+
+    vw.func_args.update(state['func_args'])
+    vw.comments.update(state['comments'])
+    vw.symhints.update(state['symhints'])
+    vw.colormaps.update(state['colormaps'])
+    vw.vasetdefs.update(state['vasetdefs'])
+    vw.vasets.update(state['vasets'])
+    vw.frefs.update(state['frefs'])
+
+    # Nothing was evented, so export builds the events from the file
+    # ( read again, nothing from it stays in memory )
+    cr.close()
+    vw._setEventSnap(_getEventReader(filename, cr.fileid))
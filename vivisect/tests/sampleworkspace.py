@@ -0,0 +1,39 @@
+'''
+Sample workspaces shared by the tests.
+'''
+import struct
+
+import envi.memory as e_mem
+import vivisect
+
+baseva = 0x41410000
+globva = 0x41410800
+
+def getCallingWorkspace(count=40, workers=0):
+    '''
+    A workspace with count stdcall functions which each read a global
+    and call the one before them.
+    '''
+    code = ''
+    funcs = []
+    for i in xrange(count):
+        va = baseva + len(code)
+        # push ebp; mov ebp,esp; mov eax,[ebp+8]; mov ecx,[globva]
+        code += '\x55\x89\xe5\x8b\x45\x08\x8b\x0d' + struct.pack('<I', globva)
+        if funcs:
+            # push eax; call <previous>
+            code += '\x50\xe8' + struct.pack('<i', funcs[-1] - (baseva + len(code) + 6))
+        # mov esp,ebp; pop ebp; ret 4
+        code += '\x89\xec\x5d\xc2\x04\x00'
+        funcs.append(va)
+
+    vw = vivisect.VivWorkspace()
+    vw.config.viv.analysis.parallel.cfginfo['workers'] = workers
+    vw.setMeta('Architecture','i386')
+    vw.setMeta('Format','blob')
+    vw.addMemoryMap(baseva, e_mem.MM_RWX, 'code', code.ljust(0x1000, '\x00'))
+    vw.addFuncAnalysisModule('vivisect.analysis.generic.codeblocks')
+    vw.addFuncAnalysisModule('vivisect.analysis.i386.calling')
+    for va in reversed(funcs):
+        vw.addEntryPoint(va)
+    return vw, funcs
@@ -0,0 +1,74 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import vivisect.batch as viv_batch
+import vivisect.benchmarks.batch as v_b_batch
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def readManifest(self, manifest):
+        with open(manifest, 'rb') as f:
+            return dict([ (ret['filename'], ret) for ret in map(json.loads, f) ])
+
+    def test_batch_samples(self):
+        samples = v_b_batch.makeCorpus(self.tmpdir, 3, funcs=1)
+        with open(samples[0] + '.viv', 'wb') as f:
+            f.write('not a sample')
+
+        filelist = os.path.join(self.tmpdir, 'list.txt')
+        with open(filelist, 'wb') as f:
+            f.write('%s\n\n%s\n' % (samples[0], samples[1]))
+
+        self.assertEqual(viv_batch.getSamples([self.tmpdir]), sorted(samples + [filelist]))
+        self.assertEqual(viv_batch.getSamples(['@' + filelist, samples[1]]), samples[:2])
+
+    def test_batch_manifest(self):
+        samples = v_b_batch.makeCorpus(self.tmpdir, 4, funcs=10)
+        junk = os.path.join(self.tmpdir, 'junk.bin')
+        with open(junk, 'wb') as f:
+            f.write('MZ' + 'A' * 100)
+
+        outdir = os.path.join(self.tmpdir, 'out')
+        os.mkdir(outdir)
+        manifest = os.path.join(self.tmpdir, 'manifest.jsonl')
+        totals = viv_batch.runBatch(samples + [junk], manifest, workers=2, outdir=outdir)
+        self.assertEqual(totals['samples'], 5)
+        self.assertEqual(totals[viv_batch.STATUS_OK], 4)
+        self.assertEqual(totals[viv_batch.STATUS_ERROR], 1)
+        self.assertEqual(totals['functions'], 4 * 11)
+        self.assertGreater(totals['samples_per_sec'], 0)
+
+        results = self.readManifest(manifest)
+        self.assertEqual(results[junk]['status'], viv_batch.STATUS_ERROR)
+        for filename in samples:
+            ret = results[filename]
+            self.assertEqual(ret['status'], viv_batch.STATUS_OK)
+            self.assertEqual(ret['arch'], 'i386')
+            self.assertIn(ret['format'], ('elf', 'pe'))
+            self.assertEqual(ret['functions'], 11)
+            self.assertGreater(ret['coverage'], 0.5)
+            self.assertTrue(os.path.exists(ret['workspace']))
+            self.assertEqual(os.path.dirname(ret['workspace']), outdir)
+
+    def test_batch_limits(self):
+        samples = v_b_batch.makeCorpus(self.tmpdir, 1, funcs=3000)
+        smalldir = os.path.join(self.tmpdir, 'small')
+        os.mkdir(smalldir)
+        small = v_b_batch.makeCorpus(smalldir, 1, funcs=1)
+
+        batch = viv_batch.BatchAnalyzer(timeout=1, save=False)
+        rets = list(batch.run(samples + small))
+        self.assertEqual([ ret['status'] for ret in rets ], [viv_batch.STATUS_TIMEOUT, viv_batch.STATUS_OK])
+
+        batch = viv_batch.BatchAnalyzer(maxrss=1, save=False)
+        rets = list(batch.run(samples))
+        self.assertEqual(rets[0]['status'], viv_batch.STATUS_MEMORY)
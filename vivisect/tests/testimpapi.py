@@ -1,6 +1,10 @@
+import shutil
+import tempfile
 import unittest
 
 import vivisect.impapi as viv_impapi
+import vivisect.impapi.apitable as viv_apitable
+import vivisect.impapi.windows.i386 as viv_windows_i386
 
 class ImpApiTest(unittest.TestCase):
 
@@ -20,3 +24,40 @@ class ImpApiTest(unittest.TestCase):
     def test_impapi_winkern(self):
         imp = viv_impapi.getImportApi('winkern','i386')
         self.assertEqual( imp.getImpApiCallConv('ntoskrnl.ObReferenceObjectByHandle'), 'stdcall')
+
+    def test_impapi_lazy(self):
+        imp = viv_impapi.getImportApi('windows','i386')
+        self.assertEqual(imp._api_tables, [])
+        self.assertEqual(imp.getImpApiArgNames('ntdll.seh3_prolog'), ['pScopeTable','dwAllocSize'])
+        self.assertEqual(len(imp._api_tables), 1)
+
+        # Explicit definitions win
+        imp.updateApiDef({'ntdll.seh3_prolog':('int', None, 'cdecl', 'ntdll.seh3_prolog', ())})
+        self.assertEqual(imp.getImpApiCallConv('ntdll.seh3_prolog'), 'cdecl')
+
+        # ...as do later apis
+        imp.addImpApi('windows','amd64')
+        self.assertEqual(imp.getImpApiCallConv('kernel32.CreateFileA'), 'msx64call')
+        self.assertEqual(imp.getImpApiCallConv('ntdll.seh4_prolog'), 'stdcall')
+        self.assertEqual(imp.getImpApiType('HANDLE'), 'DWORD')
+        self.assertIsNone(imp.getImpApi('kernel32.NotAnApi'))
+
+    def test_impapi_table(self):
+        tabledir = tempfile.mkdtemp()
+        try:
+            table = viv_apitable.loadTable('windows', 'i386', tabledir=tabledir)
+            self.assertEqual(len(table), len(viv_windows_i386.api))
+            self.assertEqual(table.getApiTypes(), viv_windows_i386.apitypes)
+            for name, api in viv_windows_i386.api.items():
+                self.assertEqual(table.getApi(name), api)
+            self.assertIsNone(table.getApi('zzz.nope'))
+
+            # From the saved table file this time
+            table = viv_apitable.loadTable('windows', 'i386', tabledir=tabledir)
+            self.assertEqual(table.getApi('ntdll.main_entry'), viv_windows_i386.api['ntdll.main_entry'])
+
+            # A table from other sources is stale
+            tbytes = viv_apitable.compileTable('windows', 'i386', 'A' * 16)
+            self.assertRaises(Exception, viv_apitable.ApiTable, tbytes, viv_apitable.getSourceHash('windows'))
+        finally:
+            shutil.rmtree(tabledir)
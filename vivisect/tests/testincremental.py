@@ -0,0 +1,98 @@
+import struct
+import unittest
+
+import envi.memory as e_mem
+import vivisect
+import vivisect.incremental as viv_incremental
+
+from vivisect.const import *
+
+baseva = 0x41410000
+funcva = baseva
+deadva = baseva + 0x08
+ptrva = baseva + 0x800
+strva = baseva + 0x810
+
+def getWorkspace():
+    # mov eax,1; ret; (padding) nop; ret
+    code = '\xb8\x01\x00\x00\x00\xc3\x00\x00\x90\xc3'
+    mem = code.ljust(0x800, '\x00')
+    mem += struct.pack('<I', strva).ljust(0x10, '\x00')
+    mem += 'hello incremental world\x00'
+
+    vw = vivisect.VivWorkspace()
+    vw.setMeta('Architecture','i386')
+    vw.setMeta('Format','blob')
+    vw.addMemoryMap(baseva, e_mem.MM_RWX, 'code', mem.ljust(0x1000, '\x00'))
+    vw.addAnalysisModule('vivisect.analysis.generic.relocations')
+    vw.addAnalysisModule('vivisect.analysis.generic.pointers')
+    vw.addFuncAnalysisModule('vivisect.analysis.generic.codeblocks')
+    vw.addEntryPoint(funcva)
+
+    # Hide the pointer from the initial analysis
+    vw.makeNumber(ptrva, 4)
+    return vw
+
+class IncrementalTest(unittest.TestCase):
+
+    def test_vivisect_incremental_regions(self):
+        regions = viv_incremental.mergeRegions([(10, 5), (0, 4), (4, 2), (20, 1)])
+        self.assertEqual(regions, [(0, 6), (10, 5), (20, 1)])
+        self.assertTrue(viv_incremental.isInRegions(regions, 5))
+        self.assertFalse(viv_incremental.isInRegions(regions, 6))
+        self.assertTrue(viv_incremental.isInRegions(regions, 14))
+        self.assertFalse(viv_incremental.isInRegions(regions, 15))
+
+    def test_vivisect_incremental_clean(self):
+        vw = getWorkspace()
+        vw.analyze()
+        self.assertEqual(vw.reanalyze(), ([], []))
+
+    def test_vivisect_incremental_pointers(self):
+        vw = getWorkspace()
+        vw.analyze()
+        self.assertIsNone(vw.getLocation(strva))
+
+        vw.delLocation(ptrva)
+        self.assertEqual(vw.findPointers(regions=[(ptrva, 4)]), [(ptrva, strva)])
+
+        funcs, amods = vw.reanalyze()
+        self.assertEqual(amods, ['vivisect.analysis.generic.pointers'])
+        self.assertEqual(vw.getLocation(strva)[L_LTYPE], LOC_STRING)
+
+        # ...and now it's clean again
+        self.assertEqual(vw.reanalyze(), ([], []))
+
+    def test_vivisect_incremental_function(self):
+        vw = getWorkspace()
+        vw.analyze()
+        self.assertEqual(len(vw.getFunctionBlocks(funcva)), 1)
+
+        # Fix up the flow ( like a switch table ) from the ret
+        vw.makeCode(deadva)
+        vw.addXref(funcva + 5, deadva, REF_CODE)
+
+        funcs, amods = vw.reanalyze()
+        self.assertEqual(funcs, [funcva])
+        self.assertEqual(amods, [])
+        self.assertEqual(len(vw.getFunctionBlocks(funcva)), 2)
+        self.assertEqual(vw.getFunctionMeta(funcva, 'InstructionCount'), 4)
+
+        vw.markDirtyFunction(funcva)
+        self.assertEqual(vw.reanalyze(), ([funcva], []))
+        self.assertEqual(len(vw.getFunctionBlocks(funcva)), 2)
+        self.assertRaises(vivisect.InvalidFunction, vw.markDirtyFunction, deadva)
+
+    def test_vivisect_incremental_signatures(self):
+        vw = getWorkspace()
+        vw.addAnalysisModule('vivisect.analysis.generic.funcentries')
+        vw.analyze()
+        self.assertFalse(vw.isFunction(deadva))
+
+        # Signatures added later are only scanned for where asked to
+        vw.addFunctionSignatureBytes('\x90\xc3')
+        self.assertEqual(vw.reanalyze(), ([], []))
+        vw.markDirtyRegion(deadva, 2)
+        funcs, amods = vw.reanalyze()
+        self.assertIn('vivisect.analysis.generic.funcentries', amods)
+        self.assertTrue(vw.isFunction(deadva))
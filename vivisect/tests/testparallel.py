@@ -0,0 +1,162 @@
+import Queue
+import types
+import struct
+import unittest
+
+import envi.memory as e_mem
+import vivisect
+import vivisect.parallel as viv_parallel
+import vivisect.tests.sampleworkspace as sampleworkspace
+
+from vivisect.const import *
+
+baseva = sampleworkspace.baseva
+globva = sampleworkspace.globva
+
+def getOutput(vw):
+    return (
+        sorted(vw.getLocations()),
+        sorted(vw.getXrefs()),
+        sorted(vw.getFunctions()),
+        vw.funcmeta,
+        sorted(vw.getComments()),
+    )
+
+class ParallelTest(unittest.TestCase):
+
+    def test_vivisect_parallel_analyze(self):
+        ans, funcs = sampleworkspace.getCallingWorkspace()
+        ans.analyze()
+        self.assertEqual(len(ans.getFunctions()), len(funcs))
+        self.assertEqual(ans.getFunctionMeta(funcs[-1], 'api')[2], 'stdcall')
+
+        for workers in (1, 2):
+            vw, funcs = sampleworkspace.getCallingWorkspace(workers=workers)
+            vw.analyze()
+            self.assertIsNone(vw.funcsched)
+            self.assertEqual(getOutput(vw), getOutput(ans))
+
+    def test_vivisect_parallel_prefetch(self):
+        ans, funcs = sampleworkspace.getCallingWorkspace()
+        for va in funcs:
+            ans.makeFunction(va)
+
+        vw, funcs = sampleworkspace.getCallingWorkspace()
+        vw.funcsched = viv_parallel.FunctionScheduler(vw, 2)
+        vw.prefetchFunctions(funcs)
+        vw.funcsched.wait()
+        for va in funcs:
+            vw.makeFunction(va)
+
+        self.assertTrue(vw.funcsched.applied)
+        self.assertEqual(vw.funcsched.applied + vw.funcsched.invalid, vw.funcsched.prefetched)
+        self.assertEqual(getOutput(vw), getOutput(ans))
+        vw.funcsched.close()
+
+    def test_vivisect_parallel_results(self):
+        ans, funcs = sampleworkspace.getCallingWorkspace()
+        for va in funcs[:2]:
+            ans.makeFunction(va)
+
+        # Analyze the second function as a worker would
+        wvw, funcs = sampleworkspace.getCallingWorkspace()
+        wvw.makeFunction(funcs[0])
+        wvw.funcsched = viv_parallel.FunctionScheduler(wvw, 1)
+        wvw.funcsched.worker = True
+        wvw.funcsched.queue = Queue.Queue()
+        wvw.funcsched.forkgen = wvw.getMemoryGeneration()
+        wvw.makeFunction(funcs[1])
+
+        key, result = wvw.funcsched.queue.get_nowait()
+        self.assertEqual(key, ('vivisect.analysis.i386.calling', funcs[1]))
+        self.assertEqual(getOutput(wvw), getOutput(ans))
+
+        # The events replay the same as the analysis itself...
+        vw, funcs = sampleworkspace.getCallingWorkspace()
+        vw.makeFunction(funcs[0])
+        vw.funcsched = viv_parallel.FunctionScheduler(vw, 1)
+        vw.funcsched.results[key] = result
+        vw.makeFunction(funcs[1])
+        self.assertEqual(vw.funcsched.applied, 1)
+        self.assertEqual(getOutput(vw), getOutput(ans))
+
+        # ...unless a function it calls changed since
+        vw, funcs = sampleworkspace.getCallingWorkspace()
+        vw.makeFunction(funcs[0])
+        vw.makeName(funcs[0], 'woot')
+        vw.funcsched = viv_parallel.FunctionScheduler(vw, 1)
+        vw.funcsched.results[key] = result
+        vw.makeFunction(funcs[1])
+        self.assertEqual(vw.funcsched.invalid, 1)
+        self.assertEqual(vw.funcsched.applied, 0)
+        self.assertEqual(vw.getFunctionMeta(funcs[1], 'api'), ans.getFunctionMeta(funcs[1], 'api'))
+
+    def test_vivisect_parallel_conflict(self):
+        # Two functions which dereference the same global pointer ( to a
+        # string ) through a register, so only analysis ( not code flow )
+        # defines the pointer.
+        # mov ecx,globva ; mov eax,[ecx] ; ret
+        code = '\xb9' + struct.pack('<I', globva) + '\x8b\x01\xc3'
+        mem = code.ljust(0x10, '\x90') + code
+        mem = mem.ljust(globva - baseva, '\x00') + struct.pack('<I', globva + 0x10)
+        mem = mem.ljust(0x810, '\x00') + 'parallel pointer\x00'
+        funcs = (baseva, baseva + 0x10)
+
+        # A stand-in for an emulating analysis module ( which makes the
+        # pointers its emulation dereferences, like AnalysisMonitor )
+        ptrmod = types.ModuleType('ptrderef')
+        ptrmod.parallel = True
+        def analyzeFunction(vw, fva):
+            ptrva = vw.parseOpcode(fva).opers[1].imm
+            vw.addXref(fva + 5, ptrva, REF_DATA)
+            if vw.getLocation(ptrva) == None:
+                vw.makePointer(ptrva)
+        ptrmod.analyzeFunction = analyzeFunction
+
+        def getWorkspace(parallel=True):
+            vw = vivisect.VivWorkspace()
+            vw.setMeta('Architecture','i386')
+            vw.setMeta('Format','blob')
+            vw.addMemoryMap(baseva, e_mem.MM_RWX, 'code', mem.ljust(0x1000, '\x00'))
+            vw.addFuncAnalysisModule('vivisect.analysis.generic.codeblocks')
+            vw.fmods['ptrderef'] = ptrmod
+            vw.fmodlist.append('ptrderef')
+            if parallel:
+                vw.funcsched = viv_parallel.FunctionScheduler(vw, 1)
+            return vw
+
+        ans = getWorkspace(parallel=False)
+        for fva in funcs:
+            ans.makeFunction(fva)
+        self.assertEqual(ans.getLocation(globva)[L_LTYPE], LOC_POINTER)
+        self.assertEqual(ans.getLocation(globva + 0x10)[L_LTYPE], LOC_STRING)
+
+        # A worker analyzes the second function ( defining the pointer )
+        wvw = getWorkspace()
+        wvw.funcsched.worker = True
+        wvw.funcsched.queue = Queue.Queue()
+        wvw.funcsched.forkgen = wvw.getMemoryGeneration()
+        wvw.makeFunction(funcs[1])
+        key, result = wvw.funcsched.queue.get_nowait()
+        self.assertEqual(key, ('ptrderef', funcs[1]))
+
+        # ...while the workspace defines it analyzing the first one, so
+        # the worker events would duplicate it
+        vw = getWorkspace()
+        vw.funcsched.results[key] = result
+        for fva in funcs:
+            vw.makeFunction(fva)
+
+        self.assertEqual(vw.funcsched.invalid, 1)
+        self.assertEqual(vw.funcsched.applied, 0)
+        self.assertEqual(getOutput(vw), getOutput(ans))
+        self.assertEqual(len(vw.getLocations()), len(ans.getLocations()))
+
+        # Without the conflict the worker events are used
+        vw = getWorkspace()
+        vw.funcsched.results[key] = result
+        for fva in reversed(funcs):
+            vw.makeFunction(fva)
+
+        self.assertEqual(vw.funcsched.applied, 1)
+        self.assertEqual(getOutput(vw), getOutput(ans))
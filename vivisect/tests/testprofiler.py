@@ -0,0 +1,25 @@
+import json
+import unittest
+
+import vivisect.profiler as viv_profiler
+import vivisect.tests.sampleworkspace as sampleworkspace
+
+class ProfilerTest(unittest.TestCase):
+
+    def test_vivisect_profiler(self):
+        vw, funcs = sampleworkspace.getCallingWorkspace(count=10)
+        self.assertIsNone(viv_profiler.getProfileJson(vw))
+        vw.analyze()
+        self.assertIsNone(vw.profiler)
+
+        prof = vw.getTransMeta('AnalysisProfile')
+        self.assertEqual(prof['amods'][0]['name'], 'entrypoints')
+        self.assertEqual([ f['name'] for f in prof['fmods'] ], vw.fmodlist)
+
+        for fprof in prof['fmods']:
+            self.assertEqual(fprof['calls'], len(funcs))
+            self.assertEqual(fprof['exceptions'], 0)
+            self.assertEqual(len(fprof['slowest']), 10)
+            self.assertEqual(set([ s['va'] for s in fprof['slowest'] ]), set(funcs))
+
+        self.assertEqual(json.loads(viv_profiler.getProfileJson(vw)), prof)
@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import unittest
+import cPickle as pickle
+
+import vivisect
+import vivisect.storage as viv_storage
+import vivisect.storage.basicfile as viv_basicfile
+import vivisect.tests.samplecode as samplecode
+
+from vivisect.const import *
+
+def getSampleWorkspace():
+    vw = vivisect.VivWorkspace()
+    vw.setMeta('Architecture','i386')
+    vw.setMeta('Format','blob')
+    vw.addMemoryMap(0x41410000, 0xff, 'none', samplecode.func1 + 'A Global String\x00')
+    vw.makeFunction(0x41410000)
+    vw.makeName(0x41410000, 'func1')
+    vw.makeString(0x4141001a)
+    vw.addXref(0x41410000, 0x4141001a, REF_DATA, None)
+    vw.setComment(0x41410000, 'a comment')
+    vw.setVaSetRow('Bookmarks', (0x41410000, 'woot'))
+    return vw
+
+class StorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def checkWorkspace(self, vw, ans):
+        self.assertEqual(vw.getMeta('Architecture'), ans.getMeta('Architecture'))
+        self.assertEqual(sorted(vw.getLocations()), sorted(ans.getLocations()))
+        self.assertEqual(sorted(vw.getXrefs()), sorted(ans.getXrefs()))
+        self.assertEqual(sorted(vw.getNames()), sorted(ans.getNames()))
+        self.assertEqual(sorted(vw.getCodeBlocks()), sorted(ans.getCodeBlocks()))
+        self.assertEqual(vw.funcmeta, ans.funcmeta)
+        self.assertEqual(vw.getComments(), ans.getComments())
+        self.assertEqual(vw.getVaSetRows('Bookmarks'), ans.getVaSetRows('Bookmarks'))
+        self.assertEqual(vw.readMemory(0x41410000, 0xff), ans.readMemory(0x41410000, 0xff))
+        for va in xrange(0x41410000, 0x41410030):
+            self.assertEqual(vw.getLocation(va), ans.getLocation(va))
+            self.assertEqual(vw.getCodeBlock(va), ans.getCodeBlock(va))
+
+    def test_vivisect_storage_columnfile(self):
+        ans = getSampleWorkspace()
+        fname = os.path.join(self.tmpdir, 'test.viv')
+        ans.setMeta('StorageModule', 'vivisect.storage.columnfile')
+        ans.setMeta('StorageName', fname)
+        ans.saveWorkspace()
+
+        self.assertEqual(viv_storage.getStorageModuleName(fname), 'vivisect.storage.columnfile')
+
+        vw = vivisect.VivWorkspace()
+        vw.loadWorkspace(fname)
+        self.checkWorkspace(vw, ans)
+
+        # The loaded workspace must still export (and import) as events
+        vw2 = vivisect.VivWorkspace()
+        vw2.importWorkspace(vw.exportWorkspace())
+        self.checkWorkspace(vw2, ans)
+
+        # And re-save as a basicfile workspace
+        fname2 = os.path.join(self.tmpdir, 'test2.viv')
+        vw.setMeta('StorageModule', 'vivisect.storage.basicfile')
+        vw.setMeta('StorageName', fname2)
+        vw.saveWorkspace()
+        self.assertEqual(viv_storage.getStorageModuleName(fname2), 'vivisect.storage.basicfile')
+
+        vw3 = vivisect.VivWorkspace()
+        vw3.loadWorkspace(fname2)
+        self.checkWorkspace(vw3, ans)
+
+        # Re-saving over the loaded file ( with changes ) still exports
+        # every change exactly once
+        vw = vivisect.VivWorkspace()
+        vw.loadWorkspace(fname)
+        vw.makeName(0x4141001a, 'globstr')
+        vw.saveWorkspace()
+        vw.setComment(0x4141001a, 'saved after')
+        vw4 = vivisect.VivWorkspace()
+        vw4.importWorkspace(vw.exportWorkspace())
+        self.assertEqual(vw4.getName(0x4141001a), 'globstr')
+        self.assertEqual(vw4.getComment(0x4141001a), 'saved after')
+        self.assertEqual(sorted(vw4.getLocations()), sorted(ans.getLocations()))
+        self.assertEqual(sorted(vw4.getXrefs()), sorted(ans.getXrefs()))
+
+        # The events are read from the file again, which must not change
+        with open(fname, 'ab') as f:
+            f.write('\x00' * 8)
+        self.assertRaises(vivisect.InvalidWorkspace, vw.exportWorkspace)
+
+    def test_vivisect_storage_basicfile(self):
+        ans = getSampleWorkspace()
+        fname = os.path.join(self.tmpdir, 'test.viv')
+        ans.setMeta('StorageName', fname)
+        ans.saveWorkspace()
+
+        # Append some changes as a new chunk
+        ans.makeName(0x4141001a, 'globstr')
+        ans.saveWorkspace(fullsave=False)
+
+        with open(fname, 'rb') as f:
+            self.assertEqual(f.read(8), viv_basicfile.vivsig_chunked)
+            chunks = list(viv_basicfile.iterVivChunks(f))
+        self.assertEqual(len(chunks), 2)
+
+        vw = vivisect.VivWorkspace()
+        vw.loadWorkspace(fname)
+        self.checkWorkspace(vw, ans)
+
+        # Corrupt the first chunk, the load fails...
+        with open(fname, 'r+b') as f:
+            f.seek(chunks[0][0] + viv_basicfile.chunk_hdr_size + 10)
+            f.write('\xff' * 4)
+
+        self.assertRaises(viv_basicfile.CorruptChunk, viv_basicfile.vivEventsFromFile, fname)
+        vw = vivisect.VivWorkspace()
+        self.assertRaises(viv_basicfile.CorruptChunk, vw.loadWorkspace, fname)
+
+        # ...unless we opt in to recovery ( and the second still loads )
+        events = viv_basicfile.vivEventsFromFile(fname, recover=True)
+        self.assertEqual(events, [(VWE_SETNAME, (0x4141001a, 'globstr'))])
+
+        vw = vivisect.VivWorkspace()
+        vw.config.viv.storage.basicfile.cfginfo['recover'] = True
+        viv_basicfile.loadWorkspace(vw, fname)
+        self.assertEqual(vw.vaByName('globstr'), 0x4141001a)
+
+        # A corrupt chunk header fails the load the same way
+        with open(fname, 'r+b') as f:
+            f.seek(chunks[1][0])
+            f.write('XXXX')
+        self.assertRaises(viv_basicfile.CorruptChunk, viv_basicfile.vivEventsFromFile, fname)
+        self.assertEqual(viv_basicfile.vivEventsFromFile(fname, recover=True), [])
+
+    def test_vivisect_storage_compact(self):
+        ans = getSampleWorkspace()
+        events = ans.exportWorkspace()
+
+        # A legacy (raw pickle) workspace with appended changes
+        fname = os.path.join(self.tmpdir, 'legacy.viv')
+        with open(fname, 'wb') as f:
+            f.write(viv_basicfile.vivsig_cpickle)
+            pickle.dump(events[:10], f, protocol=2)
+        viv_basicfile.vivEventsAppendFile(fname, events[10:])
+        self.assertEqual(viv_basicfile.vivEventsFromFile(fname), events)
+
+        viv_basicfile.compactWorkspace(fname)
+        with open(fname, 'rb') as f:
+            self.assertEqual(f.read(8), viv_basicfile.vivsig_chunked)
+        self.assertEqual(viv_basicfile.vivEventsFromFile(fname), events)
+
+        vw = vivisect.VivWorkspace()
+        vw.loadWorkspace(fname)
+        self.checkWorkspace(vw, ans)
@@ -0,0 +1,354 @@
+import struct
+import unittest
+
+import envi.memory as e_mem
+import envi.archs.i386 as e_i386
+import vivisect
+import vivisect.opcache as viv_opcache
+import vivisect.impemu.monitor as viv_monitor
+import vivisect.analysis.crypto.constants as crypto_consts
+
+from vivisect.const import *
+
+def getEmptyWorkspace():
+    vw = vivisect.VivWorkspace()
+    vw.setMeta('Architecture','i386')
+    vw.setMeta('Format','blob')
+    vw.addMemoryMap(0x41410000, e_mem.MM_RWX, 'none', '\x00' * 0x1000)
+    return vw
+
+class WorkspaceTest(unittest.TestCase):
+
+    def test_vivisect_workspace_xrefs(self):
+        vw = getEmptyWorkspace()
+
+        refs = [ (0x41410000 + i, 0x41410800, REF_CODE, 0) for i in xrange(100) ]
+        for fromva, tova, rtype, rflags in refs:
+            vw.addXref(fromva, tova, rtype, rflags)
+            # Duplicates are ignored
+            vw.addXref(fromva, tova, rtype, rflags)
+
+        self.assertEqual(vw.getXrefsTo(0x41410800), refs)
+        self.assertEqual(vw.getXrefsTo(0x41410800, rtype=REF_DATA), [])
+        self.assertEqual(vw.getXrefsFrom(0x41410005), [refs[5]])
+        self.assertEqual(vw.getXrefs(), refs)
+
+        vw.delXref(refs[5])
+        vw.delXref(refs[50])
+        self.assertRaises(Exception, vw.delXref, refs[5])
+
+        live = [ ref for ref in refs if ref not in (refs[5], refs[50]) ]
+        self.assertEqual(vw.getXrefsTo(0x41410800), live)
+        self.assertEqual(vw.getXrefsFrom(0x41410005), [])
+        self.assertEqual(vw.getXrefs(), live)
+
+        # Re-adding a deleted xref puts it at the end
+        vw.addXref(*refs[5])
+        self.assertEqual(vw.getXrefsTo(0x41410800), live + [refs[5]])
+        self.assertEqual(vw.getXrefsFrom(0x41410005), [refs[5]])
+        self.assertEqual(vw.getXrefs(), live + [refs[5]])
+
+        # And the delete/re-add events replay the same way
+        vw2 = vivisect.VivWorkspace()
+        vw2.importWorkspace(vw.exportWorkspace())
+        self.assertEqual(vw2.getXrefsTo(0x41410800), live + [refs[5]])
+        self.assertEqual(vw2.getXrefs(), live + [refs[5]])
+
+    def test_vivisect_workspace_import_channel(self):
+        vw = getEmptyWorkspace()
+        vw.addLocation(0x41410010, 4, LOC_NUMBER)
+        vw.addXref(0x41410010, 0x41410020, REF_PTR)
+        vw.makeName(0x41410020, 'woot')
+        events = vw.exportWorkspace()
+
+        # A registered event channel sees every imported event
+        vw2 = vivisect.VivWorkspace()
+        chan = vw2.createEventChannel()
+        vw2.importWorkspace(events)
+        seen = []
+        while len(seen) < len(events):
+            seen.append(vw2.waitForEvent(chan, timeout=1))
+        self.assertEqual(seen, events)
+        self.assertEqual(vw2.getLocation(0x41410010), (0x41410010, 4, LOC_NUMBER, None))
+        self.assertEqual(vw2.vaByName('woot'), 0x41410020)
+
+    def test_vivisect_workspace_locations(self):
+        vw = getEmptyWorkspace()
+
+        ptrs = [ vw.addLocation(0x41410100 + (i * 4), 4, LOC_POINTER) for i in xrange(8) ]
+        nums = [ vw.addLocation(0x41410000 + (i * 4), 4, LOC_NUMBER, i) for i in xrange(8) ]
+        strs = [ vw.addLocation(0x41410200, 8, LOC_STRING) ]
+
+        self.assertEqual(vw.getLocations(), ptrs + nums + strs)
+        self.assertEqual(vw.getLocations(LOC_POINTER), ptrs)
+        self.assertEqual(vw.getLocations(LOC_NUMBER, 3), [nums[3]])
+        self.assertEqual(vw.getLocations(LOC_IMPORT), [])
+
+        self.assertEqual(list(vw.iterLocations(0x41410000, 0x1000)), nums + ptrs + strs)
+        self.assertEqual(list(vw.iterLocations(0x41410004, 8)), nums[1:3])
+        self.assertEqual(list(vw.iterLocations(0x41410000, 0x1000, LOC_POINTER)), ptrs)
+        self.assertEqual(list(vw.iterLocations(0x41410108, 8, LOC_POINTER)), ptrs[2:4])
+        self.assertEqual(list(vw.iterLocations(0x41410000, 0x100, LOC_POINTER)), [])
+
+        vw.delLocation(0x41410108)
+        vw.delLocation(0x41410000)
+        self.assertIsNone(vw.getLocation(0x41410108))
+        self.assertEqual(vw.getLocations(LOC_POINTER), ptrs[:2] + ptrs[3:])
+        self.assertEqual(vw.getLocations(), ptrs[:2] + ptrs[3:] + nums[1:] + strs)
+        self.assertEqual(list(vw.iterLocations(0x41410100, 0x10, LOC_POINTER)), ptrs[:2] + ptrs[3:4])
+        self.assertEqual(list(vw.iterLocations(0x41410100, 0x10)), ptrs[:2] + ptrs[3:4])
+
+        # The sorted index is kept up to date ( not rebuilt ) as we go
+        locs = vw.locs_by_type[LOC_POINTER]
+        slocs = locs.getSorted()
+        vw.addLocation(0x41410108, 4, LOC_POINTER)
+        self.assertTrue(locs.getSorted() is slocs)
+        self.assertEqual(slocs, sorted(ptrs))
+
+        # And adding locations while we iterate does not repeat ( or skip ) any
+        seen = []
+        for loc in vw.iterLocations(0x41410100, 0x100, LOC_POINTER):
+            seen.append(loc)
+            if loc[L_VA] == 0x41410104:
+                vw.addLocation(0x41410080, 4, LOC_POINTER)
+                vw.addLocation(0x41410120, 4, LOC_POINTER)
+        self.assertEqual(seen, sorted(ptrs) + [vw.getLocation(0x41410120)])
+
+    def test_vivisect_workspace_undefined(self):
+        vw = getEmptyWorkspace()
+        base = 0x41410000
+
+        self.assertEqual(list(vw.iterUndefinedRanges(base, 0x1000)), [(base, 0x1000)])
+
+        vw.addLocation(base, 4, LOC_NUMBER)
+        vw.addLocation(base + 0x10, 8, LOC_STRING)
+        vw.addLocation(base + 0x18, 4, LOC_POINTER)
+        vw.addLocation(base + 0xffc, 4, LOC_NUMBER)
+
+        gaps = [ (base + 4, 0xc), (base + 0x1c, 0xfe0) ]
+        self.assertEqual(list(vw.iterUndefinedRanges(base, 0x1000)), gaps)
+        self.assertEqual(list(vw.iterUndefinedRanges(base + 6, 0x18)), [(base + 6, 0xa), (base + 0x1c, 2)])
+        self.assertEqual(list(vw.iterUndefinedRanges(base + 0x10, 0xc)), [])
+
+        self.assertEqual(vw.getLocationRange(base, 0x20), [
+            (base, 4, LOC_NUMBER, None),
+            (base + 4, 0xc, LOC_UNDEF, None),
+            (base + 0x10, 8, LOC_STRING, None),
+            (base + 0x18, 4, LOC_POINTER, None),
+            (base + 0x1c, 4, LOC_UNDEF, None),
+        ])
+
+        self.assertEqual(vw.getDiscoveredInfo(), (0x14, 0xfec))
+
+    def test_vivisect_workspace_findpointers(self):
+        vw = getEmptyWorkspace()
+        data = struct.pack('<I', 0x41410080).ljust(0x10000, '\x00')
+        vw.addMemoryMap(0x42420000, e_mem.MM_READ, 'data', data)
+        base = 0x41410000
+
+        ptrs = [
+            (base + 0x10, 0x42420010), # aligned, into the other map
+            (base + 0x21, base + 0x40),# unaligned
+            (base + 0x25, base + 0x41),# right after the previous one
+            (base + 0x30, 0x42430000), # end of the map ( not valid )
+            (base + 0x34, 0x41410800), # inside a location
+            (base + 0x3e, 0x42420020), # overlaps the end of a location
+        ]
+        for va, x in ptrs:
+            vw.writeMemory(va, struct.pack('<I', x))
+        # Overlapping pointers at 0x5e (0x42420000) and 0x60 (0x42424242),
+        # only the first is found
+        vw.writeMemory(base + 0x60, '\x42' * 4)
+
+        vw.addLocation(base + 0x34, 4, LOC_NUMBER)
+        vw.addLocation(base + 0x3c, 4, LOC_NUMBER)
+
+        ans = [ (va, x) for va, x in ptrs if va in (base + 0x10, base + 0x21, base + 0x25) ]
+        ans.append((base + 0x5e, 0x42420000))
+        ans.append((0x42420000, 0x41410080))
+        self.assertEqual(vw.findPointers(cache=False), ans)
+
+    def test_vivisect_workspace_emupool(self):
+        vw = getEmptyWorkspace()
+        # mov dword [0x41410800], 0x41414141 ; ret
+        vw.writeMemory(0x41410100, '\xc7\x05\x00\x08\x41\x41\x41\x41\x41\x41\xc3')
+
+        pool = vw.getEmulatorPool()
+        fresh = vw.getEmulator()
+
+        emu = pool.getEmulator()
+        emu.setEmuOpt('i386:reponce', False)
+        emu.runFunction(0x41410100, maxhit=1)
+        self.assertEqual(emu.readMemory(0x41410800, 4), 'AAAA')
+        self.assertTrue(emu.opcache)
+        # Repeated writes coalesce into one range
+        emu.writeMemory(0x41410802, 'BBBB')
+        emu.writeMemory(0x41410800, 'CC')
+        self.assertEqual(emu._emu_writes.getRanges(), [(0x41410800, 6)])
+        pool.putEmulator(emu)
+
+        # The same emulator comes back, reset to a pristine state
+        emu2 = pool.getEmulator()
+        self.assertIs(emu2, emu)
+        self.assertEqual(emu.readMemory(0x41410800, 4), '\x00' * 4)
+        self.assertEqual(emu.getRegisterSnap(), fresh.getRegisterSnap())
+        self.assertEqual(emu.taints, fresh.taints)
+        self.assertEqual(emu.setVivTaint('test', None), fresh.setVivTaint('test', None))
+        self.assertEqual(emu._emu_opts, fresh._emu_opts)
+        self.assertIsNone(emu.emumon)
+        # Cached opcodes survive unless their bytes were written
+        self.assertIn(0x41410100, emu.opcache)
+        pool.putEmulator(emu)
+
+        # Changing the workspace memory invalidates the pool
+        vw.writeMemory(0x41410800, 'BBBB')
+        emu3 = pool.getEmulator()
+        self.assertIsNot(emu3, emu)
+        self.assertEqual(emu3.readMemory(0x41410800, 4), 'BBBB')
+
+    def test_vivisect_workspace_emublocks(self):
+        vw = getEmptyWorkspace()
+        # mov eax,1 ; test eax,eax ; jz 0x10f ; mov [0x414100f0],eax ; ret ; xor eax,eax ; ret
+        vw.writeMemory(0x41410100, '\xb8\x01\x00\x00\x00\x85\xc0\x74\x06\xa3\xf0\x00\x41\x41\xc3\x31\xc0\xc3')
+
+        class PreMonitor(viv_monitor.EmulationMonitor):
+            def __init__(self):
+                viv_monitor.EmulationMonitor.__init__(self)
+                self.ops = []
+
+            def prehook(self, emu, op, starteip):
+                self.ops.append(starteip)
+
+        pool = vw.getEmulatorPool()
+        emu = pool.getEmulator()
+        mon = PreMonitor()
+        emu.setEmulationMonitor(mon)
+        self.assertIsNotNone(emu._getMonitorHook('prehook'))
+        self.assertIsNone(emu._getMonitorHook('posthook'))
+
+        emu.runFunction(0x41410100, maxhit=1)
+        self.assertEqual(sorted(mon.ops), [0x41410100, 0x41410105, 0x41410107, 0x41410109, 0x4141010e, 0x4141010f, 0x41410111])
+        self.assertEqual([ op.va for op in emu.blocks[0x41410100] ], [0x41410100, 0x41410105, 0x41410107])
+        self.assertEqual([ op.va for op in emu.blocks[0x41410109] ], [0x41410109, 0x4141010e])
+        self.assertEqual([ op.va for op in emu.blocks[0x4141010f] ], [0x4141010f, 0x41410111])
+        self.assertEqual(emu.readMemory(0x414100f0, 4), '\x01\x00\x00\x00')
+
+        # The blocks survive a reset unless their bytes were written
+        pool.putEmulator(emu)
+        self.assertEqual(len(emu.blocks), 3)
+        emu._dropBlocks([(0x41410105, 1)])
+        self.assertEqual(sorted(emu.blocks.keys()), [0x41410109, 0x4141010f])
+
+    def test_vivisect_workspace_emupatch(self):
+        vw = getEmptyWorkspace()
+        # mov byte [0x41410108],5 ; mov eax,1 ; ret
+        vw.writeMemory(0x41410100, '\xc6\x05\x08\x01\x41\x41\x05\xb8\x01\x00\x00\x00\xc3')
+
+        pool = vw.getEmulatorPool()
+        emu = pool.getEmulator()
+        emu.runFunction(0x41410100, maxhit=1)
+        self.assertEqual(emu.getRegister(e_i386.REG_EAX), 5)
+        self.assertEqual(emu.parseOpcode(0x41410107).opers[1].imm, 5)
+
+        # Restoring the memory ( here by a reset ) puts back the old code
+        pool.putEmulator(emu)
+        self.assertIs(pool.getEmulator(), emu)
+        emu.runFunction(0x41410107, maxhit=1)
+        self.assertEqual(emu.getRegister(e_i386.REG_EAX), 1)
+
+        # ...and so does restoring a snap taken before the patch
+        snap = emu.getEmuSnap()
+        emu.writeMemory(0x41410108, '\x07')
+        self.assertEqual(emu.parseOpcode(0x41410107).opers[1].imm, 7)
+        emu.setEmuSnap(snap)
+        self.assertEqual(emu.parseOpcode(0x41410107).opers[1].imm, 1)
+
+    def test_vivisect_workspace_opcache(self):
+        vw = getEmptyWorkspace()
+        # mov eax,1 ; ret
+        vw.writeMemory(0x41410100, '\xb8\x01\x00\x00\x00\xc3')
+
+        op = vw._parseOpcode(0x41410100)
+        self.assertIs(vw._parseOpcode(0x41410100), op)
+        self.assertEqual(vw.opcache.getStats()['hits'], 1)
+
+        # The public API gets an opcode of its own ( to do with as it likes )
+        pubop = vw.parseOpcode(0x41410100)
+        self.assertIsNot(pubop, op)
+        self.assertEqual(repr(pubop), repr(op))
+        pubop.opers[1].imm = 7
+        self.assertEqual(vw._parseOpcode(0x41410100).opers[1].imm, 1)
+
+        # The emulators share the cache
+        emu = vw.getEmulator()
+        self.assertIs(emu.parseOpcode(0x41410100), op)
+
+        # The va type is part of the match
+        self.assertIsNot(vw._parseOpcode(0x41410100L), op)
+
+        # Writes invalidate the opcodes decoded from the bytes
+        oldemu = vw.getEmulator()
+        vw.writeMemory(0x41410104, '\x02')
+        newop = vw._parseOpcode(0x41410100)
+        self.assertIsNot(newop, op)
+        self.assertEqual(newop.opers[1].imm, 0x02000001)
+
+        # ...and the emulators made before the write ( with the old bytes )
+        # don't share the cache any more
+        self.assertEqual(oldemu.parseOpcode(0x41410100).opers[1].imm, 1)
+        self.assertIs(vw.getEmulator().parseOpcode(0x41410100), newop)
+
+        # So do deleted locations
+        vw.makeCode(0x41410100)
+        op = vw._parseOpcode(0x41410100)
+        vw.delLocation(0x41410100)
+        self.assertIsNot(vw._parseOpcode(0x41410100), op)
+
+    def test_vivisect_workspace_opcache_lru(self):
+        cache = viv_opcache.OpcodeCache(maxsize=4)
+        vw = getEmptyWorkspace()
+        ops = [ vw.parseOpcode(0x41410000 + i) for i in xrange(5) ]
+        for i, op in enumerate(ops[:4]):
+            cache.put(op.va, 1, op)
+
+        # Use the first one, so the second one is the least recently used
+        self.assertIs(cache.get(ops[0].va, 1), ops[0])
+        cache.put(ops[4].va, 1, ops[4])
+        self.assertIsNone(cache.get(ops[1].va, 1))
+        self.assertIs(cache.get(ops[0].va, 1), ops[0])
+        self.assertIs(cache.get(ops[4].va, 1), ops[4])
+        self.assertIsNone(cache.get(ops[0].va, 3))
+
+        stats = cache.getStats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hitrate'], 0.6)
+
+    def test_vivisect_workspace_parseopcodes(self):
+        vw = getEmptyWorkspace()
+        vw.addFuncAnalysisModule('vivisect.analysis.generic.codeblocks')
+
+        # mov eax,<md5 init> for each of them; add eax,<md5 xform> for
+        # each of them; jz <md5 init>; ret
+        code = ''.join([ '\xb8' + struct.pack('<I', c) for c in crypto_consts.md5_inits ])
+        code += ''.join([ '\x05' + struct.pack('<I', c) for c in crypto_consts.md5_xform ])
+        code += '\x0f\x84' + struct.pack('<i', 0x67452301 - (0x41410000 + len(code) + 6)) + '\xc3'
+        vw.writeMemory(0x41410000, code)
+        vw.makeFunction(0x41410000)
+
+        ops = vw.parseOpcodes(0x41410000, len(code))
+        self.assertEqual(len(ops), 4 + 64 + 2)
+        self.assertEqual((ops.endoff, ops.invalid), (len(code), False))
+        self.assertEqual(ops.getMnem(0), 'mov')
+        self.assertEqual(ops.targets[-2], 0x67452301)
+
+        # Only the opcodes which may have one of the constants get built
+        cands = crypto_consts.getCandidates(ops)
+        self.assertEqual(cands, range(len(ops) - 1))
+
+        vw.vprint = lambda msg: None
+        crypto_consts.analyze(vw)
+        rows = vw.getVaSetRows(crypto_consts.vlname)
+        # The jz target ( an immediate too ) makes for a fifth md5 init
+        self.assertEqual(rows, [(0x41410000, 'MD5 Transform')])
@@ -4,6 +4,7 @@ VStruct builder!  Used to serialize structure definitions etc...
 
 '''
 
+import sys
 import copy
 import types
 import inspect
@@ -30,6 +31,30 @@ class VStructConstructor:
     def __call__(self, *args, **kwargs):
         return self.builder.buildVStruct(self.vsname)
 
+class LazyNamespace(types.ModuleType):
+    '''
+    A module namespace which is not imported until it is first used.
+    '''
+    def __init__(self, modname):
+        types.ModuleType.__init__(self, modname)
+        self._vs_module = None
+
+    def _vsGetModule(self):
+        if self._vs_module == None:
+            __import__(self.__name__)
+            self._vs_module = sys.modules[self.__name__]
+            self.__dict__.update(self._vs_module.__dict__)
+        return self._vs_module
+
+    def __getattr__(self, name):
+        # Don't import for the ( special method ) probes
+        if name.startswith('__'):
+            raise AttributeError, name
+        return getattr(self._vsGetModule(), name)
+
+    def __dir__(self):
+        return dir(self._vsGetModule())
+
 class VStructBuilder:
 
     def __init__(self, defs=(), enums=()):
@@ -73,6 +98,13 @@ class VStructBuilder:
     def addVStructNamespace(self, name, builder):
         self._vs_namespaces[name] = builder
 
+    def addVStructNamespaceModule(self, name, modname):
+        '''
+        Add the ( not yet imported ) vstruct definition module as a
+        namespace.  It is imported on the first lookup.
+        '''
+        self._vs_namespaces[name] = LazyNamespace(modname)
+
     def getVStructNamespaces(self):
         return self._vs_namespaces.items()
 
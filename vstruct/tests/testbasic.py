@@ -225,3 +225,17 @@ class VStructTest(unittest.TestCase):
 
         
 
+
+    def test_vstruct_lazy_namespace(self):
+        import vstruct.builder as vs_builder
+        import vstruct.defs.windows.win_5_1_i386.ntdll as vs_ntdll
+
+        builder = vs_builder.VStructBuilder()
+        builder.addVStructNamespaceModule('ntdll', 'vstruct.defs.windows.win_5_1_i386.ntdll')
+        ns = dict(builder.getVStructNamespaces())['ntdll']
+        self.assertIsNone(ns._vs_module)
+
+        self.assertEqual(builder.buildVStruct('ntdll.PEB').__class__, vs_ntdll.PEB)
+        self.assertIs(ns._vs_module, vs_ntdll)
+        self.assertIn('TEB', builder.getVStructNames('ntdll'))
+        self.assertEqual(builder.buildVStruct('LIST_ENTRY').__class__, vs_ntdll.LIST_ENTRY)